@@ -0,0 +1,490 @@
+#!/usr/bin/env python
+
+##########################################################################
+#   IMPORT
+##########################################################################
+
+import sys
+import os
+import json
+import time
+import shutil
+import platform
+import resource
+import tempfile
+import subprocess
+import numpy as np
+from PIL import Image
+from optparse import OptionParser, SUPPRESS_HELP
+from indexer.Indexer import Indexer, DefaultWorkerNum
+from indexer.ImageIndex import HistogramLayoutList, DefaultHistogramLayout
+from imageprocessor.ImageProcessor import ImageProcessor
+from searcher.Searcher import Searcher
+
+##########################################################################
+#   GLOBAL
+##########################################################################
+
+NumRequiredArgs = 0
+IndexFileName = 'index.bin'
+DefaultSizes = '100,1000'
+DefaultResolution = '320x240'
+DefaultQueryNum = 50
+DefaultMaxResultNum = 10
+DefaultSeed = 0
+DefaultOutputFilePath = 'benchmark.json'
+
+#   Allowed relative regression before comparison reports it
+DefaultTolerance = 0.2
+
+BenchmarkFileVersion = 1
+
+#   Synthetic images are grids of cells painted from a small palette,
+#   which gives each image a distinct, peaky color histogram
+SyntheticCellNum = 8
+SyntheticMaxColorNum = 8
+SyntheticJpegQuality = 90
+
+#   Kinds of synthetic images, palette grids saved as JPEG whose
+#   compression spreads their colors over many bins, the same grids
+#   saved as lossless PNG which fill a few bins like graphics and
+#   screenshots, and noisy smooth gradients which fill nearly every
+#   bin like photographs
+DatasetList = [ 'palette', 'graphic', 'photo' ]
+DefaultDataset = 'palette'
+
+#   Photo-like images are interpolated from a grid of random colors,
+#   with noise of this standard deviation
+SyntheticPhotoGridNum = 4
+SyntheticPhotoNoise = 12
+
+PercentileList = [ 50, 95, 99 ]
+
+#   Measurements where larger is better, times and sizes are better
+#   smaller
+ThroughputKeySet = { 'imagesPerSecond' }
+
+##########################################################################
+#   HELPER
+##########################################################################
+
+def parseResolution( resolution : str ):
+    ''' This function parses resolution given as width x height
+    '''
+
+    try:
+        width, height = [ int( size ) for size in resolution.lower().split( 'x' ) ]
+    except ValueError:
+        raise ValueError( 'parseResolution() - Invalid resolution {}.'.format( resolution ) )
+
+    if width < 1 or height < 1:
+        raise ValueError( 'parseResolution() - Invalid resolution {}.'.format( resolution ) )
+
+    return width, height
+
+def generateSyntheticImage( seed : int, imageNumber : int, width : int, height : int, dataset : str = DefaultDataset ) -> Image.Image:
+    ''' This function generates synthetic image of given number and
+        dataset, the same seed and number always give the same image
+    '''
+
+    randomGenerator = np.random.default_rng( [ seed, imageNumber ] )
+
+    if dataset == 'photo':
+        gridArray = randomGenerator.integers( 0, 256, size=( SyntheticPhotoGridNum, SyntheticPhotoGridNum, 3 ), dtype=np.uint8 )
+        imageArray = np.asarray( Image.fromarray( gridArray, 'RGB' ).resize( ( width, height ), Image.BICUBIC ), dtype=np.float32 )
+        imageArray += randomGenerator.normal( 0, SyntheticPhotoNoise, size=imageArray.shape )
+
+        return Image.fromarray( np.clip( imageArray, 0, 255 ).astype( np.uint8 ), 'RGB' )
+
+    colorNum = int( randomGenerator.integers( 2, SyntheticMaxColorNum + 1 ) )
+    paletteArray = randomGenerator.integers( 0, 256, size=( colorNum, 3 ), dtype=np.uint8 )
+    cellArray = paletteArray[ randomGenerator.integers( 0, colorNum, size=( SyntheticCellNum, SyntheticCellNum ) ) ]
+
+    return Image.fromarray( cellArray, 'RGB' ).resize( ( width, height ), Image.NEAREST )
+
+def generateImageDir( imageDir : str, seed : int, imageNum : int, width : int, height : int, dataset : str = DefaultDataset ):
+    ''' This function writes given number of synthetic images of given
+        dataset to given directory, as PNG for graphic dataset and JPEG
+        otherwise, keeping images already written
+    '''
+
+    os.makedirs( imageDir, exist_ok=True )
+
+    imageFileExtension = '.png' if dataset == 'graphic' else '.jpg'
+
+    for imageNumber in range( imageNum ):
+        imageFilePath = os.path.join( imageDir, 'image{:08d}{}'.format( imageNumber, imageFileExtension ) )
+        if not os.path.exists( imageFilePath ):
+            image = generateSyntheticImage( seed, imageNumber, width, height, dataset )
+            if imageFileExtension == '.png':
+                image.save( imageFilePath )
+            else:
+                image.save( imageFilePath, quality=SyntheticJpegQuality )
+
+def getPeakRssDict():
+    ''' This function returns peak resident set size of this process,
+        and the largest one of its finished worker processes, since
+        operating system only keeps the largest one of children
+    '''
+
+    #   Linux reports kilobytes, macOS bytes
+    unit = 1 if sys.platform == 'darwin' else 1024
+
+    return {
+        'peakRssByteNum' : resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss*unit,
+        'peakWorkerRssByteNum' : resource.getrusage( resource.RUSAGE_CHILDREN ).ru_maxrss*unit,
+    }
+
+def getPercentileDict( timeList, name : str ):
+    ''' This function returns percentiles of given times in seconds
+    '''
+
+    return { '{}P{}Seconds'.format( name, percentile ) : float( np.percentile( timeList, percentile ) ) for percentile in PercentileList }
+
+def getGitCommit():
+    ''' This function returns commit of source tree, or None if it is
+        not a git checkout
+    '''
+
+    try:
+        return subprocess.check_output( [ 'git', 'rev-parse', 'HEAD' ], cwd=os.path.dirname( os.path.abspath( __file__ ) ),
+                                        stderr=subprocess.DEVNULL ).decode( 'utf-8' ).strip()
+    except ( OSError, subprocess.CalledProcessError ):
+        return None
+
+def benchmarkSize( workDir : str, imageNum : int, queryNum : int, workerNum : int, maxResultNum : int, maxDecodeSize,
+                    histogramLayout : str = DefaultHistogramLayout ):
+    ''' This function indexes first given number of synthetic images,
+        reads the index and searches it with indexed images as
+        queries, and returns measurements
+    '''
+
+    #   Link first images of image pool, so collections of every size
+    #   share one pool
+    imageDir = os.path.join( workDir, 'images{}'.format( imageNum ) )
+    indexDir = os.path.join( workDir, 'index{}'.format( imageNum ) )
+    poolDir = os.path.join( workDir, 'pool' )
+
+    shutil.rmtree( imageDir, ignore_errors=True )
+    shutil.rmtree( indexDir, ignore_errors=True )
+    os.makedirs( imageDir )
+    os.makedirs( indexDir )
+
+    for imageFileName in sorted( os.listdir( poolDir ) )[:imageNum]:
+        os.symlink( os.path.abspath( os.path.join( poolDir, imageFileName ) ), os.path.join( imageDir, imageFileName ) )
+
+    #   Measure index build
+    startTime = time.perf_counter()
+    Indexer.indexToFile( imageDir, indexDir, IndexFileName, workerNum, isIncremental=False, maxDecodeSize=maxDecodeSize, histogramLayout=histogramLayout )
+    indexSeconds = time.perf_counter() - startTime
+
+    #   Measure index read, then loading every page of it
+    startTime = time.perf_counter()
+    imageIndex = Indexer.readIndex( indexDir, IndexFileName )
+    readIndexSeconds = time.perf_counter() - startTime
+
+    startTime = time.perf_counter()
+    for _ in imageIndex.iterateLoad():
+        pass
+    loadSeconds = time.perf_counter() - startTime
+
+    #   Measure query decode and search separately, with evenly spread
+    #   indexed images as queries
+    queryRowArray = np.unique( np.linspace( 0, len( imageIndex ) - 1, min( queryNum, len( imageIndex ) ) ).astype( np.int64 ) )
+    decodeTimeList = list()
+    searchTimeList = list()
+
+    for queryRow in queryRowArray:
+
+        startTime = time.perf_counter()
+        histogram = ImageProcessor.getColorHistogram( imageIndex.getImageFilePath( queryRow ), imageIndex.getMaxDecodeSize() )
+        decodeTimeList.append( time.perf_counter() - startTime )
+
+        startTime = time.perf_counter()
+        Searcher.search( imageIndex, histogram, maxResultNum )
+        searchTimeList.append( time.perf_counter() - startTime )
+
+    resultDict = {
+        'imageNum' : len( imageIndex ),
+        'queryNum' : len( queryRowArray ),
+        'indexSeconds' : indexSeconds,
+        'imagesPerSecond' : len( imageIndex ) / indexSeconds,
+        'indexByteNum' : os.path.getsize( os.path.join( indexDir, IndexFileName ) ),
+        'histogramLayout' : imageIndex.getHistogramLayout(),
+        'histogramDensity' : imageIndex.getHistogramDensity(),
+        'readIndexSeconds' : readIndexSeconds,
+        'loadSeconds' : loadSeconds,
+    }
+    resultDict.update( getPercentileDict( decodeTimeList, 'decode' ) )
+    resultDict.update( getPercentileDict( searchTimeList, 'search' ) )
+
+    return resultDict
+
+def benchmarkSizeProcess( workDir : str, imageNum : int, settingDict ):
+    ''' This function runs benchmarkSize() with given settings in a
+        fresh process and returns its measurements, with peak resident
+        set sizes of that process and its workers, since peaks of a
+        process never go down and would carry over from smaller sizes
+    '''
+
+    resultFilePath = os.path.join( workDir, 'result{}.json'.format( imageNum ) )
+    runDict = dict( settingDict, workDir=workDir, imageNum=imageNum, resultFilePath=resultFilePath )
+
+    subprocess.run( [ sys.executable, os.path.abspath( __file__ ), '--runSize', json.dumps( runDict ) ], check=True )
+
+    with open( resultFilePath, 'r' ) as resultFile:
+        return json.load( resultFile )
+
+def runSize( runDict ):
+    ''' This function measures one size in this process, as asked by
+        benchmarkSizeProcess(), and writes measurements to its file
+    '''
+
+    resultDict = benchmarkSize( runDict[ 'workDir' ], runDict[ 'imageNum' ], runDict[ 'queryNum' ], runDict[ 'workerNum' ], runDict[ 'maxResultNum' ],
+                                runDict[ 'maxDecodeSize' ], runDict[ 'histogramLayout' ] )
+    resultDict.update( getPeakRssDict() )
+
+    with open( runDict[ 'resultFilePath' ], 'w' ) as resultFile:
+        json.dump( resultDict, resultFile )
+
+def compareBenchmark( benchmarkDict, previousBenchmarkDict, tolerance : float ) -> int:
+    ''' This function prints every measurement next to the same one of
+        previous benchmark of the same image number, and returns number
+        of measurements worse than tolerance allows
+    '''
+
+    previousResultDict = { resultDict[ 'imageNum' ] : resultDict for resultDict in previousBenchmarkDict[ 'results' ] }
+    regressionNum = 0
+
+    for resultDict in benchmarkDict[ 'results' ]:
+
+        if resultDict[ 'imageNum' ] not in previousResultDict:
+            continue
+
+        for key, value in resultDict.items():
+
+            previousValue = previousResultDict[ resultDict[ 'imageNum' ] ].get( key )
+            isMeasured = key in ThroughputKeySet or key.endswith( 'Seconds' ) or key.endswith( 'ByteNum' )
+            if not isMeasured or not previousValue:
+                continue
+
+            #   Ratio above one is worse
+            ratio = previousValue / value if key in ThroughputKeySet else value / previousValue
+            isRegression = ratio > 1 + tolerance
+            regressionNum += isRegression
+
+            print( '{:>10} {:<24} {:>14.6g} {:>14.6g} {:>8.2f}x{}'.format( resultDict[ 'imageNum' ], key, previousValue, value, ratio, '  REGRESSION' if isRegression else '' ) )
+
+    return regressionNum
+
+##########################################################################
+#   CLASS
+##########################################################################
+
+##########################################################################
+#   MAIN
+##########################################################################
+
+def main():
+
+    parser = OptionParser(usage='usage: %prog [options]',
+                            version='%prog 0.0')
+    parser.add_option( '--sizes',
+                        action='store',
+                        dest='sizes',
+                        default=DefaultSizes,
+                        help='comma separated numbers of synthetic images to index and search (default = {!r})'.format(DefaultSizes) )
+    parser.add_option( '--resolution',
+                        action='store',
+                        dest='resolution',
+                        default=DefaultResolution,
+                        help='width x height of synthetic images (default = {!r})'.format(DefaultResolution) )
+    parser.add_option( '--queries',
+                        action='store',
+                        type='int',
+                        dest='queryNum',
+                        default=DefaultQueryNum,
+                        help='number of indexed images used as queries (default = {!r})'.format(DefaultQueryNum) )
+    parser.add_option( '--maxResult',
+                        action='store',
+                        type='int',
+                        dest='maxResultNum',
+                        default=DefaultMaxResultNum,
+                        help='maximum number of results (default = {!r})'.format(DefaultMaxResultNum) )
+    parser.add_option( '--workers',
+                        action='store',
+                        type='int',
+                        dest='workerNum',
+                        default=DefaultWorkerNum,
+                        help='number of worker processes (default = {!r})'.format(DefaultWorkerNum) )
+    parser.add_option( '--maxDecodeSize',
+                        action='store',
+                        type='int',
+                        dest='maxDecodeSize',
+                        default=None,
+                        help='decode images at reduced resolution, see generate_index_dir.py (default = full resolution)' )
+    parser.add_option( '--dataset',
+                        action='store',
+                        type='choice',
+                        choices=DatasetList,
+                        dest='dataset',
+                        default=DefaultDataset,
+                        help='kind of synthetic images, palette grids as JPEG (palette) or lossless PNG (graphic), or photo-like gradients (photo) (default = {!r})'.format(DefaultDataset) )
+    parser.add_option( '--histogramLayout',
+                        action='store',
+                        type='choice',
+                        choices=HistogramLayoutList,
+                        dest='histogramLayout',
+                        default=DefaultHistogramLayout,
+                        help='histogram layout of index, see generate_index_dir.py (default = {!r})'.format(DefaultHistogramLayout) )
+    parser.add_option( '--seed',
+                        action='store',
+                        type='int',
+                        dest='seed',
+                        default=DefaultSeed,
+                        help='seed of synthetic images (default = {!r})'.format(DefaultSeed) )
+    parser.add_option( '--workDir',
+                        action='store',
+                        dest='workDir',
+                        default=None,
+                        help='directory to keep synthetic images and indexes in, reused by later runs (default = temporary directory)' )
+    parser.add_option( '--output',
+                        action='store',
+                        dest='outputFilePath',
+                        default=DefaultOutputFilePath,
+                        help='JSON file to write results to (default = {!r})'.format(DefaultOutputFilePath) )
+    parser.add_option( '--compare',
+                        action='store',
+                        dest='previousFilePath',
+                        default=None,
+                        help='JSON file of previous run to compare with, exit status is 1 if any measurement regressed (default = none)' )
+    parser.add_option( '--tolerance',
+                        action='store',
+                        type='float',
+                        dest='tolerance',
+                        default=DefaultTolerance,
+                        help='relative regression allowed by --compare (default = {!r})'.format(DefaultTolerance) )
+    parser.add_option( '--runSize',
+                        action='store',
+                        dest='runSize',
+                        default=None,
+                        help=SUPPRESS_HELP )
+
+    (options, args) = parser.parse_args()
+
+    if len(args) != NumRequiredArgs:
+        parser.error('Incorrect number of arguments')
+        sys.exit(-1)
+
+    #   Measure one size for parent benchmark process
+    if options.runSize is not None:
+        runSize( json.loads( options.runSize ) )
+        return
+
+    #   Parse options
+    try:
+        imageNumList = sorted( { int( size ) for size in options.sizes.split( ',' ) } )
+        width, height = parseResolution( options.resolution )
+    except ValueError as e:
+        parser.error( str( e ) )
+
+    if imageNumList[0] < 1:
+        parser.error( 'Invalid sizes {}'.format( options.sizes ) )
+
+    workDir = options.workDir if options.workDir is not None else tempfile.mkdtemp( prefix='benchmark_' )
+
+    try:
+
+        #   Images of another seed or resolution cannot be reused
+        poolDir = os.path.join( workDir, 'pool' )
+        poolSettingDict = { 'seed' : options.seed, 'width' : width, 'height' : height, 'dataset' : options.dataset }
+        poolSettingFilePath = os.path.join( workDir, 'pool.json' )
+
+        previousPoolSettingDict = None
+        if os.path.exists( poolSettingFilePath ):
+            with open( poolSettingFilePath, 'r' ) as poolSettingFile:
+                previousPoolSettingDict = json.load( poolSettingFile )
+
+        if previousPoolSettingDict != poolSettingDict:
+            shutil.rmtree( poolDir, ignore_errors=True )
+
+        startTime = time.perf_counter()
+        generateImageDir( poolDir, options.seed, imageNumList[-1], width, height, options.dataset )
+        with open( poolSettingFilePath, 'w' ) as poolSettingFile:
+            json.dump( poolSettingDict, poolSettingFile )
+        print( 'benchmark() - Generated {} images in {:.1f} seconds.'.format( imageNumList[-1], time.perf_counter() - startTime ) )
+
+        resultList = list()
+
+        #   Each size is measured in its own process
+        sizeSettingDict = {
+            'queryNum' : options.queryNum,
+            'workerNum' : options.workerNum,
+            'maxResultNum' : options.maxResultNum,
+            'maxDecodeSize' : options.maxDecodeSize,
+            'histogramLayout' : options.histogramLayout,
+        }
+
+        for imageNum in imageNumList:
+
+            resultDict = benchmarkSizeProcess( workDir, imageNum, sizeSettingDict )
+            resultList.append( resultDict )
+
+            print( 'benchmark() - {} images: index {:.0f} images/s, {} histograms of density {:.3f}, {} index bytes, read index {:.4f} s, load {:.4f} s, search p50 {:.4f} s p95 {:.4f} s p99 {:.4f} s, peak RSS {:.1f} MiB, largest worker {:.1f} MiB.'.format(
+                    imageNum, resultDict[ 'imagesPerSecond' ], resultDict[ 'histogramLayout' ], resultDict[ 'histogramDensity' ], resultDict[ 'indexByteNum' ],
+                    resultDict[ 'readIndexSeconds' ], resultDict[ 'loadSeconds' ],
+                    resultDict[ 'searchP50Seconds' ], resultDict[ 'searchP95Seconds' ], resultDict[ 'searchP99Seconds' ],
+                    resultDict[ 'peakRssByteNum' ] / ( 1 << 20 ), resultDict[ 'peakWorkerRssByteNum' ] / ( 1 << 20 ) ) )
+
+    finally:
+        if options.workDir is None:
+            shutil.rmtree( workDir, ignore_errors=True )
+
+    benchmarkDict = {
+        'version' : BenchmarkFileVersion,
+        'gitCommit' : getGitCommit(),
+        'environment' : {
+            'python' : platform.python_version(),
+            'numpy' : np.__version__,
+            'platform' : platform.platform(),
+            'cpuNum' : os.cpu_count(),
+        },
+        'settings' : {
+            'resolution' : [ width, height ],
+            'seed' : options.seed,
+            'queryNum' : options.queryNum,
+            'maxResultNum' : options.maxResultNum,
+            'workerNum' : options.workerNum,
+            'maxDecodeSize' : options.maxDecodeSize,
+            'dataset' : options.dataset,
+            'histogramLayout' : options.histogramLayout,
+        },
+        'results' : resultList,
+    }
+
+    with open( options.outputFilePath, 'w' ) as outputFile:
+        json.dump( benchmarkDict, outputFile, indent=2 )
+
+    print( 'benchmark() - Wrote results to {}.'.format( options.outputFilePath ) )
+
+    #   Compare with previous run and fail on regression
+    if options.previousFilePath is not None:
+
+        with open( options.previousFilePath, 'r' ) as previousFile:
+            previousBenchmarkDict = json.load( previousFile )
+
+        if previousBenchmarkDict.get( 'settings' ) != benchmarkDict[ 'settings' ]:
+            print( 'benchmark() - Previous run used other settings {}.'.format( previousBenchmarkDict.get( 'settings' ) ) )
+
+        regressionNum = compareBenchmark( benchmarkDict, previousBenchmarkDict, options.tolerance )
+        print( 'benchmark() - {} measurements regressed beyond {:.0%}.'.format( regressionNum, options.tolerance ) )
+
+        if regressionNum > 0:
+            sys.exit(1)
+
+##########################################################################
+#   RUN
+##########################################################################
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+
+##########################################################################
+#   IMPORT
+##########################################################################
+
+import os
+import sys
+import tempfile
+import numpy as np
+from PIL import Image
+from optparse import OptionParser
+from indexer.Indexer import Indexer
+from imageprocessor.ImageProcessor import ImageProcessor
+
+##########################################################################
+#   GLOBAL
+##########################################################################
+
+NumRequiredArgs = 0
+DefaultSeed = 0
+DefaultWidth = 64
+DefaultHeight = 48
+
+#   Modes whose first three bands are R, G and B, previous
+#   implementation already read them right
+RgbModeList = [ 'RGB', 'RGBA' ]
+
+#   Lossless file format of each generated image mode
+ModeFormatDict = {
+    'RGB' : 'PNG',
+    'RGBA' : 'PNG',
+    'L' : 'PNG',
+    'P' : 'PNG',
+    'CMYK' : 'TIFF',
+}
+
+##########################################################################
+#   HELPER
+##########################################################################
+
+def getLegacyColorHistogram( imageFilePath ):
+    ''' This function computes color histogram as getColorHistogram()
+        did before using PIL native histogram, pixel by pixel, it only
+        works for images whose first three bands are R, G and B
+    '''
+
+    #   Read input image file path
+    image = Image.open( imageFilePath )
+
+    #   Initialize color histogram of three channels: R, G and B
+    histogram = [0]*(256*3)
+
+    #   Assign each pixel to their respective index of histogram
+    for pixel in image.getdata():
+        for i in range(3):
+            histogram[pixel[i]+(256*i)] += 1
+
+    #   Normalize histogram with number of pixels
+    histogram = tuple( [ x/len(image.getdata()) for x in histogram] )
+
+    return histogram
+
+def getBandHistogram( rgbArray ):
+    ''' This function computes expected color histogram of given
+        height by width by 3 array of R, G and B values
+    '''
+
+    pixelNum = rgbArray.shape[0]*rgbArray.shape[1]
+    bandHistogramList = [ np.bincount( rgbArray[ :, :, band ].ravel(), minlength=256 ) for band in range( 3 ) ]
+
+    return tuple( ( np.concatenate( bandHistogramList ) / pixelNum ).tolist() )
+
+def writeImage( imageDir, mode, width, height, randomState ):
+    ''' This function writes random image of given mode and size, and
+        returns its file path and expected color histogram, computed
+        from its pixel values without PIL conversion
+    '''
+
+    if mode == 'L':
+        pixelArray = randomState.randint( 0, 256, ( height, width ), dtype=np.uint8 )
+        rgbArray = np.repeat( pixelArray[ :, :, None ], 3, axis=2 )
+
+    elif mode == 'P':
+        paletteArray = randomState.randint( 0, 256, ( 256, 3 ), dtype=np.uint8 )
+        pixelArray = randomState.randint( 0, 256, ( height, width ), dtype=np.uint8 )
+        rgbArray = paletteArray[ pixelArray ]
+
+    elif mode == 'CMYK':
+        #   Black is either none or full, for which R, G and B are
+        #   white minus C, M and Y, or black, whichever formula PIL
+        #   converts CMYK with
+        pixelArray = randomState.randint( 0, 256, ( height, width, 4 ), dtype=np.uint8 )
+        pixelArray[ :, :, 3 ] = np.where( randomState.rand( height, width ) < 0.25, 255, 0 )
+        rgbArray = np.where( pixelArray[ :, :, 3:4 ] == 255, 0, 255 - pixelArray[ :, :, :3 ] ).astype( np.uint8 )
+
+    else:
+        pixelArray = randomState.randint( 0, 256, ( height, width, len( mode ) ), dtype=np.uint8 )
+        rgbArray = pixelArray[ :, :, :3 ]
+
+    image = Image.frombytes( mode, ( width, height ), pixelArray.tobytes() )
+    if mode == 'P':
+        image.putpalette( paletteArray.ravel().tolist() )
+
+    imageFilePath = os.path.join( imageDir, '{}.{}'.format( mode, ModeFormatDict[ mode ].lower() ) )
+    image.save( imageFilePath, ModeFormatDict[ mode ] )
+
+    return imageFilePath, getBandHistogram( rgbArray )
+
+def checkImage( name, histogram, expectedHistogram ):
+    ''' This function prints whether given histogram is identical to
+        expected one, and returns whether it is
+    '''
+
+    isIdentical = histogram == expectedHistogram
+
+    if isIdentical:
+        print( '{}: identical'.format( name ) )
+    else:
+        maxDifference = max( abs( x - y ) for x, y in zip( histogram, expectedHistogram ) ) if len( histogram ) == len( expectedHistogram ) else float( 'inf' )
+        print( '{}: DIFFERENT, largest bin difference {}'.format( name, maxDifference ) )
+
+    return isIdentical
+
+##########################################################################
+#   CLASS
+##########################################################################
+
+##########################################################################
+#   MAIN
+##########################################################################
+
+def main():
+
+    parser = OptionParser(usage='usage: %prog [options]',
+                            version='%prog 0.0')
+    parser.add_option( '--seed',
+                        action='store',
+                        type='int',
+                        dest='seed',
+                        default=DefaultSeed,
+                        help='seed of generated images (default = {!r})'.format(DefaultSeed) )
+    parser.add_option( '--width',
+                        action='store',
+                        type='int',
+                        dest='width',
+                        default=DefaultWidth,
+                        help='width of generated images (default = {!r})'.format(DefaultWidth) )
+    parser.add_option( '--height',
+                        action='store',
+                        type='int',
+                        dest='height',
+                        default=DefaultHeight,
+                        help='height of generated images (default = {!r})'.format(DefaultHeight) )
+    parser.add_option( '--imgDir',
+                        action='store',
+                        dest='imgDir',
+                        default=None,
+                        help='also compare R, G and B images of this directory with previous implementation (default = none)' )
+
+    (options, args) = parser.parse_args()
+
+    if len(args) != NumRequiredArgs:
+        parser.error('Incorrect number of arguments')
+        sys.exit(-1)
+
+    randomState = np.random.RandomState( options.seed )
+    isPassed = True
+
+    with tempfile.TemporaryDirectory() as imageDir:
+
+        for mode in ModeFormatDict.keys():
+
+            imageFilePath, expectedHistogram = writeImage( imageDir, mode, options.width, options.height, randomState )
+            histogram = ImageProcessor.getColorHistogram( imageFilePath )
+
+            #   Previous implementation is the reference where it was
+            #   right, pixel values are elsewhere
+            if mode in RgbModeList:
+                isPassed &= checkImage( '{} against previous implementation'.format( mode ), histogram, getLegacyColorHistogram( imageFilePath ) )
+
+            isPassed &= checkImage( '{} against pixel values'.format( mode ), histogram, expectedHistogram )
+
+    #   Images of given directory, as previous implementation read them
+    if options.imgDir is not None:
+
+        for imageFilePath in Indexer.listImageFile( options.imgDir ):
+
+            with Image.open( imageFilePath ) as image:
+                mode = image.mode
+
+            if mode not in RgbModeList:
+                print( '{}: skipped, mode {}'.format( imageFilePath, mode ) )
+                continue
+
+            isPassed &= checkImage( imageFilePath, ImageProcessor.getColorHistogram( imageFilePath ), getLegacyColorHistogram( imageFilePath ) )
+
+    print( 'Passed.' if isPassed else 'FAILED.' )
+
+    if not isPassed:
+        sys.exit(1)
+
+##########################################################################
+#   RUN
+##########################################################################
+
+if __name__ == '__main__':
+    main()
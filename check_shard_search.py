@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+
+##########################################################################
+#   IMPORT
+##########################################################################
+
+import os
+import sys
+import tempfile
+import numpy as np
+from optparse import OptionParser
+from indexer.Indexer import Indexer
+from indexer.ImageData import ImageData
+from indexer.ImageIndex import ImageIndex, CoarseHistogramDtypeDict
+from indexer.IndexFile import IndexFile
+from searcher.Searcher import Searcher
+from searcher.ShardSearcher import ShardSearcher
+
+##########################################################################
+#   GLOBAL
+##########################################################################
+
+NumRequiredArgs = 0
+IndexFileName = 'index.bin'
+DefaultSeed = 0
+DefaultImageNum = 400
+DefaultQueryNum = 50
+DefaultShardNum = 2
+DefaultMaxResultNum = 10
+DefaultMinScore = 0.05
+HistogramDtype = 'float32'
+
+#   Pixels of each generated histogram, as an image of 64 by 48
+PixelNum = 64*48
+
+#   Colors of each graphic, few enough for its shard to be sparse
+GraphicColorNum = 8
+
+#   Layouts of index file, and of shards split from it, auto giving
+#   dense shards of photos and sparse shards of graphics
+IndexLayoutList = [ 'dense', 'sparse' ]
+ShardLayoutList = [ 'auto', 'dense', 'sparse' ]
+
+##########################################################################
+#   HELPER
+##########################################################################
+
+def getHistogram( randomState, isGraphic ):
+    ''' This function returns color histogram of random pixels, of a
+        few colors if graphic, otherwise of nearly every value
+    '''
+
+    if isGraphic:
+        colorArray = randomState.randint( 0, 256, ( GraphicColorNum, 3 ) )
+        pixelArray = colorArray[ randomState.randint( 0, GraphicColorNum, PixelNum ) ]
+    else:
+        pixelArray = randomState.randint( 0, 256, ( PixelNum, 3 ) )
+
+    histogram = np.concatenate( [ np.bincount( pixelArray[ :, band ], minlength=256 ) for band in range( 3 ) ] ) / PixelNum
+
+    return tuple( histogram.astype( np.float32 ).tolist() )
+
+def getImageIndex( randomState, imageNum, histogramDtype ):
+    ''' This function returns index of random histograms, images of
+        even image id are photos and of odd image id graphics, so that
+        shards of them pick different layouts, and every tenth image
+        repeats previous histogram of its kind so that scores tie
+    '''
+
+    imageIdToImageDataDict = dict()
+
+    for imageId in range( imageNum ):
+
+        if imageId % 10 == 9 and imageId >= 2:
+            histogram = imageIdToImageDataDict[ imageId - 2 ].histogram
+        else:
+            histogram = getHistogram( randomState, imageId % 2 == 1 )
+
+        imageIdToImageDataDict[ imageId ] = ImageData( imageId, 'image{}.png'.format( imageId ), histogram )
+
+    return ImageIndex.fromImageDataDict( imageIdToImageDataDict, histogramDtype=histogramDtype )
+
+def getQueryHistogramList( randomState, imageIndex, queryNum ):
+    ''' This function returns histograms of indexed images, which tie
+        with themselves and their repeats, and of new images, half and
+        half of each kind
+    '''
+
+    imageHistogramList = list()
+
+    for query in range( queryNum ):
+
+        if query % 2 == 0:
+            imageHistogramList.append( getHistogram( randomState, query % 4 == 0 ) )
+        else:
+            imageHistogramList.append( imageIndex[ int( imageIndex.imageIdArray[ randomState.randint( len( imageIndex ) ) ] ) ].histogram )
+
+    return imageHistogramList
+
+def checkResult( name, resultListList, expectedResultListList ):
+    ''' This function prints whether results of every query are
+        identical to expected ones, and returns whether they are
+    '''
+
+    differentQueryNum = sum( resultList != expectedResultList for resultList, expectedResultList in zip( resultListList, expectedResultListList ) )
+
+    if differentQueryNum == 0:
+        print( '{}: identical'.format( name ) )
+    else:
+        print( '{}: DIFFERENT, {} of {} queries'.format( name, differentQueryNum, len( expectedResultListList ) ) )
+
+    return differentQueryNum == 0
+
+##########################################################################
+#   CLASS
+##########################################################################
+
+##########################################################################
+#   MAIN
+##########################################################################
+
+def main():
+
+    parser = OptionParser(usage='usage: %prog [options]',
+                            version='%prog 0.0')
+    parser.add_option( '--seed',
+                        action='store',
+                        type='int',
+                        dest='seed',
+                        default=DefaultSeed,
+                        help='seed of generated histograms (default = {!r})'.format(DefaultSeed) )
+    parser.add_option( '--images',
+                        action='store',
+                        type='int',
+                        dest='imageNum',
+                        default=DefaultImageNum,
+                        help='number of generated images (default = {!r})'.format(DefaultImageNum) )
+    parser.add_option( '--queries',
+                        action='store',
+                        type='int',
+                        dest='queryNum',
+                        default=DefaultQueryNum,
+                        help='number of queries (default = {!r})'.format(DefaultQueryNum) )
+    parser.add_option( '--shards',
+                        action='store',
+                        type='int',
+                        dest='shardNum',
+                        default=DefaultShardNum,
+                        help='number of shards (default = {!r})'.format(DefaultShardNum) )
+    parser.add_option( '--histogramDtype',
+                        action='store',
+                        type='choice',
+                        choices=sorted( CoarseHistogramDtypeDict.keys() ),
+                        dest='histogramDtype',
+                        default=HistogramDtype,
+                        help='store histograms as float32, or quantized to uint16 or uint8 (default = {!r})'.format(HistogramDtype) )
+
+    (options, args) = parser.parse_args()
+
+    if len(args) != NumRequiredArgs:
+        parser.error('Incorrect number of arguments')
+        sys.exit(-1)
+
+    randomState = np.random.RandomState( options.seed )
+    imageIndex = getImageIndex( randomState, options.imageNum, options.histogramDtype )
+    imageHistogramList = getQueryHistogramList( randomState, imageIndex, options.queryNum )
+
+    #   Every result, top results and results above minimum score
+    searchSettingList = [ ( None, None ), ( DefaultMaxResultNum, None ), ( None, DefaultMinScore ) ]
+
+    isPassed = True
+    expectedResultListListDict = dict()
+
+    for indexLayout in IndexLayoutList:
+
+        with tempfile.TemporaryDirectory() as indexDir:
+
+            layoutImageIndex = imageIndex.convertHistogramLayout( indexLayout )
+            IndexFile.write( os.path.join( indexDir, IndexFileName ), layoutImageIndex.metadataDict, layoutImageIndex.sectionDict )
+            wholeImageIndex = Indexer.readIndex( indexDir, IndexFileName )
+
+            for searchSetting in searchSettingList:
+
+                maxResultNum, minScore = searchSetting
+                resultListList = [ Searcher.search( wholeImageIndex, imageHistogram, maxResultNum, minScore=minScore ) for imageHistogram in imageHistogramList ]
+
+                #   Index of the other layout gives the same results
+                if searchSetting in expectedResultListListDict:
+                    isPassed &= checkResult( '{} index, maxResult {}, minScore {}, against dense index'.format( indexLayout, maxResultNum, minScore ),
+                                                resultListList, expectedResultListListDict[ searchSetting ] )
+                else:
+                    expectedResultListListDict[ searchSetting ] = resultListList
+
+            for shardLayout in ShardLayoutList:
+
+                Indexer.writeShardIndex( indexDir, IndexFileName, options.shardNum, shardLayout )
+                shardLayoutList = [ Indexer.readIndex( indexDir, shardDict[ 'fileName' ] ).getHistogramLayout()
+                                    for shardDict in Indexer.readShardManifest( indexDir, IndexFileName )[ 'shardList' ] ]
+
+                shardSearcher = ShardSearcher( indexDir, IndexFileName )
+
+                try:
+                    for maxResultNum, minScore in searchSettingList:
+
+                        name = '{} index, {} shards, maxResult {}, minScore {}'.format( indexLayout, '/'.join( shardLayoutList ), maxResultNum, minScore )
+                        expectedResultListList = expectedResultListListDict[ ( maxResultNum, minScore ) ]
+
+                        resultListList = [ shardSearcher.search( imageHistogram, maxResultNum, minScore=minScore ) for imageHistogram in imageHistogramList ]
+                        isPassed &= checkResult( name, resultListList, expectedResultListList )
+
+                        resultListList = shardSearcher.searchBatch( imageHistogramList, maxResultNum, minScore=minScore )
+                        isPassed &= checkResult( name + ', batch', resultListList, expectedResultListList )
+                finally:
+                    shardSearcher.close()
+
+    print( 'Passed.' if isPassed else 'FAILED.' )
+
+    if not isPassed:
+        sys.exit(1)
+
+##########################################################################
+#   RUN
+##########################################################################
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+##########################################################################
+#   IMPORT
+##########################################################################
+
+import sys
+import os
+from optparse import OptionParser
+from indexer.Indexer import Indexer
+
+##########################################################################
+#   GLOBAL
+##########################################################################
+
+NumRequiredArgs = 0
+IndexDir = 'index'
+PickleIndexFileName = 'index.pickle'
+IndexFileName = 'index.bin'
+
+##########################################################################
+#   HELPER
+##########################################################################
+
+##########################################################################
+#   CLASS
+##########################################################################
+
+##########################################################################
+#   MAIN
+##########################################################################
+
+def main():
+
+    parser = OptionParser(usage='usage: %prog [options]',
+                            version='%prog 0.0')
+    parser.add_option( '--pickleFile',
+                        action='store',
+                        dest='pickleIndexFilePath',
+                        default=os.path.join( IndexDir, PickleIndexFileName ),
+                        help='pickle index file path (default = {!r})'.format(os.path.join( IndexDir, PickleIndexFileName )) )
+
+    (options, args) = parser.parse_args()
+
+    #   Parse options
+    pickleIndexFilePath = options.pickleIndexFilePath
+
+    if len(args) != NumRequiredArgs:
+        parser.error('Incorrect number of arguments')
+        sys.exit(-1)
+
+    #   Convert pickle index file to index file
+    Indexer.convertPickleIndex( pickleIndexFilePath, IndexDir, IndexFileName )
+
+##########################################################################
+#   RUN
+##########################################################################
+
+if __name__ == '__main__':
+    main()
@@ -4,9 +4,16 @@
 #   IMPORT
 ##########################################################################
 
+import os
 import sys
 from optparse import OptionParser
-from indexer.Indexer import Indexer
+from metrics.Metrics import Metrics, addMetricsOption
+from indexer.Indexer import Indexer, DefaultWorkerNum
+from indexer.IngestPipeline import DefaultIoThreadNum
+from indexer.ImageIndex import CoarseHistogramDtypeDict, HistogramLayoutList, DefaultHistogramLayout
+from indexer.HistogramCache import HistogramCache, DefaultMaxByteNum
+from indexer.ImageFileWalker import ImageFileWalker, ImageFileExtensionList, SymlinkPolicyList, SymlinkFile
+from indexer.IndexWatcher import IndexWatcher, DefaultPollSeconds
 
 ##########################################################################
 #   GLOBAL
@@ -15,7 +22,13 @@ from indexer.Indexer import Indexer
 NumRequiredArgs = 0
 ImageDir = '../image'
 IndexDir = 'index'
-IndexFileName = 'index.pickle'
+IndexFileName = 'index.bin'
+HistogramDtype = 'float32'
+
+#   Extension option value keeping files of any extension
+AnyExtension = '*'
+
+HistogramCacheFileName = 'histogram_cache.sqlite'
 
 ##########################################################################
 #   HELPER
@@ -38,21 +51,214 @@ def main():
                         dest='imgDir',
                         default=ImageDir,
                         help='text file directory (default = {!r})'.format(ImageDir) )
+    parser.add_option( '--noRecursive',
+                        dest='isNotRecursive',
+                        action='store_true',
+                        default=False,
+                        help='only index images directly inside image directory, not inside its subdirectories' )
+    parser.add_option( '--extensions',
+                        action='store',
+                        dest='extensions',
+                        default=','.join( ImageFileExtensionList ),
+                        help='comma separated extensions of image files to index, {!r} for any extension (default = {!r})'.format(AnyExtension, ','.join( ImageFileExtensionList )) )
+    parser.add_option( '--magic',
+                        dest='isMagicChecked',
+                        action='store_true',
+                        default=False,
+                        help='also check leading bytes of files so that only known image formats are indexed' )
+    parser.add_option( '--symlinks',
+                        action='store',
+                        type='choice',
+                        choices=SymlinkPolicyList,
+                        dest='symlinkPolicy',
+                        default=SymlinkFile,
+                        help='skip symbolic links, follow links to files only, or follow links to directories too (default = {!r})'.format(SymlinkFile) )
+    parser.add_option( '--hidden',
+                        dest='isHiddenIncluded',
+                        action='store_true',
+                        default=False,
+                        help='also index hidden files and directories, whose name starts with a dot' )
+    parser.add_option( '--workers',
+                        action='store',
+                        type='int',
+                        dest='workerNum',
+                        default=DefaultWorkerNum,
+                        help='number of worker processes (default = {!r})'.format(DefaultWorkerNum) )
+    parser.add_option( '--ioThreads',
+                        action='store',
+                        type='int',
+                        dest='ioThreadNum',
+                        default=DefaultIoThreadNum,
+                        help='number of threads reading image files ahead of decoding, more help on network or spinning disks (default = {!r})'.format(DefaultIoThreadNum) )
+    parser.add_option( '--full',
+                        dest='isFull',
+                        action='store_true',
+                        default=False,
+                        help='recompute all images instead of only new or modified ones' )
+    parser.add_option( '--hash',
+                        dest='isHashed',
+                        action='store_true',
+                        default=False,
+                        help='detect modified images by content hash' )
+    parser.add_option( '--maxDecodeSize',
+                        action='store',
+                        type='int',
+                        dest='maxDecodeSize',
+                        default=None,
+                        help='decode images at reduced resolution, keeping their longest side about this size (default = full resolution)' )
+    parser.add_option( '--histogramDtype',
+                        action='store',
+                        type='choice',
+                        choices=sorted( CoarseHistogramDtypeDict.keys() ),
+                        dest='histogramDtype',
+                        default=HistogramDtype,
+                        help='store histograms as float32, or quantized to uint16 or uint8 (default = {!r})'.format(HistogramDtype) )
+    parser.add_option( '--histogramScale',
+                        action='store',
+                        type='float',
+                        dest='histogramScale',
+                        default=None,
+                        help='multiply histogram bins by this scale before quantizing, larger scale saturates large bins (default = largest integer)' )
+    parser.add_option( '--histogramLayout',
+                        action='store',
+                        type='choice',
+                        choices=HistogramLayoutList,
+                        dest='histogramLayout',
+                        default=DefaultHistogramLayout,
+                        help='store every histogram bin (dense), only non-empty bins (sparse), or sparse if few bins are filled, per index and per shard (auto) (default = {!r})'.format(DefaultHistogramLayout) )
+    parser.add_option( '--histogramCache',
+                        action='store',
+                        dest='histogramCacheFilePath',
+                        default=os.path.join( IndexDir, HistogramCacheFileName ),
+                        help='histogram cache file, shared by index builds of any image directory, images of cached content are not decoded again (default = {!r})'.format(os.path.join( IndexDir, HistogramCacheFileName )) )
+    parser.add_option( '--histogramCacheSize',
+                        action='store',
+                        type='int',
+                        dest='histogramCacheMegabyteNum',
+                        default=DefaultMaxByteNum >> 20,
+                        help='maximum size of histogram cache in megabytes, histograms used least recently are evicted beyond it (default = {!r})'.format(DefaultMaxByteNum >> 20) )
+    parser.add_option( '--noHistogramCache',
+                        dest='isHistogramCacheDisabled',
+                        action='store_true',
+                        default=False,
+                        help='neither read nor write histogram cache, which also saves hashing new images' )
+    parser.add_option( '--thumbnailSize',
+                        action='store',
+                        type='int',
+                        dest='thumbnailSize',
+                        default=None,
+                        help='also write thumbnails of this longest side to thumbnail pack next to index, shown as previews by the gui (default = none)' )
+    parser.add_option( '--annClusters',
+                        action='store',
+                        type='int',
+                        dest='annClusterNum',
+                        default=None,
+                        help='build approximate nearest neighbour index with this many clusters, incremental build keeps cluster number of previous index (default = none)' )
+    parser.add_option( '--shards',
+                        action='store',
+                        type='int',
+                        dest='shardNum',
+                        default=None,
+                        help='also split index into this many shard files, searched in parallel by search_index_dir.py --shards (default = none)' )
+    parser.add_option( '--watch',
+                        dest='isWatched',
+                        action='store_true',
+                        default=False,
+                        help='after indexing, keep polling image directory and record created, modified and deleted images in delta log of index until interrupted' )
+    parser.add_option( '--pollInterval',
+                        action='store',
+                        type='float',
+                        dest='pollSeconds',
+                        default=DefaultPollSeconds,
+                        help='seconds between two polls of image directory in watch mode (default = {!r})'.format(DefaultPollSeconds) )
+    parser.add_option( '--compact',
+                        dest='isCompacted',
+                        action='store_true',
+                        default=False,
+                        help='only fold delta log written by watch mode into index file, without walking image directory' )
+
+    addMetricsOption( parser )
 
     (options, args) = parser.parse_args()
 
     #   Parse options
     imageDir = options.imgDir
+    workerNum = options.workerNum
+    isFull = options.isFull
+    isHashed = options.isHashed
+    maxDecodeSize = options.maxDecodeSize
+    histogramDtype = options.histogramDtype
+    histogramScale = options.histogramScale
+    histogramLayout = options.histogramLayout
+    thumbnailSize = options.thumbnailSize
+    annClusterNum = options.annClusterNum
+    shardNum = options.shardNum
+
+    extensionList = None
+    if options.extensions != AnyExtension:
+        extensionList = [ extension if extension.startswith( '.' ) else '.' + extension for extension in options.extensions.split( ',' ) if len( extension ) > 0 ]
+
+    imageFileWalker = ImageFileWalker( not options.isNotRecursive, extensionList, options.isMagicChecked, options.symlinkPolicy, options.isHiddenIncluded )
 
     if len(args) != NumRequiredArgs:
         parser.error('Incorrect number of arguments')
         sys.exit(-1)
 
+    #   Record metrics and profile of this run if asked
+    Metrics.startRun( options.metricsFilePath, options.profileFilePath )
+
+    #   Fold delta log into index file and stop
+    if options.isCompacted:
+        recordNum = Indexer.compactIndex( IndexDir, IndexFileName )
+        print( 'generate_index_dir() - Folded {} changes of delta log into index.'.format( recordNum ) )
+        return
+
+    #   Open histogram cache shared by builds
+    histogramCache = None
+    if not options.isHistogramCacheDisabled:
+        histogramCache = HistogramCache( options.histogramCacheFilePath, options.histogramCacheMegabyteNum << 20 )
+
+    #   Index file is written again without approximate nearest
+    #   neighbour sections, incremental build trains them again with
+    #   cluster number of previous index unless another one is given
+    previousAnnClusterNum = Indexer.getAnnClusterNum( IndexDir, IndexFileName )
+    if annClusterNum is None and previousAnnClusterNum is not None:
+        if isFull:
+            print( 'generate_index_dir() - Full build drops approximate index of {} clusters, use --annClusters to build it again.'.format( previousAnnClusterNum ) )
+        else:
+            annClusterNum = previousAnnClusterNum
+            print( 'generate_index_dir() - Build approximate index of {} clusters again as previous index.'.format( annClusterNum ) )
+
     #   Create indexing structure of given images inside directory
-    imageIdToImageDataDict = Indexer.index( imageDir )
-    
-    #   Write to file
-    Indexer.writeIndex( imageIdToImageDataDict, IndexDir, IndexFileName )
+    #   and write it to file batch by batch, resuming interrupted
+    #   build and only processing new or modified images unless
+    #   full build is asked
+    try:
+        Indexer.indexToFile( imageDir, IndexDir, IndexFileName, workerNum, options.ioThreadNum, isIncremental=not isFull, isHashed=isHashed, maxDecodeSize=maxDecodeSize,
+                                histogramDtype=histogramDtype, histogramScale=histogramScale, imageFileWalker=imageFileWalker, histogramCache=histogramCache,
+                                histogramLayout=histogramLayout, thumbnailSize=thumbnailSize )
+
+        #   Cluster histograms for approximate search
+        if annClusterNum is not None:
+            Indexer.buildAnnIndex( IndexDir, IndexFileName, annClusterNum )
+
+        #   Split index into shards, only rewriting changed ones
+        if shardNum is not None:
+            writtenShardList = Indexer.writeShardIndex( IndexDir, IndexFileName, shardNum, histogramLayout )
+            print( 'generate_index_dir() - Wrote {} of {} shards.'.format( len( writtenShardList ), shardNum ) )
+
+        #   Keep index up to date with image directory
+        if options.isWatched:
+            indexWatcher = IndexWatcher( imageDir, IndexDir, IndexFileName, workerNum, options.ioThreadNum, isHashed, imageFileWalker,
+                                            histogramCache, options.pollSeconds )
+            try:
+                indexWatcher.run()
+            except KeyboardInterrupt:
+                print( 'generate_index_dir() - Stop watching.' )
+
+    finally:
+        if histogramCache is not None:
+            histogramCache.close()
 
 ##########################################################################
 #   RUN
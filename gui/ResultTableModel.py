@@ -0,0 +1,276 @@
+##########################################################################
+#   IMPORT
+##########################################################################
+
+import collections
+import numpy as np
+from typing import List, Tuple, Dict, Optional
+
+from PyQt5 import QtWidgets
+from PyQt5 import QtGui
+from PyQt5 import QtCore
+
+from indexer.ImageIndex import ImageIndex
+from indexer.ThumbnailPack import ThumbnailPack
+
+##########################################################################
+#   GLOBAL
+##########################################################################
+
+PreviewColumn = 0
+ScoreColumn = 1
+IdColumn = 2
+FilePathColumn = 3
+ActionColumn = 4
+
+HeaderLabelList = [ 'Preview', 'Score', 'Id', 'FilePath', 'Action' ]
+
+ActionText = 'Open'
+
+#   Number of decoded thumbnails kept in memory, those shown least
+#   recently are dropped beyond it
+DefaultThumbnailCacheNum = 256
+
+##########################################################################
+#   HELPER
+##########################################################################
+
+def getImageFilePath( imageIdToImageDataDict : Dict, imageId : int ) -> str:
+    ''' This function returns image file path of given image id,
+        without constructing image data if index is columnar
+    '''
+
+    if isinstance( imageIdToImageDataDict, ImageIndex ):
+        return imageIdToImageDataDict.getImageFilePath( imageIdToImageDataDict.getRow( imageId ) )
+
+    return imageIdToImageDataDict[ imageId ].imageFilePath
+
+def getFileSizeMtime( imageIdToImageDataDict : Dict, imageId : int ) -> Tuple[Optional[int], Optional[int]]:
+    ''' This function returns file size and modification time of given
+        image id as indexed, without constructing image data if index
+        is columnar
+    '''
+
+    if isinstance( imageIdToImageDataDict, ImageIndex ):
+        return imageIdToImageDataDict.getFileSizeMtime( imageIdToImageDataDict.getRow( imageId ) )
+
+    imageData = imageIdToImageDataDict[ imageId ]
+
+    return getattr( imageData, 'fileSize', None ), getattr( imageData, 'fileMtime', None )
+
+##########################################################################
+#   CLASS
+##########################################################################
+
+class ResultTableModel( QtCore.QAbstractTableModel ):
+    ''' This class holds search results as arrays of score and image
+        id for a table view, which only asks for cells of visible rows
+
+        Image file paths are looked up when their rows are shown, and
+        sorting reorders an array of result positions instead of the
+        results themselves
+
+        Thumbnails of memory mapped thumbnail pack are likewise decoded
+        when their rows are shown, and kept in a bounded cache by image
+        id and file manifest across searches
+    '''
+
+    def __init__( self, parent : Optional[QtCore.QObject] = None, thumbnailCacheNum : int = DefaultThumbnailCacheNum ):
+        super(ResultTableModel, self).__init__( parent )
+
+        self.imageIdToImageDataDict = dict()
+        self.scoreArray = np.zeros( 0, dtype=np.float64 )
+        self.imageIdArray = np.zeros( 0, dtype=np.int64 )
+        self.orderArray = np.zeros( 0, dtype=np.int64 )
+        self.imageFilePathDict = dict()
+        self.sortColumn = None
+        self.sortOrder = QtCore.Qt.DescendingOrder
+        self.thumbnailPack = None
+        self.thumbnailCacheNum = thumbnailCacheNum
+        self.thumbnailPixmapDict = collections.OrderedDict()
+
+    def setResultList( self, imageIdToImageDataDict : Dict, imageIdToHistogramSimilarityTupleList : List[Tuple[int, float]] ):
+        ''' This function replaces shown results with given list of
+            image id and histogram similarity tuple of given index
+        '''
+
+        self.beginResetModel()
+
+        self.imageIdToImageDataDict = imageIdToImageDataDict
+        self.imageIdArray = np.array( [ imageId for imageId, _ in imageIdToHistogramSimilarityTupleList ], dtype=np.int64 )
+        self.scoreArray = np.array( [ score for _, score in imageIdToHistogramSimilarityTupleList ], dtype=np.float64 )
+        self.orderArray = np.arange( len( self.scoreArray ) )
+        self.imageFilePathDict = dict()
+
+        #   Keep order chosen on header for new results
+        if self.sortColumn is not None:
+            self.orderArray = self.getOrderArray( self.sortColumn, self.sortOrder )
+
+        self.endResetModel()
+
+    def setThumbnailPack( self, thumbnailPack : Optional[ThumbnailPack] ):
+        ''' This function replaces thumbnail pack previews are read from,
+            thumbnails decoded from previous one are dropped
+        '''
+
+        self.thumbnailPack = thumbnailPack
+        self.thumbnailPixmapDict = collections.OrderedDict()
+
+        if len( self.orderArray ) > 0:
+            self.dataChanged.emit( self.index( 0, PreviewColumn ), self.index( len( self.orderArray ) - 1, PreviewColumn ) )
+
+    def getThumbnailPixmap( self, position : int ) -> Optional[QtGui.QPixmap]:
+        ''' This function returns thumbnail of result at given position
+            of results, or None if thumbnail pack has none of its image
+            file as indexed
+        '''
+
+        imageId = int( self.imageIdArray[ position ] )
+
+        #   Image of the same image id may be updated in index read
+        #   again, so thumbnails are kept by file manifest too
+        key = ( imageId, ) + getFileSizeMtime( self.imageIdToImageDataDict, imageId )
+
+        if key in self.thumbnailPixmapDict:
+            self.thumbnailPixmapDict.move_to_end( key )
+            return self.thumbnailPixmapDict[ key ]
+
+        thumbnailPixmap = None
+        thumbnailBytes = self.thumbnailPack.getThumbnail( *key )
+
+        if thumbnailBytes is not None:
+            thumbnailPixmap = QtGui.QPixmap()
+            if not thumbnailPixmap.loadFromData( thumbnailBytes ):
+                thumbnailPixmap = None
+
+        #   Missing thumbnail is kept as well, so it is not looked up
+        #   on every paint
+        self.thumbnailPixmapDict[ key ] = thumbnailPixmap
+        if len( self.thumbnailPixmapDict ) > self.thumbnailCacheNum:
+            self.thumbnailPixmapDict.popitem( last=False )
+
+        return thumbnailPixmap
+
+    def getImageId( self, row : int ) -> int:
+        ''' This function returns image id of result shown at given row
+        '''
+
+        return int( self.imageIdArray[ self.orderArray[ row ] ] )
+
+    def getResultImageFilePath( self, position : int ) -> str:
+        ''' This function returns image file path of result at given
+            position of results, looked up once
+        '''
+
+        if position not in self.imageFilePathDict:
+            self.imageFilePathDict[ position ] = getImageFilePath( self.imageIdToImageDataDict, int( self.imageIdArray[ position ] ) )
+
+        return self.imageFilePathDict[ position ]
+
+    def getImageFilePath( self, row : int ) -> str:
+        ''' This function returns image file path of result shown at
+            given row
+        '''
+
+        return self.getResultImageFilePath( int( self.orderArray[ row ] ) )
+
+    def getOrderArray( self, column : int, order ) -> np.ndarray:
+        ''' This function returns result positions ordered by given
+            column, tied results keep their search order
+        '''
+
+        isDescending = order == QtCore.Qt.DescendingOrder
+
+        if column == ScoreColumn:
+            return np.argsort( -self.scoreArray if isDescending else self.scoreArray, kind='stable' )
+
+        if column == IdColumn:
+            return np.argsort( -self.imageIdArray if isDescending else self.imageIdArray, kind='stable' )
+
+        if column == FilePathColumn:
+            positionList = sorted( range( len( self.imageIdArray ) ), key=self.getResultImageFilePath, reverse=isDescending )
+            return np.array( positionList, dtype=np.int64 )
+
+        return self.orderArray
+
+    def rowCount( self, parent : QtCore.QModelIndex = QtCore.QModelIndex() ) -> int:
+
+        return 0 if parent.isValid() else len( self.orderArray )
+
+    def columnCount( self, parent : QtCore.QModelIndex = QtCore.QModelIndex() ) -> int:
+
+        return 0 if parent.isValid() else len( HeaderLabelList )
+
+    def data( self, index : QtCore.QModelIndex, role : int = QtCore.Qt.DisplayRole ):
+
+        if not index.isValid():
+            return None
+
+        position = int( self.orderArray[ index.row() ] )
+
+        if index.column() == PreviewColumn:
+            if role != QtCore.Qt.DecorationRole or self.thumbnailPack is None:
+                return None
+            return self.getThumbnailPixmap( position )
+
+        if role != QtCore.Qt.DisplayRole:
+            return None
+
+        if index.column() == ScoreColumn:
+            return str( float( self.scoreArray[ position ] ) )
+        if index.column() == IdColumn:
+            return str( int( self.imageIdArray[ position ] ) )
+        if index.column() == FilePathColumn:
+            return self.getResultImageFilePath( position )
+
+        return ActionText
+
+    def headerData( self, section : int, orientation, role : int = QtCore.Qt.DisplayRole ):
+
+        if role != QtCore.Qt.DisplayRole:
+            return None
+
+        if orientation == QtCore.Qt.Horizontal:
+            return HeaderLabelList[ section ]
+
+        return str( section + 1 )
+
+    def sort( self, column : int, order = QtCore.Qt.AscendingOrder ):
+
+        #   Preview and action columns have nothing to sort, and no
+        #   column means search order
+        if column < 0 or column in ( PreviewColumn, ActionColumn ):
+            return
+
+        self.layoutAboutToBeChanged.emit()
+
+        self.sortColumn = column
+        self.sortOrder = order
+        self.orderArray = self.getOrderArray( column, order )
+
+        self.layoutChanged.emit()
+
+class ActionButtonDelegate( QtWidgets.QStyledItemDelegate ):
+    ''' This class paints action column cells as push buttons and
+        emits clicked signal with row of clicked one, so that no
+        button widget is constructed per row
+    '''
+
+    clicked = QtCore.pyqtSignal( int )
+
+    def paint( self, painter, option, index : QtCore.QModelIndex ):
+
+        buttonOption = QtWidgets.QStyleOptionButton()
+        buttonOption.rect = option.rect
+        buttonOption.text = index.data()
+        buttonOption.state = QtWidgets.QStyle.State_Enabled | QtWidgets.QStyle.State_Raised
+
+        QtWidgets.QApplication.style().drawControl( QtWidgets.QStyle.CE_PushButton, buttonOption, painter )
+
+    def editorEvent( self, event, model, option, index : QtCore.QModelIndex ) -> bool:
+
+        if event.type() == QtCore.QEvent.MouseButtonRelease and event.button() == QtCore.Qt.LeftButton and option.rect.contains( event.pos() ):
+            self.clicked.emit( index.row() )
+            return True
+
+        return False
@@ -4,6 +4,7 @@
 
 import os
 import time
+import threading
 from typing import Optional
 
 from PIL import Image
@@ -12,8 +13,12 @@ from PyQt5 import QtGui
 from PyQt5 import QtCore
 
 from .PyQtHelper import getIntValidator
+from .ResultTableModel import ResultTableModel, ActionButtonDelegate, ActionColumn, FilePathColumn, PreviewColumn
 from indexer.Indexer import Indexer
 from imageprocessor.ImageProcessor import ImageProcessor
+from searcher.Searcher import Searcher
+from searcher.QueryCache import QueryCache
+from metrics.Metrics import Metrics
 
 ##########################################################################
 #   GLOBAL
@@ -21,6 +26,13 @@ from imageprocessor.ImageProcessor import ImageProcessor
 
 DefaultMaxResultNum = 10
 
+#   Interval at which index file and its delta log are checked for
+#   changes, such as images added by watch mode
+IndexPollMilliseconds = 2000
+
+#   Space around thumbnail in preview cell
+PreviewMargin = 4
+
 WindowTitle = 'Simple Image Search Engine'
 
 ##########################################################################
@@ -51,28 +63,98 @@ def getOpenImageFunc( imageFilePath ):
 ##########################################################################
 
 class QueryThread( QtCore.QThread ):
+    ''' This class searches index in background, chunk of index by
+        chunk, emitting results so far after each chunk and final
+        results once, and stops between two chunks once cancelled
+    '''
 
     signal = QtCore.pyqtSignal('PyQt_PyObject')
+    progressSignal = QtCore.pyqtSignal('PyQt_PyObject', float)
+    errorSignal = QtCore.pyqtSignal(str)
 
-    def __init__(self, imageIdToImageDataDict, inputImageFilePath, isDebug=False):
+    def __init__(self, imageIdToImageDataDict, inputImageFilePath, maxResultNum=None, isDebug=False, probeNum=None, queryCache=None):
         QtCore.QThread.__init__(self)
         self.imageIdToImageDataDict = imageIdToImageDataDict
         self.inputImageFilePath = inputImageFilePath
+        self.maxResultNum = maxResultNum
         self.isDebug = isDebug
+        self.probeNum = probeNum
+        self.queryCache = queryCache
+        self.cancelEvent = threading.Event()
+
+    def cancel(self):
+        ''' This function asks query thread to stop at its next chunk,
+            it emits no more results
+        '''
+
+        self.cancelEvent.set()
+
+    def isCancelled(self):
+        ''' This function checks if query thread was cancelled
+        '''
+
+        return self.cancelEvent.is_set()
+
+    def iterateSearch(self):
+        ''' This function returns iterator of results so far and
+            fraction of index compared
+        '''
+
+        if self.queryCache is not None:
+
+            #   Search through cache of previous queries
+            return self.queryCache.iterateSearch( self.imageIdToImageDataDict, self.inputImageFilePath, self.maxResultNum, self.probeNum )
+
+        #   Compute given image color histogram, at the same
+        #   resolution as the index was computed
+        imageHistogram = ImageProcessor.getColorHistogram( self.inputImageFilePath, Indexer.getMaxDecodeSize( self.imageIdToImageDataDict ) )
+
+        #   Compare color histogram of input image with index and
+        #   select most similar ones
+        return Searcher.iterateSearch( self.imageIdToImageDataDict, imageHistogram, self.maxResultNum, self.probeNum )
 
     def run(self):
         
         #   Start timer
         startTime = time.time()
+        firstResultTime = None
+
+        imageIdToHistogramSimilarityTupleList = list()
+
+        with Metrics.time( 'gui.query' ):
 
-        #   Compute given image color histogram
-        imageHistogram = ImageProcessor.getColorHistogram( self.inputImageFilePath )
+            resultIterator = None
 
-        #   Compare color histogram of input image with index
-        imageIdToHistogramSimilarityTupleList = [ ( imageId, ImageProcessor.compareColorHistogram( imageHistogram, imageData.histogram ) ) for imageId, imageData in self.imageIdToImageDataDict.items() ]
+            try:
+                resultIterator = self.iterateSearch()
 
-        #   Sort by color histogram similarity
-        imageIdToHistogramSimilarityTupleList.sort( key=lambda x: x[1], reverse=True )
+                for imageIdToHistogramSimilarityTupleList, comparedFraction in resultIterator:
+
+                    if self.isCancelled():
+                        break
+
+                    if firstResultTime is None:
+                        firstResultTime = time.time()
+                        Metrics.addTime( 'gui.firstResult', firstResultTime - startTime )
+
+                    self.progressSignal.emit( imageIdToHistogramSimilarityTupleList, comparedFraction )
+
+            except Exception as e:
+                self.errorSignal.emit( '{}: {}'.format( type(e).__name__, e ) )
+                return
+
+            finally:
+                #   Stop comparing index right away when cancelled
+                if resultIterator is not None:
+                    resultIterator.close()
+
+        if self.isCancelled():
+            Metrics.count( 'gui.cancelledQueryNum' )
+
+            if self.isDebug:
+                print( 'Cancelled query after {} seconds.'.format( time.time() - startTime ) )
+
+            return
 
         #   End timer
         deltaTime = time.time() - startTime
@@ -80,22 +162,98 @@ class QueryThread( QtCore.QThread ):
         if self.isDebug:
 
             #   Display timer log message
+            print( 'First results in {} seconds.'.format( firstResultTime - startTime ) )
             print( 'Queried in {} seconds.'.format( deltaTime ) )
 
+            if self.queryCache is not None:
+                print( 'Cache counters {}.'.format( self.queryCache.getCounterDict() ) )
+
+            #   Display time spent in each stage so far
+            print( Metrics.getTimerReport() )
+
         #   Return result
         self.signal.emit( imageIdToHistogramSimilarityTupleList )
 
+class IndexLoadThread( QtCore.QThread ):
+    ''' This class reads index in background, emits it with its
+        thumbnail pack as soon as it can be searched, then loads its
+        pages reporting progress in percent, so that window does not
+        wait for index
+
+        Thumbnail pack is memory mapped but not loaded, thumbnails are
+        read when shown
+    '''
+
+    indexSignal = QtCore.pyqtSignal('PyQt_PyObject', 'PyQt_PyObject')
+    progressSignal = QtCore.pyqtSignal(int)
+    errorSignal = QtCore.pyqtSignal(str)
+
+    def __init__(self, indexDir, indexFileName, isDebug=False):
+        QtCore.QThread.__init__(self)
+        self.indexDir = indexDir
+        self.indexFileName = indexFileName
+        self.isDebug = isDebug
+
+    def run(self):
+
+        #   Start timer
+        startTime = time.time()
+
+        try:
+            imageIndex = Indexer.readIndex( self.indexDir, self.indexFileName )
+        except Exception as e:
+            self.errorSignal.emit( '{}: {}'.format( type(e).__name__, e ) )
+            return
+
+        #   Index is searched without previews if thumbnail pack cannot
+        #   be read
+        try:
+            thumbnailPack = Indexer.readThumbnailPack( self.indexDir, self.indexFileName )
+        except ValueError as e:
+            print( 'Cannot read thumbnail pack, {}'.format( e ) )
+            thumbnailPack = None
+
+        #   Memory mapped index is searchable right away, pages not
+        #   loaded yet are read by search itself
+        self.indexSignal.emit( imageIndex, thumbnailPack )
+
+        percent = 0
+        for fraction in imageIndex.iterateLoad():
+            if int( fraction*100 ) > percent:
+                percent = int( fraction*100 )
+                self.progressSignal.emit( percent )
+
+        if self.isDebug:
+
+            #   Display timer log message
+            print( 'Loaded index in {} seconds.'.format( time.time() - startTime ) )
+
 class SimpleImageSearchEngineWindow( QtWidgets.QMainWindow ):
 
-    def __init__(self, indexDir : str, indexFileName : str, isDebug : Optional[bool]=False):
+    def __init__(self, indexDir : str, indexFileName : str, isDebug : Optional[bool]=False, probeNum : Optional[int]=None):
         super(SimpleImageSearchEngineWindow, self).__init__()
 
-        self.imageIdToImageDataDict = Indexer.readIndex( indexDir, indexFileName )
+        #   Index is read by index load thread
+        self.imageIdToImageDataDict = None
+        self.indexDir = indexDir
+        self.indexFileName = indexFileName
+        self.indexLoadThread = None
         self.isDebug = isDebug
+        self.probeNum = probeNum
+        self.queryCache = QueryCache()
+        self.queryThread = None
+        self.cancelledQueryThreadList = list()
         self.maxResultNum = DefaultMaxResultNum
         self.setWindowTitle( WindowTitle )
         self.createGuiComponents()
         self.initializeGuiComponents()
+        self.beginLoad( indexDir, indexFileName )
+
+        #   Read index again once it changes, current index stays
+        #   searchable meanwhile
+        self.indexPollTimer = QtCore.QTimer( self )
+        self.indexPollTimer.timeout.connect( self.pollIndex )
+        self.indexPollTimer.start( IndexPollMilliseconds )
 
     def createGuiComponents(self):
         
@@ -142,8 +300,18 @@ class SimpleImageSearchEngineWindow( QtWidgets.QMainWindow ):
         self.buttonSearch.setText( 'Search' )
         self.buttonSearch.setSizePolicy( QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum )
 
+        #
+        #   Cancel Button
+        #
+
+        self.buttonCancel = QtWidgets.QPushButton()
+        self.buttonCancel.setText( 'Cancel' )
+        self.buttonCancel.setSizePolicy( QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Minimum )
+        self.buttonCancel.setEnabled(False)
+
         topLayout.addWidget(groupBoxSearchOption)
         topLayout.addWidget(self.buttonSearch)
+        topLayout.addWidget(self.buttonCancel)
 
         #
         #   Result Table
@@ -155,13 +323,24 @@ class SimpleImageSearchEngineWindow( QtWidgets.QMainWindow ):
         #   Create result vertical layout
         vBoxResult = QtWidgets.QVBoxLayout()
 
-        #   Create result table widget
-        self.tableResult = QtWidgets.QTableWidget()
-        self.tableResult.setRowCount(0)
-        self.tableResult.setColumnCount(4)
-        self.tableResult.setHorizontalHeaderLabels(['Score', 'Id', 'FilePath', 'Action'])
-        self.tableResult.setSortingEnabled(True)
+        #   Create result table view, it only renders visible rows
+        #   of result table model
+        self.resultTableModel = ResultTableModel( self )
+        self.actionButtonDelegate = ActionButtonDelegate( self )
+
+        self.tableResult = QtWidgets.QTableView()
+        self.tableResult.setModel( self.resultTableModel )
+        self.tableResult.setItemDelegateForColumn( ActionColumn, self.actionButtonDelegate )
         self.tableResult.setEditTriggers( QtWidgets.QAbstractItemView.NoEditTriggers )
+        self.tableResult.horizontalHeader().setSectionResizeMode( FilePathColumn, QtWidgets.QHeaderView.Stretch )
+        self.tableResult.verticalHeader().setSectionResizeMode( QtWidgets.QHeaderView.Fixed )
+
+        #   Preview column is shown once index has thumbnails
+        self.tableResult.setColumnHidden( PreviewColumn, True )
+
+        #   Keep search order until a header is clicked
+        self.tableResult.horizontalHeader().setSortIndicator( -1, QtCore.Qt.DescendingOrder )
+        self.tableResult.setSortingEnabled(True)
 
         vBoxResult.addWidget(self.tableResult)
 
@@ -172,6 +351,16 @@ class SimpleImageSearchEngineWindow( QtWidgets.QMainWindow ):
 
         mainLayout.addLayout( topLayout )
         mainLayout.addLayout( bottomLayout )
+
+        #
+        #   Index Load Progress
+        #
+
+        self.progressBarLoad = QtWidgets.QProgressBar()
+        self.progressBarLoad.setRange( 0, 100 )
+        self.progressBarLoad.setMaximumWidth( 200 )
+
+        self.statusBar().addPermanentWidget( self.progressBarLoad )
         
         widget.setLayout(mainLayout)
         self.setCentralWidget(widget)
@@ -189,6 +378,112 @@ class SimpleImageSearchEngineWindow( QtWidgets.QMainWindow ):
         #   Set callback function for search button
         self.buttonSearch.clicked.connect( self.buttonSearch_cb )
 
+        #   Set callback function for cancel button
+        self.buttonCancel.clicked.connect( self.buttonCancel_cb )
+
+        #   Set callback function for open buttons of result table
+        self.actionButtonDelegate.clicked.connect( self.buttonOpen_cb )
+
+    def beginLoad( self, indexDir, indexFileName ):
+        ''' This function constructs index load thread and runs it,
+            searching is disabled until index is read
+        '''
+
+        self.buttonSearch.setEnabled(False)
+        self.statusBar().showMessage( 'Reading index...' )
+
+        self.indexLoadThread = IndexLoadThread( indexDir, indexFileName, self.isDebug )
+        self.indexLoadThread.indexSignal.connect( self.finishRead )
+        self.indexLoadThread.progressSignal.connect( self.progressBarLoad.setValue )
+        self.indexLoadThread.errorSignal.connect( self.failLoad )
+        self.indexLoadThread.finished.connect( self.finishLoad )
+        self.indexLoadThread.start()
+
+    def finishRead( self, imageIndex, thumbnailPack ):
+        ''' This function gets index from index load thread and enables
+            searching while its pages are being loaded
+        '''
+
+        self.imageIdToImageDataDict = imageIndex
+        self.setThumbnailPack( thumbnailPack )
+        self.buttonSearch.setEnabled(True)
+        self.statusBar().showMessage( 'Loading {} images...'.format( len( imageIndex ) ) )
+
+    def failLoad( self, errorMessage ):
+        ''' This function shows why index cannot be read
+        '''
+
+        self.progressBarLoad.hide()
+        self.statusBar().showMessage( 'Cannot read index, {}'.format( errorMessage ) )
+
+    def finishLoad( self ):
+        ''' This function hides load progress once index is loaded
+        '''
+
+        if self.imageIdToImageDataDict is not None:
+            self.progressBarLoad.hide()
+            self.statusBar().showMessage( 'Loaded {} images.'.format( len( self.imageIdToImageDataDict ) ) )
+
+    def pollIndex( self ):
+        ''' This function reads index again in background if index file
+            or its delta log changed since index was read
+        '''
+
+        if self.imageIdToImageDataDict is None or self.indexLoadThread.isRunning():
+            return
+
+        try:
+            indexVersion = Indexer.readIndexVersion( self.indexDir, self.indexFileName )
+        except (OSError, ValueError):
+            #   Index file is missing or being replaced, check next time
+            return
+
+        try:
+            thumbnailPackVersion = Indexer.readThumbnailPackVersion( self.indexDir, self.indexFileName )
+        except (OSError, ValueError):
+            thumbnailPackVersion = None
+
+        previousThumbnailPackVersion = self.resultTableModel.thumbnailPack.version if self.resultTableModel.thumbnailPack is not None else None
+
+        if indexVersion == self.imageIdToImageDataDict.version and thumbnailPackVersion == previousThumbnailPackVersion:
+            return
+
+        self.indexLoadThread = IndexLoadThread( self.indexDir, self.indexFileName, self.isDebug )
+        self.indexLoadThread.indexSignal.connect( self.finishReload )
+        self.indexLoadThread.errorSignal.connect( self.failReload )
+        self.indexLoadThread.start()
+
+    def finishReload( self, imageIndex, thumbnailPack ):
+        ''' This function replaces index by index read again, queries
+            already running go on with previous index and their results
+            are shown with it
+        '''
+
+        self.imageIdToImageDataDict = imageIndex
+        self.setThumbnailPack( thumbnailPack )
+        self.statusBar().showMessage( 'Updated index to {} images.'.format( len( imageIndex ) ) )
+
+    def setThumbnailPack( self, thumbnailPack ):
+        ''' This function shows previews of given thumbnail pack in
+            result table, sized to its thumbnails, or hides them if
+            there is no thumbnail pack
+        '''
+
+        self.resultTableModel.setThumbnailPack( thumbnailPack )
+        self.tableResult.setColumnHidden( PreviewColumn, thumbnailPack is None )
+
+        if thumbnailPack is not None:
+            self.tableResult.setIconSize( QtCore.QSize( thumbnailPack.thumbnailSize, thumbnailPack.thumbnailSize ) )
+            self.tableResult.setColumnWidth( PreviewColumn, thumbnailPack.thumbnailSize + 2*PreviewMargin )
+            self.tableResult.verticalHeader().setDefaultSectionSize( thumbnailPack.thumbnailSize + 2*PreviewMargin )
+
+    def failReload( self, errorMessage ):
+        ''' This function keeps previous index if index cannot be read
+            again
+        '''
+
+        self.statusBar().showMessage( 'Cannot update index, {}'.format( errorMessage ) )
+
     def lineEditMaxResult_cb( self ):
         ''' This is callback function of max result line edit widget
             which sets maximum result number to query manager
@@ -222,66 +517,130 @@ class SimpleImageSearchEngineWindow( QtWidgets.QMainWindow ):
         #   Begin query with thread
         self.beginQuery( inputImageFilePath )
 
+    def buttonCancel_cb( self ):
+        ''' This is callback function of cancel button widget which
+            stops running query, keeping results found so far
+        '''
+
+        self.cancelQuery()
+        self.statusBar().showMessage( 'Cancelled search.' )
+
     def beginQuery( self, inputImageFilePath ):
-        ''' This function constructs query thread and runs it
+        ''' This function constructs query thread and runs it, query
+            still running is cancelled instead of waited for
         '''
 
-        #   Disable the search button while querying
-        self.buttonSearch.setEnabled(False)
+        self.cancelQuery()
 
         #   Construct query thread
-        self.queryThread = QueryThread( self.imageIdToImageDataDict, inputImageFilePath, self.isDebug )
+        self.queryThread = QueryThread( self.imageIdToImageDataDict, inputImageFilePath, self.maxResultNum, self.isDebug, self.probeNum, self.queryCache )
 
-        #   Bind query thread signal to finish query function
+        #   Bind query thread signals to progress, finish and fail
+        #   query functions
+        self.queryThread.progressSignal.connect( self.progressQuery )
         self.queryThread.signal.connect( self.finishQuery )
+        self.queryThread.errorSignal.connect( self.failQuery )
+
+        self.buttonCancel.setEnabled(True)
+        self.statusBar().showMessage( 'Searching...' )
 
         #   Run query thread
         self.queryThread.start()
 
+    def cancelQuery( self ):
+        ''' This function cancels running query thread, it is kept until
+            it stops at its next chunk so that it is not destroyed while
+            running
+        '''
+
+        self.buttonCancel.setEnabled(False)
+
+        if self.queryThread is None:
+            return
+
+        queryThread, self.queryThread = self.queryThread, None
+
+        if queryThread.isFinished():
+            return
+
+        queryThread.cancel()
+        self.cancelledQueryThreadList.append( queryThread )
+        queryThread.finished.connect( self.dropCancelledQueryThreads )
+
+    def dropCancelledQueryThreads( self ):
+        ''' This function drops cancelled query threads which stopped
+        '''
+
+        self.cancelledQueryThreadList = [ queryThread for queryThread in self.cancelledQueryThreadList if not queryThread.isFinished() ]
+
+    def isCurrentQuery( self ):
+        ''' This function checks if signal being handled comes from
+            running query thread, signals of cancelled query threads
+            may still be queued
+        '''
+
+        return self.queryThread is not None and self.sender() is self.queryThread
+
+    def progressQuery( self, imageIdToHistogramSimilarityTupleList, comparedFraction ):
+        ''' This function gets results so far from query thread and
+            displays them on table widget
+        '''
+
+        if not self.isCurrentQuery():
+            return
+
+        self.statusBar().showMessage( 'Searching... {}%'.format( int( comparedFraction*100 ) ) )
+
+        #   Display result on table widget, with index searched by
+        #   query thread since index may have been read again meanwhile
+        self.displayResultsOnTable( self.sender().imageIdToImageDataDict, imageIdToHistogramSimilarityTupleList )
+
     def finishQuery( self, imageIdToHistogramSimilarityTupleList ):
-        ''' This function gets result from query thread and
+        ''' This function gets final result from query thread and
             displays result on table widget
         '''
 
+        if not self.isCurrentQuery():
+            return
+
         if self.isDebug:
             
             #   Display log message in terminal
             logResult( imageIdToHistogramSimilarityTupleList )
 
-        #   Display result on table widget
-        self.displayResultsOnTable( imageIdToHistogramSimilarityTupleList )
+        #   Display result on table widget, with index searched by
+        #   query thread since index may have been read again meanwhile
+        self.displayResultsOnTable( self.sender().imageIdToImageDataDict, imageIdToHistogramSimilarityTupleList )
 
-        #   Reenable search button
-        self.buttonSearch.setEnabled(True)
+        self.buttonCancel.setEnabled(False)
+        self.statusBar().showMessage( 'Found {} results.'.format( len( imageIdToHistogramSimilarityTupleList[:self.maxResultNum] ) ) )
 
-    def displayResultsOnTable( self, imageIdToHistogramSimilarityTupleList ):
-        ''' This function populates results table widget with given
-            result
+    def failQuery( self, errorMessage ):
+        ''' This function shows why query failed
         '''
 
-        #   If there is no result, clear all result on table
-        if len(imageIdToHistogramSimilarityTupleList) == 0:
-            self.tableResult.setRowCount(0)
+        if not self.isCurrentQuery():
             return
 
-        #   Limit result with max result number
-        imageIdToHistogramSimilarityTupleList = imageIdToHistogramSimilarityTupleList[:self.maxResultNum]
-
-        #   Set table row
-        self.tableResult.setRowCount(len(imageIdToHistogramSimilarityTupleList))
+        self.buttonCancel.setEnabled(False)
+        self.statusBar().showMessage( 'Cannot search, {}'.format( errorMessage ) )
 
-        #   Populate record on table
-        for resultIndex, imageIdToHistogramSimilarityTuple in enumerate( imageIdToHistogramSimilarityTupleList ):
+    def displayResultsOnTable( self, imageIdToImageDataDict, imageIdToHistogramSimilarityTupleList ):
+        ''' This function shows given result of given index on results
+            table view, paths and file manifests of results are looked
+            up in that index
+        '''
 
-            imageFilePath = self.imageIdToImageDataDict[ imageIdToHistogramSimilarityTuple[0] ].imageFilePath
+        #   Limit result with max result number
+        imageIdToHistogramSimilarityTupleList = imageIdToHistogramSimilarityTupleList[:self.maxResultNum]
 
-            self.tableResult.setItem( resultIndex, 0, QtWidgets.QTableWidgetItem( str(imageIdToHistogramSimilarityTuple[1]) ))
-            self.tableResult.setItem( resultIndex, 1, QtWidgets.QTableWidgetItem( str(imageIdToHistogramSimilarityTuple[0]) ))
-            self.tableResult.setItem( resultIndex, 2, QtWidgets.QTableWidgetItem( imageFilePath ))
+        with Metrics.time( 'gui.populateTable' ):
+            self.resultTableModel.setResultList( imageIdToImageDataDict, imageIdToHistogramSimilarityTupleList )
 
-            openButton = QtWidgets.QPushButton()
-            openButton.setText('Open')
-            openImageFunc = getOpenImageFunc( imageFilePath )
-            openButton.clicked.connect( openImageFunc )
+    def buttonOpen_cb( self, row : int ):
+        ''' This is callback function of open buttons of results table
+            view which opens image of clicked row
+        '''
 
-            self.tableResult.setCellWidget( resultIndex, 3, openButton )
\ No newline at end of file
+        openImageFunc = getOpenImageFunc( self.resultTableModel.getImageFilePath( row ) )
+        openImageFunc()
@@ -2,18 +2,36 @@
 #   IMPORT
 ##########################################################################
 
+import io
 import os
+import functools
+import numpy as np
 from PIL import Image
-from typing import Tuple
+from typing import Tuple, Optional
+from metrics.Metrics import Metrics
 
 ##########################################################################
 #   GLOBAL
 ##########################################################################
 
+HistogramImageMode = 'RGB'
+
+ThumbnailFormat = 'JPEG'
+ThumbnailQuality = 85
+
 ##########################################################################
 #   HELPER
 ##########################################################################
 
+@functools.lru_cache( maxsize=None )
+def getChannelSumMatrix( binNum : int, dtype : str ) -> np.ndarray:
+    ''' This function returns matrix which sums each channel of
+        histograms with given number of bins when multiplied, matrix
+        multiplication is much faster than summing along small axes
+    '''
+
+    return np.kron( np.eye( 3, dtype=dtype ), np.ones( ( binNum//3, 1 ), dtype=dtype ) )
+
 ##########################################################################
 #   CLASS
 ##########################################################################
@@ -21,30 +39,145 @@ from typing import Tuple
 class ImageProcessor(object):
 
     @staticmethod
-    def getColorHistogram( imageFilePath : str ) -> Tuple[float]:
+    def getColorHistogram( imageFilePath : str, maxDecodeSize : Optional[int] = None ) -> Tuple[float]:
         ''' This function computes given image color histogram
-            value
+            value, image is decoded at reduced resolution if maximum
+            decode size is given
         '''
 
         if not os.path.exists( imageFilePath ):
-            raise ValueError( 'getColorHistogram() - Cannot find image at {}.'.format(imageFilePath) )\
+            raise ValueError( 'getColorHistogram() - Cannot find image at {}.'.format(imageFilePath) )
+
+        Metrics.count( 'imageprocessor.fileByteNum', os.path.getsize( imageFilePath ) )
 
         #   Read input image file path
-        image = Image.open( imageFilePath )
+        with Image.open( imageFilePath ) as image:
+            histogram = ImageProcessor.getImageColorHistogram( image, maxDecodeSize )
+
+        return histogram
 
-        #   Initialize color histogram of three channels: R, G and B
-        histogram = [0]*(256*3)
+    @staticmethod
+    def getBytesColorHistogram( imageBytes : bytes, maxDecodeSize : Optional[int] = None ) -> Tuple[float]:
+        ''' This function computes color histogram value of image
+            encoded in given bytes, as read from an image file
+        '''
 
-        #   Assign each pixel to their respective index of histogram
-        for pixel in image.getdata():
-            for i in range(3):
-                histogram[pixel[i]+(256*i)] += 1
+        Metrics.count( 'imageprocessor.fileByteNum', len( imageBytes ) )
 
-        #   Normalize histogram with number of pixels
-        histogram = tuple( [ x/len(image.getdata()) for x in histogram] )
+        with Image.open( io.BytesIO( imageBytes ) ) as image:
+            histogram = ImageProcessor.getImageColorHistogram( image, maxDecodeSize )
 
         return histogram
 
+    @staticmethod
+    def getBytesColorHistogramThumbnail( imageBytes : bytes, maxDecodeSize : Optional[int], thumbnailSize : int ) -> Tuple[Tuple[float], bytes]:
+        ''' This function computes color histogram value of image
+            encoded in given bytes, with thumbnail bytes of it made
+            from the same decoded image, see getThumbnailBytes()
+        '''
+
+        Metrics.count( 'imageprocessor.fileByteNum', len( imageBytes ) )
+
+        with Image.open( io.BytesIO( imageBytes ) ) as image:
+            image = ImageProcessor.decodeImage( image, maxDecodeSize )
+            histogram = ImageProcessor.getDecodedImageColorHistogram( image )
+            thumbnailBytes = ImageProcessor.getThumbnailBytes( image, thumbnailSize )
+
+        return histogram, thumbnailBytes
+
+    @staticmethod
+    def getImageColorHistogram( image : Image.Image, maxDecodeSize : Optional[int] = None ) -> Tuple[float]:
+        ''' This function computes color histogram value of given
+            opened image using PIL native histogram, see decodeImage()
+        '''
+
+        return ImageProcessor.getDecodedImageColorHistogram( ImageProcessor.decodeImage( image, maxDecodeSize ) )
+
+    @staticmethod
+    def decodeImage( image : Image.Image, maxDecodeSize : Optional[int] = None ) -> Image.Image:
+        ''' This function decodes given opened image into RGB image
+
+            If maximum decode size is given, image is reduced so that
+            its longest side is not much larger than it, which barely
+            changes color distribution but saves decoding time
+        '''
+
+        try:
+
+            with Metrics.time( 'imageprocessor.decode' ):
+
+                #   Let JPEG decoder scale image down while decoding,
+                #   this does nothing for other formats or already loaded
+                #   image
+                if maxDecodeSize is not None:
+                    image.draft( HistogramImageMode, ( maxDecodeSize, maxDecodeSize ) )
+
+                #   Decode now, so that decoding is timed apart from
+                #   converting and counting
+                image.load()
+
+                #   Convert image to RGB explicitly, any other mode such
+                #   as L, P, CMYK or RGBA does not map to three R, G and B
+                #   bands
+                if image.mode != HistogramImageMode:
+                    image = image.convert( HistogramImageMode )
+
+                #   Reduce image by integer factor, keeping its longest
+                #   side at least maximum decode size
+                if maxDecodeSize is not None:
+                    reduceFactor = max( image.size ) // maxDecodeSize
+                    if reduceFactor > 1:
+                        image = image.reduce( reduceFactor )
+
+        except Exception:
+            Metrics.count( 'imageprocessor.decodeFailureNum' )
+            raise
+
+        return image
+
+    @staticmethod
+    def getDecodedImageColorHistogram( image : Image.Image ) -> Tuple[float]:
+        ''' This function computes color histogram value of given
+            image decoded by decodeImage()
+        '''
+
+        with Metrics.time( 'imageprocessor.histogram' ):
+
+            #   Compute color histogram of three channels: R, G and B,
+            #   PIL returns them concatenated as 256 bins per channel
+            histogram = image.histogram()
+
+            #   Normalize histogram with number of pixels
+            pixelNum = image.width*image.height
+            histogram = tuple( [ x/pixelNum for x in histogram ] )
+
+        Metrics.count( 'imageprocessor.imageNum' )
+
+        return histogram
+
+    @staticmethod
+    def getThumbnailBytes( image : Image.Image, thumbnailSize : int ) -> bytes:
+        ''' This function encodes thumbnail of given decoded image as
+            JPEG bytes, its longest side is at most given size and it
+            keeps aspect ratio of image, which is never enlarged
+        '''
+
+        with Metrics.time( 'imageprocessor.thumbnail' ):
+
+            #   Resize decoded image straight away, without copying it
+            scale = min( thumbnailSize / max( image.size ), 1.0 )
+            thumbnailImage = image
+            if scale < 1.0:
+                thumbnailSizeTuple = ( max( round( image.width*scale ), 1 ), max( round( image.height*scale ), 1 ) )
+                thumbnailImage = image.resize( thumbnailSizeTuple, Image.BILINEAR, reducing_gap=2.0 )
+
+            thumbnailFile = io.BytesIO()
+            thumbnailImage.save( thumbnailFile, ThumbnailFormat, quality=ThumbnailQuality )
+
+        Metrics.count( 'imageprocessor.thumbnailByteNum', thumbnailFile.tell() )
+
+        return thumbnailFile.getvalue()
+
     @staticmethod
     def compareColorHistogram( hist1 : Tuple[float], hist2 : Tuple[float] ) -> float:
         ''' This function compares two color histograms similarity
@@ -63,3 +196,153 @@ class ImageProcessor(object):
 
         #   Multiply them
         return sum( redHistogramIntersection )*sum( greenHistogramIntersection )*sum( blueHistogramIntersection )
+
+    @staticmethod
+    def compareColorHistogramMatrix( histogram : Tuple[float], histogramMatrix : np.ndarray, isReproducible : bool = True ) -> np.ndarray:
+        ''' This function compares given color histogram with every
+            row of given histogram matrix at once, using the same
+            color histogram intersection method
+
+            Histograms with fewer bins per channel, such as coarse
+            histograms, are compared the same way
+
+            If not reproducible, channels are summed by a faster matrix
+            multiplication whose rounding depends on number of rows,
+            so a row may score slightly differently in another matrix
+
+            Quantized histograms are compared on their integers, so
+            returned similarity is scaled by cube of quantization scale,
+            if reproducible they are summed exactly, otherwise by the
+            same matrix multiplication in float32
+
+            If reproducible, float histograms are summed in float64,
+            which is exact for bins of images up to 2**29 pixels, so
+            similarity does not depend on summation order and equals
+            compareColorHistogramSparse() bit for bit
+        '''
+
+        assert(histogramMatrix.shape[1] == len(histogram))
+
+        #   Compute histogram intersection of every row
+        histogramIntersection = np.minimum( histogramMatrix, np.asarray( histogram, dtype=histogramMatrix.dtype ) )
+        isQuantized = np.issubdtype( histogramIntersection.dtype, np.integer )
+
+        #   Sum each channel of every row
+        if isReproducible and isQuantized:
+            sumDtype = np.uint32 if histogramIntersection.dtype.itemsize <= 2 else np.uint64
+            channelIntersection = histogramIntersection.reshape( len(histogramMatrix), 3, -1 ).sum( axis=2, dtype=sumDtype )
+        elif isReproducible:
+            channelIntersection = histogramIntersection.reshape( len(histogramMatrix), 3, -1 ).sum( axis=2, dtype=np.float64 )
+        else:
+            if isQuantized:
+                histogramIntersection = histogramIntersection.astype( np.float32 )
+            channelIntersection = histogramIntersection @ getChannelSumMatrix( histogramMatrix.shape[1], histogramIntersection.dtype.str )
+
+        #   Multiply them
+        return channelIntersection.prod( axis=1, dtype=np.float64 )
+
+    @staticmethod
+    def compareColorHistogramBatch( queryHistogramMatrix : np.ndarray, histogramMatrix : np.ndarray ) -> np.ndarray:
+        ''' This function compares every row of query histogram matrix
+            with every row of histogram matrix at once, and returns
+            matrix of similarity of each query and row, which equals
+            reproducible compareColorHistogramMatrix() of each query
+
+            Both matrices should be small blocks, intersection of every
+            pair of rows is kept in memory
+        '''
+
+        assert(histogramMatrix.shape[1] == queryHistogramMatrix.shape[1])
+
+        #   Compute histogram intersection of every query and row
+        histogramIntersection = np.minimum( histogramMatrix[ None, :, : ], np.asarray( queryHistogramMatrix, dtype=histogramMatrix.dtype )[ :, None, : ] )
+        histogramIntersection = histogramIntersection.reshape( len(queryHistogramMatrix), len(histogramMatrix), 3, -1 )
+
+        #   Sum each channel of every pair exactly, see
+        #   compareColorHistogramMatrix()
+        if np.issubdtype( histogramIntersection.dtype, np.integer ):
+            channelIntersection = histogramIntersection.sum( axis=3, dtype=np.uint32 if histogramIntersection.dtype.itemsize <= 2 else np.uint64 )
+        else:
+            channelIntersection = histogramIntersection.sum( axis=3, dtype=np.float64 )
+
+        #   Multiply them
+        return channelIntersection.prod( axis=2, dtype=np.float64 )
+
+    @staticmethod
+    def compareColorHistogramSparse( histogram : Tuple[float], offsetArray : np.ndarray, binArray : np.ndarray, valueArray : np.ndarray ) -> np.ndarray:
+        ''' This function compares given color histogram with every row
+            of given sparse histogram matrix, which stores non-empty bins
+            of each channel of each row from its offset to the next, see
+            SparseHistogramMatrix, using the same color histogram
+            intersection method
+
+            Empty bins are skipped, since they intersect to zero. Each
+            channel is summed on its own, so similarity of a row does not
+            depend on other rows. Quantized histograms, and float
+            histograms in float64, are summed exactly as in
+            compareColorHistogramMatrix(), so similarity is equal bit
+            for bit whichever layout index has
+        '''
+
+        histogram = np.asarray( histogram, dtype=valueArray.dtype )
+
+        #   Offsets of a view start inside bin and value arrays
+        startOffset, endOffset = int( offsetArray[0] ), int( offsetArray[-1] )
+        segmentStartArray = np.asarray( offsetArray[:-1], dtype=np.int64 ) - startOffset
+        isNonEmptyArray = np.asarray( offsetArray[1:] ) > np.asarray( offsetArray[:-1] )
+
+        #   Compute histogram intersection of every stored bin
+        histogramIntersection = np.minimum( valueArray[ startOffset:endOffset ], histogram[ binArray[ startOffset:endOffset ] ] )
+
+        if np.issubdtype( histogramIntersection.dtype, np.integer ):
+            sumDtype = np.uint32 if histogramIntersection.dtype.itemsize <= 2 else np.uint64
+        else:
+            sumDtype = np.float64
+
+        #   Sum each channel of every row, empty channels sum to zero
+        #   and are left out since reduceat would return a bin for them
+        channelIntersection = np.zeros( len( segmentStartArray ), dtype=sumDtype )
+        if len( histogramIntersection ) > 0:
+            channelIntersection[ isNonEmptyArray ] = np.add.reduceat( histogramIntersection, segmentStartArray[ isNonEmptyArray ], dtype=sumDtype )
+
+        #   Multiply them
+        return channelIntersection.reshape( -1, 3 ).prod( axis=1, dtype=np.float64 )
+
+    @staticmethod
+    def getCoarseColorHistogram( histogram, binNum : int, dtype=np.float32, divisor : int = 1 ) -> np.ndarray:
+        ''' This function merges adjacent bins of given color histogram,
+            or every row of given histogram matrix, into given number
+            of bins per channel
+
+            Quantized histogram is merged exactly, then divided by given
+            divisor rounding up, into integers of given dtype, merged
+            bins beyond largest integer saturate
+        '''
+
+        histogramMatrix = np.asarray( histogram )
+
+        if np.issubdtype( histogramMatrix.dtype, np.integer ):
+            divisor = np.uint64( divisor )
+            coarseHistogramMatrix = histogramMatrix.reshape( -1, 3, binNum, 256//binNum ).sum( axis=3, dtype=np.uint64 )
+            coarseHistogramMatrix = np.minimum( ( coarseHistogramMatrix + ( divisor - np.uint64( 1 ) ) ) // divisor, np.iinfo( dtype ).max ).astype( dtype )
+        else:
+            histogramMatrix = np.asarray( histogramMatrix, dtype=np.float32 )
+            coarseHistogramMatrix = histogramMatrix.reshape( -1, 3, binNum, 256//binNum ).sum( axis=3, dtype=dtype )
+
+        return coarseHistogramMatrix.reshape( histogramMatrix.shape[:-1] + ( 3*binNum, ) )
+
+    @staticmethod
+    def quantizeColorHistogram( histogram, scale : float, dtype ) -> np.ndarray:
+        ''' This function quantizes given color histogram, or every row
+            of given histogram matrix, to unsigned integers of given
+            dtype by rounding each bin multiplied by given scale, bins
+            beyond largest integer saturate
+
+            Bins are rounded in float32 as index histograms are stored,
+            so a query quantizes exactly as the same indexed image
+        '''
+
+        quantizedHistogramMatrix = np.rint( np.asarray( histogram, dtype=np.float32 )*np.float32( scale ) )
+        np.clip( quantizedHistogramMatrix, 0, np.iinfo( dtype ).max, out=quantizedHistogramMatrix )
+
+        return quantizedHistogramMatrix.astype( dtype )
@@ -0,0 +1,221 @@
+##########################################################################
+#   IMPORT
+##########################################################################
+
+import numpy as np
+from typing import Dict, Optional
+
+##########################################################################
+#   GLOBAL
+##########################################################################
+
+DefaultIterationNum = 10
+DefaultSampleNum = 65536
+DefaultProbeNum = 4
+
+#   Number of rows assigned to clusters at once
+AssignBlockRowNum = 4096
+
+##########################################################################
+#   HELPER
+##########################################################################
+
+def getFloatHistogramMatrix( histogramMatrix : np.ndarray, histogramScale : Optional[float] = None ) -> np.ndarray:
+    ''' This function converts given histogram rows to float32,
+        scaling quantized ones back by given scale
+    '''
+
+    histogramMatrix = np.asarray( histogramMatrix, dtype=np.float32 )
+
+    if histogramScale is not None:
+        histogramMatrix = histogramMatrix / np.float32( histogramScale )
+
+    return histogramMatrix
+
+def assignCluster( histogramMatrix : np.ndarray, centroidMatrix : np.ndarray, histogramScale : Optional[float] = None ) -> np.ndarray:
+    ''' This function returns nearest centroid of every histogram
+        by euclidean distance, block by block
+    '''
+
+    centroidMatrix = centroidMatrix.astype( np.float32 )
+    centroidNormArray = ( centroidMatrix*centroidMatrix ).sum( axis=1 )
+
+    clusterArray = np.zeros( len( histogramMatrix ), dtype=np.int64 )
+
+    for startRow in range( 0, len( histogramMatrix ), AssignBlockRowNum ):
+
+        #   Squared distance without histogram norm, which does not
+        #   change nearest centroid
+        histogramBlock = getFloatHistogramMatrix( histogramMatrix[ startRow:startRow+AssignBlockRowNum ], histogramScale )
+        distanceMatrix = centroidNormArray - 2*( histogramBlock @ centroidMatrix.T )
+
+        clusterArray[ startRow:startRow+AssignBlockRowNum ] = distanceMatrix.argmin( axis=1 )
+
+    return clusterArray
+
+def getCentroidDistance( histogram : np.ndarray, centroidMatrix : np.ndarray ) -> np.ndarray:
+    ''' This function returns squared euclidean distance of given
+        histogram to every centroid
+    '''
+
+    differenceMatrix = np.asarray( centroidMatrix, dtype=np.float32 ) - histogram
+
+    return ( differenceMatrix*differenceMatrix ).sum( axis=1 )
+
+##########################################################################
+#   CLASS
+##########################################################################
+
+class AnnIndex(object):
+    ''' This class builds and probes approximate nearest neighbour
+        index of histogram matrix, which is k-means centroids with an
+        inverted list of rows for each centroid
+
+        Clustering uses euclidean distance so it runs on matrix
+        multiplication, candidates from probed lists are then ranked
+        by exact color histogram intersection
+    '''
+
+    @staticmethod
+    def build( histogramMatrix : np.ndarray, clusterNum : int, iterationNum : int = DefaultIterationNum,
+                sampleNum : int = DefaultSampleNum, seed : int = 0, histogramScale : Optional[float] = None ) -> Dict[str, np.ndarray]:
+        ''' This function clusters histogram matrix and returns
+            centroid, inverted list offset and inverted list row
+            sections, centroids are trained on a random sample of
+            rows then every row is assigned to its nearest one
+
+            Quantized histograms are scaled back by given scale, so
+            centroids are float histograms as queries are
+        '''
+
+        rowNum = len( histogramMatrix )
+
+        if clusterNum < 1:
+            raise ValueError( 'build() - Invalid cluster number {}.'.format( clusterNum ) )
+
+        if rowNum == 0:
+            raise ValueError( 'build() - Cannot cluster empty index.' )
+
+        clusterNum = min( clusterNum, rowNum )
+
+        randomGenerator = np.random.default_rng( seed )
+
+        #   Train on sample of rows
+        sampleRowArray = np.sort( randomGenerator.choice( rowNum, min( sampleNum, rowNum ), replace=False ) )
+        sampleMatrix = getFloatHistogramMatrix( histogramMatrix[ sampleRowArray ], histogramScale )
+
+        centroidMatrix = sampleMatrix[ randomGenerator.choice( len( sampleMatrix ), clusterNum, replace=False ) ].copy()
+
+        for _ in range( iterationNum ):
+
+            clusterArray = assignCluster( sampleMatrix, centroidMatrix )
+
+            #   Move centroids to mean of their members, summing rows
+            #   of each cluster as contiguous runs after sorting
+            memberNumArray = np.bincount( clusterArray, minlength=clusterNum )
+            isNonEmptyArray = memberNumArray > 0
+
+            startRowArray = ( np.cumsum( memberNumArray ) - memberNumArray )[ isNonEmptyArray ]
+            centroidSumMatrix = np.add.reduceat( sampleMatrix[ np.argsort( clusterArray, kind='stable' ) ], startRowArray, axis=0, dtype=np.float64 )
+
+            centroidMatrix[ isNonEmptyArray ] = centroidSumMatrix / memberNumArray[ isNonEmptyArray, None ]
+
+            #   Restart empty clusters from random sample rows
+            emptyClusterArray = np.flatnonzero( ~isNonEmptyArray )
+            if len( emptyClusterArray ) > 0:
+                centroidMatrix[ emptyClusterArray ] = sampleMatrix[ randomGenerator.choice( len( sampleMatrix ), len( emptyClusterArray ) ) ]
+
+        #   Assign every row, then group rows by cluster keeping row
+        #   order inside each cluster
+        clusterArray = assignCluster( histogramMatrix, centroidMatrix, histogramScale )
+
+        listOffsetArray = np.zeros( clusterNum + 1, dtype=np.uint64 )
+        np.cumsum( np.bincount( clusterArray, minlength=clusterNum ), out=listOffsetArray[1:] )
+
+        return {
+            'annCentroid' : centroidMatrix,
+            'annListOffset' : listOffsetArray,
+            'annListRow' : np.argsort( clusterArray, kind='stable' ).astype( np.int64 ),
+        }
+
+    @staticmethod
+    def getCandidateRows( sectionDict : Dict[str, np.ndarray], histogram, probeNum : int = DefaultProbeNum ) -> np.ndarray:
+        ''' This function returns sorted rows of inverted lists of
+            centroids nearest to given histogram
+        '''
+
+        centroidMatrix = sectionDict[ 'annCentroid' ]
+        listOffsetArray = sectionDict[ 'annListOffset' ]
+        listRowArray = sectionDict[ 'annListRow' ]
+
+        if probeNum < 1:
+            raise ValueError( 'getCandidateRows() - Invalid probe number {}.'.format( probeNum ) )
+
+        #   Find nearest centroids
+        distanceArray = getCentroidDistance( np.asarray( histogram, dtype=np.float32 ), centroidMatrix )
+        probeNum = min( probeNum, len( centroidMatrix ) )
+        clusterArray = np.argpartition( distanceArray, probeNum - 1 )[:probeNum]
+
+        #   Gather rows of their inverted lists
+        rowArrayList = [ listRowArray[ int(listOffsetArray[cluster]):int(listOffsetArray[cluster+1]) ] for cluster in clusterArray ]
+
+        return np.sort( np.concatenate( rowArrayList ) )
+
+    @staticmethod
+    def getClusterArray( sectionDict : Dict[str, np.ndarray] ) -> np.ndarray:
+        ''' This function returns cluster of every row, recovered from
+            inverted lists
+        '''
+
+        centroidMatrix = sectionDict[ 'annCentroid' ]
+        listOffsetArray = sectionDict[ 'annListOffset' ]
+        listRowArray = sectionDict[ 'annListRow' ]
+
+        clusterArray = np.zeros( len( listRowArray ), dtype=np.int64 )
+        clusterArray[ listRowArray ] = np.repeat( np.arange( len( centroidMatrix ) ), np.diff( listOffsetArray.astype( np.int64 ) ) )
+
+        return clusterArray
+
+    @staticmethod
+    def getSectionDict( centroidMatrix : np.ndarray, clusterArray : np.ndarray ) -> Dict[str, np.ndarray]:
+        ''' This function returns approximate nearest neighbour sections
+            of given centroids and cluster of every row, keeping row
+            order inside each cluster
+        '''
+
+        listOffsetArray = np.zeros( len( centroidMatrix ) + 1, dtype=np.uint64 )
+        np.cumsum( np.bincount( clusterArray, minlength=len( centroidMatrix ) ), out=listOffsetArray[1:] )
+
+        return {
+            'annCentroid' : np.array( centroidMatrix ),
+            'annListOffset' : listOffsetArray,
+            'annListRow' : np.argsort( clusterArray, kind='stable' ).astype( np.int64 ),
+        }
+
+    @staticmethod
+    def selectRows( sectionDict : Dict[str, np.ndarray], rowArray : np.ndarray ) -> Dict[str, np.ndarray]:
+        ''' This function returns approximate nearest neighbour sections
+            of index made of given sorted rows, keeping centroids so
+            that every row stays in its cluster and a probe finds the
+            same rows among them
+        '''
+
+        return AnnIndex.getSectionDict( sectionDict[ 'annCentroid' ], AnnIndex.getClusterArray( sectionDict )[ rowArray ] )
+
+    @staticmethod
+    def mergeRows( sectionDict : Dict[str, np.ndarray], keptRowArray : np.ndarray, keptPositionArray : np.ndarray,
+                    addedHistogramMatrix : np.ndarray, addedPositionArray : np.ndarray, histogramScale : Optional[float] = None ) -> Dict[str, np.ndarray]:
+        ''' This function returns approximate nearest neighbour sections
+            of index made of given kept rows and added histograms, at
+            given positions of the new index, kept rows stay in their
+            cluster and added ones join their nearest centroid, so
+            centroids are not trained again
+        '''
+
+        centroidMatrix = sectionDict[ 'annCentroid' ]
+
+        clusterArray = np.zeros( len( keptPositionArray ) + len( addedPositionArray ), dtype=np.int64 )
+        clusterArray[ keptPositionArray ] = AnnIndex.getClusterArray( sectionDict )[ keptRowArray ]
+        clusterArray[ addedPositionArray ] = assignCluster( addedHistogramMatrix, centroidMatrix, histogramScale )
+
+        return AnnIndex.getSectionDict( centroidMatrix, clusterArray )
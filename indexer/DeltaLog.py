@@ -0,0 +1,315 @@
+##########################################################################
+#   IMPORT
+##########################################################################
+
+import os
+import json
+import zlib
+import struct
+import numpy as np
+from typing import List, Tuple, Dict, Optional, Set
+from indexer.ImageData import ImageData
+from indexer.ImageIndex import HistogramDtype, HistogramBinNum, MissingFileManifestValue
+from metrics.Metrics import Metrics
+
+##########################################################################
+#   GLOBAL
+##########################################################################
+
+DeltaLogMagic = b'SISEDLT\0'
+DeltaLogVersion = 1
+
+#   Magic, format version and byte length of JSON header
+HeaderStruct = struct.Struct( '<8sII' )
+
+#   Byte length and checksum of record payload
+RecordHeaderStruct = struct.Struct( '<II' )
+
+#   Operation, image id, file size, file modification time and byte
+#   lengths of file path and file hash, followed by file path, file
+#   hash and histogram bytes of added or updated image
+RecordStruct = struct.Struct( '<BqqqII' )
+
+DeltaAdd = 1
+DeltaUpdate = 2
+DeltaDelete = 3
+DeltaOperationList = [ DeltaAdd, DeltaUpdate, DeltaDelete ]
+
+HistogramByteNum = HistogramBinNum*np.dtype( HistogramDtype ).itemsize
+
+##########################################################################
+#   HELPER
+##########################################################################
+
+def packHeader( baseVersion : str ) -> bytes:
+    ''' This function packs delta log header of given base index
+        version
+    '''
+
+    headerBytes = json.dumps( { 'baseVersion' : baseVersion } ).encode( 'utf-8' )
+
+    return HeaderStruct.pack( DeltaLogMagic, DeltaLogVersion, len( headerBytes ) ) + headerBytes
+
+def unpackHeader( logBytes : bytes ) -> Tuple[Optional[str], int]:
+    ''' This function returns base index version and byte length of
+        delta log header at start of given bytes, version is None if
+        they are not a delta log of this format
+    '''
+
+    if len( logBytes ) < HeaderStruct.size:
+        return None, 0
+
+    magic, version, headerByteNum = HeaderStruct.unpack_from( logBytes )
+    if magic != DeltaLogMagic or version != DeltaLogVersion or len( logBytes ) < HeaderStruct.size + headerByteNum:
+        return None, 0
+
+    try:
+        headerDict = json.loads( logBytes[ HeaderStruct.size:HeaderStruct.size+headerByteNum ].decode( 'utf-8' ) )
+    except ValueError:
+        return None, 0
+
+    return headerDict.get( 'baseVersion' ), HeaderStruct.size + headerByteNum
+
+def packRecord( operation : int, imageId : int, imageData : Optional[ImageData] = None ) -> bytes:
+    ''' This function packs one delta log record, image data is
+        required unless image is deleted
+    '''
+
+    if operation not in DeltaOperationList:
+        raise ValueError( 'packRecord() - Invalid delta operation {}.'.format( operation ) )
+
+    if operation == DeltaDelete:
+        payloadBytes = RecordStruct.pack( operation, imageId, MissingFileManifestValue, MissingFileManifestValue, 0, 0 )
+
+    else:
+        filePathBytes = os.fsencode( imageData.imageFilePath )
+        fileHashBytes = imageData.fileHash.encode( 'ascii' ) if imageData.fileHash is not None else b''
+        fileSize = imageData.fileSize if imageData.fileSize is not None else MissingFileManifestValue
+        fileMtime = imageData.fileMtime if imageData.fileMtime is not None else MissingFileManifestValue
+
+        #   Histogram is kept as float, as a full build computes it,
+        #   and quantized like base index when applied
+        payloadBytes = b''.join( [ RecordStruct.pack( operation, imageId, fileSize, fileMtime, len( filePathBytes ), len( fileHashBytes ) ),
+                                    filePathBytes, fileHashBytes, np.ascontiguousarray( imageData.histogram, dtype=HistogramDtype ).tobytes() ] )
+
+    return RecordHeaderStruct.pack( len( payloadBytes ), zlib.crc32( payloadBytes ) ) + payloadBytes
+
+def unpackRecord( payloadBytes : bytes ) -> Tuple[int, int, Optional[ImageData]]:
+    ''' This function unpacks operation, image id and image data of
+        one delta log record payload
+    '''
+
+    operation, imageId, fileSize, fileMtime, filePathByteNum, fileHashByteNum = RecordStruct.unpack_from( payloadBytes )
+
+    if operation == DeltaDelete:
+        return operation, imageId, None
+
+    offset = RecordStruct.size
+    imageFilePath = os.fsdecode( payloadBytes[ offset:offset+filePathByteNum ] )
+    offset += filePathByteNum
+    fileHash = payloadBytes[ offset:offset+fileHashByteNum ].decode( 'ascii' )
+    offset += fileHashByteNum
+    histogram = np.frombuffer( payloadBytes, dtype=HistogramDtype, count=HistogramBinNum, offset=offset )
+
+    return operation, imageId, ImageData( imageId, imageFilePath, histogram,
+                                            fileSize if fileSize != MissingFileManifestValue else None,
+                                            fileMtime if fileMtime != MissingFileManifestValue else None,
+                                            fileHash if len( fileHash ) > 0 else None )
+
+def iterateRecord( logBytes : bytes, offset : int ):
+    ''' This function yields end offset and payload of every complete
+        record of delta log bytes from given offset, it stops at a
+        record cut short or corrupted by an interrupted append
+    '''
+
+    while offset + RecordHeaderStruct.size <= len( logBytes ):
+
+        payloadByteNum, payloadCrc = RecordHeaderStruct.unpack_from( logBytes, offset )
+        payloadOffset = offset + RecordHeaderStruct.size
+        payloadBytes = logBytes[ payloadOffset:payloadOffset+payloadByteNum ]
+
+        if len( payloadBytes ) != payloadByteNum or payloadByteNum < RecordStruct.size or zlib.crc32( payloadBytes ) != payloadCrc:
+            return
+
+        offset = payloadOffset + payloadByteNum
+        yield offset, payloadBytes
+
+##########################################################################
+#   CLASS
+##########################################################################
+
+class DeltaLog(object):
+    ''' This class reads append-only delta log written next to base
+        index file, which records images added, updated and deleted
+        since base index was written, so that index is kept up to date
+        without writing it again, see DeltaLogWriter
+
+        Delta log belongs to base index of the version in its header,
+        once base index is written again its delta log is stale and is
+        ignored, since new base index was built from image files
+    '''
+
+    @staticmethod
+    def read( deltaLogFilePath : str, baseVersion : str ) -> Optional[Tuple[List[Tuple[int, int, Optional[ImageData]]], str]]:
+        ''' This function returns operation, image id and image data
+            of every record of delta log in order, with version of base
+            index and records, or None if there is no delta log of given
+            base index version
+
+            Records cut short by an interrupted append are ignored
+        '''
+
+        try:
+            with open( deltaLogFilePath, 'rb' ) as deltaLogFile:
+                logBytes = deltaLogFile.read()
+        except FileNotFoundError:
+            return None
+
+        logBaseVersion, offset = unpackHeader( logBytes )
+        if logBaseVersion is None or logBaseVersion != baseVersion:
+            return None
+
+        recordList = [ unpackRecord( payloadBytes ) for _, payloadBytes in iterateRecord( logBytes, offset ) ]
+
+        return recordList, DeltaLog.getVersion( baseVersion, len( logBytes ) )
+
+    @staticmethod
+    def readVersion( deltaLogFilePath : str, baseVersion : str ) -> str:
+        ''' This function returns version of index made of base index of
+            given version and delta log, without reading records, it is
+            the version read() returns
+        '''
+
+        try:
+            with open( deltaLogFilePath, 'rb' ) as deltaLogFile:
+                logBytes = deltaLogFile.read( HeaderStruct.size )
+                if len( logBytes ) == HeaderStruct.size:
+                    logBytes += deltaLogFile.read( HeaderStruct.unpack( logBytes )[2] )
+                logByteNum = os.fstat( deltaLogFile.fileno() ).st_size
+        except FileNotFoundError:
+            return baseVersion
+
+        if unpackHeader( logBytes )[0] != baseVersion:
+            return baseVersion
+
+        return DeltaLog.getVersion( baseVersion, logByteNum )
+
+    @staticmethod
+    def getVersion( baseVersion : str, logByteNum : int ) -> str:
+        ''' This function returns version of index made of base index of
+            given version and delta log of given byte length, a log only
+            grows until base index is written again
+        '''
+
+        return '{}+{}'.format( baseVersion, logByteNum )
+
+    @staticmethod
+    def getBaseVersion( version : str ) -> str:
+        ''' This function returns version of base index of given index
+            version, see getVersion()
+        '''
+
+        return version.partition( '+' )[0]
+
+    @staticmethod
+    def getChangeDict( recordList : List[Tuple[int, int, Optional[ImageData]]] ) -> Tuple[Dict[int, ImageData], Set[int]]:
+        ''' This function replays given records and returns latest image
+            data of every added or updated image id, and image ids
+            deleted since base index
+        '''
+
+        imageIdToImageDataDict = dict()
+        deletedImageIdSet = set()
+
+        for operation, imageId, imageData in recordList:
+
+            if operation == DeltaDelete:
+                imageIdToImageDataDict.pop( imageId, None )
+                deletedImageIdSet.add( imageId )
+            else:
+                imageIdToImageDataDict[ imageId ] = imageData
+                deletedImageIdSet.discard( imageId )
+
+        return imageIdToImageDataDict, deletedImageIdSet
+
+    @staticmethod
+    def remove( deltaLogFilePath : str ):
+        ''' This function removes delta log, if any
+        '''
+
+        try:
+            os.remove( deltaLogFilePath )
+        except FileNotFoundError:
+            pass
+
+class DeltaLogWriter(object):
+    ''' This class appends records to delta log of base index of given
+        version, see DeltaLog
+
+        Existing delta log of the same base index is continued after
+        its last complete record, otherwise a new one replaces it. Each
+        append is one write flushed to disk, so readers see whole
+        appends or ignore a partial one. Only one writer may append to
+        a delta log at a time
+    '''
+
+    def __init__( self, deltaLogFilePath : str, baseVersion : str ):
+        self.deltaLogFilePath = deltaLogFilePath
+        self.baseVersion = baseVersion
+
+        validByteNum = 0
+
+        try:
+            with open( deltaLogFilePath, 'rb' ) as deltaLogFile:
+                logBytes = deltaLogFile.read()
+
+            logBaseVersion, validByteNum = unpackHeader( logBytes )
+            if logBaseVersion != baseVersion:
+                validByteNum = 0
+
+            for validByteNum, _ in iterateRecord( logBytes, validByteNum ):
+                pass
+
+        except FileNotFoundError:
+            pass
+
+        if validByteNum == 0:
+
+            #   Start delta log of this base index atomically, so that
+            #   readers never see a log without header
+            temporaryDeltaLogFilePath = deltaLogFilePath + '.tmp'
+            with open( temporaryDeltaLogFilePath, 'wb' ) as deltaLogFile:
+                deltaLogFile.write( packHeader( baseVersion ) )
+                deltaLogFile.flush()
+                os.fsync( deltaLogFile.fileno() )
+
+            os.replace( temporaryDeltaLogFilePath, deltaLogFilePath )
+
+        self.deltaLogFile = open( deltaLogFilePath, 'r+b' )
+
+        #   Drop record cut short by interrupted append
+        if validByteNum > 0:
+            self.deltaLogFile.truncate( validByteNum )
+
+        self.deltaLogFile.seek( 0, os.SEEK_END )
+
+    def append( self, recordList : List[Tuple[int, int, Optional[ImageData]]] ):
+        ''' This function appends given operation, image id and image
+            data records at once
+        '''
+
+        if len( recordList ) == 0:
+            return
+
+        with Metrics.time( 'deltalog.append' ):
+            self.deltaLogFile.write( b''.join( packRecord( operation, imageId, imageData ) for operation, imageId, imageData in recordList ) )
+            self.deltaLogFile.flush()
+            os.fsync( self.deltaLogFile.fileno() )
+
+        Metrics.count( 'deltalog.recordNum', len( recordList ) )
+
+    def close( self ):
+        ''' This function closes delta log file
+        '''
+
+        self.deltaLogFile.close()
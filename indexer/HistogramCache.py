@@ -0,0 +1,191 @@
+##########################################################################
+#   IMPORT
+##########################################################################
+
+import os
+import time
+import sqlite3
+import threading
+import numpy as np
+from typing import Dict, Optional
+from indexer.ImageIndex import HistogramDtype, HistogramBinNum
+
+##########################################################################
+#   GLOBAL
+##########################################################################
+
+DefaultMaxByteNum = 1 << 30
+
+#   Cache file layout version, cache file of another version is
+#   emptied
+HistogramCacheFileVersion = 1
+
+#   Estimated bytes of entry key and bookkeeping
+EntryOverheadByteNum = 128
+
+#   Maximum decode size of full resolution, since None is not equal
+#   to itself in a key
+FullDecodeSize = 0
+
+#   Read only connection of each reader thread, opened once per cache
+#   file and thread
+ReaderHistogramCacheDict = dict()
+ReaderHistogramCacheLock = threading.Lock()
+
+##########################################################################
+#   HELPER
+##########################################################################
+
+def getReaderHistogramCache( histogramCacheFilePath : str ) -> 'HistogramCache':
+    ''' This function returns read only cache of given file for calling
+        thread, opened on first use
+    '''
+
+    key = ( histogramCacheFilePath, threading.get_ident() )
+
+    with ReaderHistogramCacheLock:
+        if key not in ReaderHistogramCacheDict:
+            ReaderHistogramCacheDict[ key ] = HistogramCache( histogramCacheFilePath, isReadOnly=True )
+
+        return ReaderHistogramCacheDict[ key ]
+
+##########################################################################
+#   CLASS
+##########################################################################
+
+class HistogramCache(object):
+    ''' This class keeps color histograms of image files in a SQLite
+        file, keyed by content hash and maximum decode size, so that
+        copies of an image and images moved or renamed since previous
+        build are not decoded again, whichever index or image directory
+        they belong to
+
+        Histograms are stored as float32, as index stores them, so a
+        cached histogram gives the same index as a decoded one
+
+        Reader threads read cache with their own read only connection
+        while one thread writes it, entries used least recently are
+        evicted beyond given byte size when writer closes
+    '''
+
+    def __init__( self, histogramCacheFilePath : str, maxByteNum : int = DefaultMaxByteNum, isReadOnly : bool = False ):
+
+        if maxByteNum < 0:
+            raise ValueError( 'HistogramCache() - Invalid maximum byte number {}.'.format( maxByteNum ) )
+
+        self.histogramCacheFilePath = histogramCacheFilePath
+        self.maxByteNum = maxByteNum
+        self.isReadOnly = isReadOnly
+
+        if isReadOnly:
+            #   Connection is closed by writer, from another thread
+            self.connection = sqlite3.connect( 'file:{}?mode=ro'.format( histogramCacheFilePath ), uri=True, check_same_thread=False )
+            return
+
+        #   Cache may be opened before index directory is created
+        os.makedirs( os.path.dirname( histogramCacheFilePath ) or '.', exist_ok=True )
+        self.connection = sqlite3.connect( histogramCacheFilePath )
+
+        #   Losing last entries of a cache only costs decoding them
+        #   again, so commits do not wait for disk, and write ahead log
+        #   lets readers go on during commits
+        self.connection.execute( 'PRAGMA auto_vacuum = INCREMENTAL' )
+        self.connection.execute( 'PRAGMA journal_mode = WAL' )
+        self.connection.execute( 'PRAGMA synchronous = OFF' )
+
+        self.connection.execute( 'CREATE TABLE IF NOT EXISTS setting ( name TEXT PRIMARY KEY, value INTEGER )' )
+        self.connection.execute( 'CREATE TABLE IF NOT EXISTS histogram ( contentHash TEXT, maxDecodeSize INTEGER, histogram BLOB, '
+                                    'lastUsedTime REAL, PRIMARY KEY ( contentHash, maxDecodeSize ) )' )
+        self.connection.execute( 'CREATE INDEX IF NOT EXISTS histogramLastUsedTime ON histogram ( lastUsedTime )' )
+
+        #   Cache of another layout is emptied
+        row = self.connection.execute( "SELECT value FROM setting WHERE name = 'version'" ).fetchone()
+        if row is None or row[0] != HistogramCacheFileVersion:
+            self.connection.execute( 'DELETE FROM histogram' )
+            self.connection.execute( "INSERT OR REPLACE INTO setting VALUES ( 'version', ? )", ( HistogramCacheFileVersion, ) )
+
+        self.connection.commit()
+
+    def get( self, contentHash : str, maxDecodeSize : Optional[int] = None ) -> Optional[np.ndarray]:
+        ''' This function returns cached histogram of image content of
+            given hash decoded with given maximum decode size, or None
+            if it is not cached
+        '''
+
+        row = self.connection.execute( 'SELECT histogram FROM histogram WHERE contentHash = ? AND maxDecodeSize = ?',
+                                        ( contentHash, maxDecodeSize or FullDecodeSize ) ).fetchone()
+
+        if row is None or len( row[0] ) != HistogramBinNum*np.dtype( HistogramDtype ).itemsize:
+            return None
+
+        return np.frombuffer( row[0], dtype=HistogramDtype )
+
+    def put( self, contentHash : str, maxDecodeSize : Optional[int], histogram ):
+        ''' This function caches given histogram of image content of
+            given hash, committed right away so that reader threads find
+            it for next copies of the same content
+        '''
+
+        histogramBytes = np.ascontiguousarray( histogram, dtype=HistogramDtype ).tobytes()
+
+        self.connection.execute( 'INSERT OR REPLACE INTO histogram VALUES ( ?, ?, ?, ? )',
+                                    ( contentHash, maxDecodeSize or FullDecodeSize, histogramBytes, time.time() ) )
+
+        self.connection.commit()
+
+    def touch( self, contentHash : str, maxDecodeSize : Optional[int] = None ):
+        ''' This function marks histogram of given key most recently
+            used
+        '''
+
+        self.connection.execute( 'UPDATE histogram SET lastUsedTime = ? WHERE contentHash = ? AND maxDecodeSize = ?',
+                                    ( time.time(), contentHash, maxDecodeSize or FullDecodeSize ) )
+
+    def getEntryNum( self ) -> int:
+        ''' This function returns number of cached histograms
+        '''
+
+        return self.connection.execute( 'SELECT COUNT(*) FROM histogram' ).fetchone()[0]
+
+    def evict( self ) -> int:
+        ''' This function removes histograms used least recently until
+            cache fits its maximum byte number, and returns how many
+            were removed
+        '''
+
+        entryByteNum = HistogramBinNum*np.dtype( HistogramDtype ).itemsize + EntryOverheadByteNum
+        evictedNum = max( self.getEntryNum() - self.maxByteNum//entryByteNum, 0 )
+
+        if evictedNum > 0:
+            self.connection.execute( 'DELETE FROM histogram WHERE rowid IN ( SELECT rowid FROM histogram ORDER BY lastUsedTime LIMIT ? )', ( evictedNum, ) )
+            self.connection.commit()
+
+            #   Give freed pages back to file system, as a script since
+            #   each step of the statement only frees one page
+            self.connection.executescript( 'PRAGMA incremental_vacuum;' )
+
+        return evictedNum
+
+    def getStatusDict( self ) -> Dict:
+        ''' This function returns number of cached histograms and size
+            of cache file
+        '''
+
+        return { 'entryNum' : self.getEntryNum(), 'fileByteNum' : os.path.getsize( self.histogramCacheFilePath ) }
+
+    def close( self ):
+        ''' This function commits cached histograms and evicts beyond
+            maximum byte number, then closes cache file
+        '''
+
+        if not self.isReadOnly:
+            self.connection.commit()
+            self.evict()
+
+            #   Close connections of reader threads too, so that write
+            #   ahead log is removed
+            with ReaderHistogramCacheLock:
+                for key in [ key for key in ReaderHistogramCacheDict.keys() if key[0] == self.histogramCacheFilePath ]:
+                    ReaderHistogramCacheDict.pop( key ).close()
+
+        self.connection.close()
@@ -0,0 +1,36 @@
+##########################################################################
+#   IMPORT
+##########################################################################
+
+from typing import Tuple, Optional
+
+##########################################################################
+#   GLOBAL
+##########################################################################
+
+##########################################################################
+#   HELPER
+##########################################################################
+
+##########################################################################
+#   CLASS
+##########################################################################
+
+class ImageData(object):
+
+    def __init__(self, imageId : int, imageFilePath : str, histogram : Tuple[float],
+                    fileSize : Optional[int] = None, fileMtime : Optional[int] = None, fileHash : Optional[str] = None,
+                    thumbnail : Optional[bytes] = None ):
+        self.imageId = imageId
+        self.imageFilePath = imageFilePath
+        self.histogram = histogram
+        self.fileSize = fileSize
+        self.fileMtime = fileMtime
+        self.fileHash = fileHash
+
+        #   Thumbnail is only carried from decoding to thumbnail pack,
+        #   index does not store it
+        self.thumbnail = thumbnail
+
+    def __str__(self):
+        return 'ImageData( imageId={}, imageFilePath={} )'.format( self.imageId, self.imageFilePath )
@@ -0,0 +1,210 @@
+##########################################################################
+#   IMPORT
+##########################################################################
+
+import os
+from typing import Iterator, Dict, Optional, Iterable
+from metrics.Metrics import Metrics
+
+##########################################################################
+#   GLOBAL
+##########################################################################
+
+#   Extensions of image formats PIL reads, compared in lower case
+ImageFileExtensionList = [ '.bmp', '.gif', '.ico', '.jpe', '.jpeg', '.jpg', '.pbm', '.pgm', '.png', '.pnm', '.ppm', '.tif', '.tiff', '.webp' ]
+
+#   Leading bytes of the same formats, WebP also has its name after
+#   RIFF header
+ImageMagicList = [ b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n', b'GIF87a', b'GIF89a', b'BM', b'II*\x00', b'MM\x00*', b'\x00\x00\x01\x00',
+                    b'P1', b'P2', b'P3', b'P4', b'P5', b'P6' ]
+WebpMagic = b'WEBP'
+MagicByteNum = 16
+
+#   Symbolic link policies, skip every link, follow links to files
+#   only, or follow links to directories too
+SymlinkSkip = 'skip'
+SymlinkFile = 'file'
+SymlinkFollow = 'follow'
+SymlinkPolicyList = [ SymlinkSkip, SymlinkFile, SymlinkFollow ]
+
+##########################################################################
+#   HELPER
+##########################################################################
+
+def hasImageMagic( imageFilePath : str ) -> bool:
+    ''' This function checks leading bytes of given file against known
+        image formats, file which cannot be read is not an image
+    '''
+
+    try:
+        with open( imageFilePath, 'rb' ) as imageFile:
+            headerBytes = imageFile.read( MagicByteNum )
+    except OSError:
+        return False
+
+    if headerBytes.startswith( b'RIFF' ):
+        return headerBytes[ 8:12 ] == WebpMagic
+
+    return any( headerBytes.startswith( magic ) for magic in ImageMagicList )
+
+##########################################################################
+#   CLASS
+##########################################################################
+
+class ImageFileWalker(object):
+    ''' This class walks image directory tree with os.scandir() and
+        yields image file paths one by one, so that indexing starts
+        before whole tree is listed and memory does not grow with
+        number of files
+
+        Entries of each directory are yielded in os.scandir() order as
+        they are listed, so a flat directory of millions of files is
+        never held in memory, and its subdirectories are walked depth
+        first after its files. Only paths of subdirectories still to
+        walk are held. Unchanged directory lists in the same order on
+        common file systems, though it is not guaranteed, a resumed
+        build checks it by task hash and an incremental build keeps
+        image ids of previous index whatever the order
+
+        Files are kept by extension, or by any extension if extension
+        list is None, and optionally by leading bytes which costs one
+        read per file. Hidden entries, whose name starts with a dot,
+        are skipped unless included. Directory which cannot be listed
+        is reported and skipped
+    '''
+
+    def __init__( self, isRecursive : bool = True, extensionList : Optional[Iterable[str]] = ImageFileExtensionList,
+                    isMagicChecked : bool = False, symlinkPolicy : str = SymlinkFile, isHiddenIncluded : bool = False ):
+
+        if symlinkPolicy not in SymlinkPolicyList:
+            raise ValueError( 'ImageFileWalker() - Invalid symbolic link policy {}.'.format( symlinkPolicy ) )
+
+        self.isRecursive = isRecursive
+        self.extensionSet = { extension.lower() for extension in extensionList } if extensionList is not None else None
+        self.isMagicChecked = isMagicChecked
+        self.symlinkPolicy = symlinkPolicy
+        self.isHiddenIncluded = isHiddenIncluded
+
+    def getSettingDict( self ) -> Dict:
+        ''' This function returns walk setting as JSON ready dictionary,
+            walks with the same setting list the same files
+        '''
+
+        return {
+            'isRecursive' : self.isRecursive,
+            'extensionList' : sorted( self.extensionSet ) if self.extensionSet is not None else None,
+            'isMagicChecked' : self.isMagicChecked,
+            'symlinkPolicy' : self.symlinkPolicy,
+            'isHiddenIncluded' : self.isHiddenIncluded,
+        }
+
+    def iterateEntry( self, directoryPath : str ) -> Iterator[os.DirEntry]:
+        ''' This function yields entries of given directory in listing
+            order, or none if it cannot be listed, listing which fails
+            midway is reported and stops there
+        '''
+
+        try:
+            with Metrics.time( 'indexer.listDirectory' ):
+                entryIterator = os.scandir( directoryPath )
+        except OSError as e:
+            print( 'iterate() - Skip directory at {}, {}'.format( directoryPath, e ) )
+            return
+
+        with entryIterator:
+            while True:
+
+                try:
+                    with Metrics.time( 'indexer.listDirectory' ):
+                        entry = next( entryIterator, None )
+                except OSError as e:
+                    print( 'iterate() - Skip rest of directory at {}, {}'.format( directoryPath, e ) )
+                    return
+
+                if entry is None:
+                    return
+
+                yield entry
+
+    def isImageFile( self, entry : os.DirEntry ) -> bool:
+        ''' This function checks if given file entry is kept by
+            extension and leading bytes
+        '''
+
+        if self.extensionSet is not None and os.path.splitext( entry.name )[1].lower() not in self.extensionSet:
+            return False
+
+        return not self.isMagicChecked or hasImageMagic( entry.path )
+
+    def iterate( self, imageDir : str ) -> Iterator[str]:
+        ''' This function returns iterator of image file paths inside
+            given image directory, see class description, and raises
+            right away if directory does not exist
+        '''
+
+        #   Check if image directory exists
+        if not os.path.isdir( imageDir ):
+            raise ValueError( 'iterate() - Cannot find image directory at {}.'.format( imageDir ) )
+
+        return self.iterateImageFile( imageDir )
+
+    def iterateImageFile( self, imageDir : str ) -> Iterator[str]:
+        ''' This function yields image file paths inside given existing
+            image directory
+        '''
+
+        #   Followed links may lead back to a directory already walked,
+        #   so directories are identified by device and inode
+        visitedDirectorySet = set()
+        if self.symlinkPolicy == SymlinkFollow:
+            directoryStat = os.stat( imageDir )
+            visitedDirectorySet.add( ( directoryStat.st_dev, directoryStat.st_ino ) )
+
+        #   Directories still to walk, last one first
+        directoryPathList = [ imageDir ]
+
+        while len( directoryPathList ) > 0:
+
+            subdirectoryPathList = list()
+
+            for entry in self.iterateEntry( directoryPathList.pop() ):
+
+                if not self.isHiddenIncluded and entry.name.startswith( '.' ):
+                    continue
+
+                try:
+                    isSymlink = entry.is_symlink()
+
+                    if entry.is_dir():
+
+                        if not self.isRecursive or ( isSymlink and self.symlinkPolicy != SymlinkFollow ):
+                            continue
+
+                        if self.symlinkPolicy == SymlinkFollow:
+                            directoryStat = entry.stat()
+                            directoryKey = ( directoryStat.st_dev, directoryStat.st_ino )
+                            if directoryKey in visitedDirectorySet:
+                                continue
+                            visitedDirectorySet.add( directoryKey )
+
+                        subdirectoryPathList.append( entry.path )
+                        continue
+
+                    #   Broken link, socket or other special file
+                    if not entry.is_file():
+                        continue
+
+                except OSError:
+                    continue
+
+                if isSymlink and self.symlinkPolicy == SymlinkSkip:
+                    continue
+
+                if not self.isImageFile( entry ):
+                    Metrics.count( 'indexer.filterFileNum' )
+                    continue
+
+                yield entry.path
+
+            #   Subdirectories are walked in listing order, depth first
+            directoryPathList.extend( reversed( subdirectoryPathList ) )
@@ -0,0 +1,790 @@
+##########################################################################
+#   IMPORT
+##########################################################################
+
+import os
+import numpy as np
+from collections.abc import Mapping
+from typing import List, Tuple, Dict, Optional, Set
+from imageprocessor.ImageProcessor import ImageProcessor
+from indexer.ImageData import ImageData
+from indexer.AnnIndex import AnnIndex
+from indexer.SparseHistogramMatrix import SparseHistogramMatrix, SparseHistogramSectionNameList, getRangeIndexArray
+
+##########################################################################
+#   GLOBAL
+##########################################################################
+
+HistogramBinNum = 256*3
+HistogramDtype = np.float32
+
+#   Bins per channel of each level of coarse histogram pyramid
+CoarseBinNumList = [ 4, 16 ]
+
+#   Unknown file size or modification time is stored as this value
+MissingFileManifestValue = -1
+
+#   Dtype of coarse histograms for each histogram dtype, quantized
+#   coarse bins are sums of quantized bins divided, rounding up, so
+#   that they fit the same integers, see getCoarseHistogramDivisor()
+CoarseHistogramDtypeDict = {
+    'float32' : 'float32',
+    'uint16' : 'uint16',
+    'uint8' : 'uint8',
+}
+
+#   Relative amount by which bins of a channel rounded to float32 may
+#   sum beyond one
+ChannelSumTolerance = 1e-4
+
+StringSectionNameList = [ 'filePath', 'fileHash' ]
+
+#   Number of bytes of a section read at once when loading index
+DefaultLoadBlockByteNum = 16 << 20
+
+#   Number of rows copied at once when merging changes into index
+MergeBlockRowNum = 1 << 16
+
+#   Histograms are stored dense, with every bin, or sparse, with
+#   non-empty bins only, auto picks sparse if few bins are filled
+HistogramLayoutList = [ 'auto', 'dense', 'sparse' ]
+DefaultHistogramLayout = 'auto'
+
+#   Largest fraction of non-empty bins at which sparse histograms are
+#   picked, comparing them is faster than dense ones below it
+SparseMaxDensity = 0.1
+
+##########################################################################
+#   HELPER
+##########################################################################
+
+def getSectionSpecDict( histogramDtype : str = np.dtype( HistogramDtype ).name ) -> Dict[str, Tuple[str, Tuple]]:
+    ''' This function returns dtype and row shape of every section
+        for given histogram dtype, besides string columns which are
+        stored as offset and data section pair
+    '''
+
+    sectionSpecDict = {
+        'imageId' : ( np.dtype( np.int64 ).str, () ),
+        'histogram' : ( np.dtype( histogramDtype ).str, ( HistogramBinNum, ) ),
+        'fileSize' : ( np.dtype( np.int64 ).str, () ),
+        'fileMtime' : ( np.dtype( np.int64 ).str, () ),
+    }
+    for coarseBinNum in CoarseBinNumList:
+        sectionSpecDict[ 'coarseHistogram{}'.format( coarseBinNum ) ] = ( np.dtype( CoarseHistogramDtypeDict[ histogramDtype ] ).str, ( 3*coarseBinNum, ) )
+
+    return sectionSpecDict
+
+def getCoarseHistogramDivisor( histogramDtype : str, histogramScale : Optional[float] ) -> int:
+    ''' This function returns divisor of coarse bins of histograms
+        quantized to given dtype with given scale, 1 for float ones
+
+        Quantized bins of a channel sum to at most scale plus half per
+        bin, so a merged bin divided by it fits the dtype. Rounding up
+        keeps coarse similarity an upper bound once multiplied back
+    '''
+
+    if histogramScale is None:
+        return 1
+
+    maxCoarseBin = histogramScale*( 1 + ChannelSumTolerance ) + HistogramBinNum//3/2
+
+    return max( 1, int( np.ceil( maxCoarseBin / np.iinfo( histogramDtype ).max ) ) )
+
+def getHistogramScale( histogramDtype : str, histogramScale : Optional[float] = None ) -> Optional[float]:
+    ''' This function checks given histogram dtype and returns its
+        quantization scale, None for float histograms, and by default
+        the largest integer of quantized dtype so that no bin saturates
+    '''
+
+    if histogramDtype not in CoarseHistogramDtypeDict:
+        raise ValueError( 'getHistogramScale() - Invalid histogram dtype {}.'.format( histogramDtype ) )
+
+    if not np.issubdtype( np.dtype( histogramDtype ), np.integer ):
+        if histogramScale is not None:
+            raise ValueError( 'getHistogramScale() - Histogram dtype {} cannot have scale.'.format( histogramDtype ) )
+        return None
+
+    if histogramScale is None:
+        return float( np.iinfo( histogramDtype ).max )
+
+    if not histogramScale > 0:
+        raise ValueError( 'getHistogramScale() - Invalid histogram scale {}.'.format( histogramScale ) )
+
+    return float( histogramScale )
+
+def packStringList( stringList : List[Optional[str]] ) -> Tuple[np.ndarray, np.ndarray]:
+    ''' This function packs given strings into string table of
+        offset array and byte data array, None is packed as empty
+        string
+    '''
+
+    #   Encode as file system does, so that undecodable file names
+    #   survive a round trip
+    encodedStringList = [ os.fsencode( string ) if string is not None else b'' for string in stringList ]
+
+    offsetArray = np.zeros( len( encodedStringList ) + 1, dtype=np.uint64 )
+    np.cumsum( [ len( encodedString ) for encodedString in encodedStringList ], out=offsetArray[1:] )
+
+    dataArray = np.frombuffer( b''.join( encodedStringList ), dtype=np.uint8 )
+
+    return offsetArray, dataArray
+
+def unpackString( offsetArray : np.ndarray, dataArray : np.ndarray, index : int ) -> str:
+    ''' This function unpacks string at given index of string table
+    '''
+
+    return os.fsdecode( dataArray[ int(offsetArray[index]):int(offsetArray[index+1]) ].tobytes() )
+
+def mergeStringTable( offsetArray : np.ndarray, dataArray : np.ndarray, keptRowArray : np.ndarray, keptPositionArray : np.ndarray,
+                        addedStringList : List[Optional[str]], addedPositionArray : np.ndarray ) -> Tuple[np.ndarray, np.ndarray]:
+    ''' This function returns string table of given kept rows of given
+        string table and given added strings, at given positions, bytes
+        of kept rows are copied without decoding them
+    '''
+
+    addedOffsetArray, addedDataArray = packStringList( addedStringList )
+
+    offsetArray = offsetArray.astype( np.int64 )
+    keptStartArray = offsetArray[ keptRowArray ]
+    keptLengthArray = offsetArray[ keptRowArray + 1 ] - keptStartArray
+
+    lengthArray = np.zeros( len( keptPositionArray ) + len( addedPositionArray ), dtype=np.int64 )
+    lengthArray[ keptPositionArray ] = keptLengthArray
+    lengthArray[ addedPositionArray ] = np.diff( addedOffsetArray.astype( np.int64 ) )
+
+    mergedOffsetArray = np.zeros( len( lengthArray ) + 1, dtype=np.uint64 )
+    np.cumsum( lengthArray, out=mergedOffsetArray[1:] )
+
+    mergedDataArray = np.zeros( int( mergedOffsetArray[-1] ), dtype=np.uint8 )
+    mergedDataArray[ getRangeIndexArray( mergedOffsetArray[ keptPositionArray ], keptLengthArray ) ] = dataArray[ getRangeIndexArray( keptStartArray, keptLengthArray ) ]
+    mergedDataArray[ getRangeIndexArray( mergedOffsetArray[ addedPositionArray ], lengthArray[ addedPositionArray ] ) ] = addedDataArray
+
+    return mergedOffsetArray, mergedDataArray
+
+##########################################################################
+#   CLASS
+##########################################################################
+
+class ImageIndex( Mapping ):
+    ''' This class is a columnar image index which keeps image ids,
+        histograms and file manifests as arrays, sorted by image id
+
+        It maps image id to image data like a dictionary, image data
+        is constructed on access so a memory mapped index is never
+        fully loaded into memory
+
+        Index read from file has version of its content, which changes
+        whenever the index is rebuilt, in-memory index has none
+    '''
+
+    def __init__(self, metadataDict : Dict, sectionDict : Dict[str, np.ndarray], version : Optional[str] = None):
+        self.metadataDict = metadataDict
+        self.sectionDict = sectionDict
+        self.version = version
+        self.imageIdArray = sectionDict[ 'imageId' ]
+
+        #   Sparse histograms are indexed like dense ones, see
+        #   SparseHistogramMatrix
+        if 'histogram' in sectionDict:
+            self.histogramMatrix = sectionDict[ 'histogram' ]
+        else:
+            self.histogramMatrix = SparseHistogramMatrix.fromSectionDict( sectionDict, HistogramBinNum )
+
+    @staticmethod
+    def fromImageDataDict( imageIdToImageDataDict : Dict, metadataDict : Optional[Dict] = None,
+                            histogramDtype : str = np.dtype( HistogramDtype ).name, histogramScale : Optional[float] = None ) -> 'ImageIndex':
+        ''' This function constructs image index from dictionary
+            of image id to image data, with given index settings as
+            metadata, storing histograms as given dtype
+        '''
+
+        histogramScale = getHistogramScale( histogramDtype, histogramScale )
+
+        imageDataList = [ imageIdToImageDataDict[ imageId ] for imageId in sorted( imageIdToImageDataDict.keys() ) ]
+
+        sectionDict, stringListDict = ImageIndex.getColumnDict( imageDataList, histogramDtype, histogramScale )
+
+        #   Construct string tables
+        for stringSectionName, stringList in stringListDict.items():
+            sectionDict[ stringSectionName + 'Offset' ], sectionDict[ stringSectionName + 'Data' ] = packStringList( stringList )
+
+        return ImageIndex( ImageIndex.getMetadataDict( len( imageDataList ), metadataDict, histogramScale ), sectionDict )
+
+    @staticmethod
+    def getMetadataDict( imageNum : int, metadataDict : Optional[Dict] = None, histogramScale : Optional[float] = None ) -> Dict:
+        ''' This function returns index metadata of given image number,
+            histogram quantization scale and index settings
+        '''
+
+        metadataDict = dict( metadataDict or dict() )
+        metadataDict[ 'imageNum' ] = imageNum
+        metadataDict[ 'histogramBinNum' ] = HistogramBinNum
+        metadataDict[ 'histogramScale' ] = histogramScale
+
+        return metadataDict
+
+    @staticmethod
+    def getColumnDict( imageDataList : List[ImageData], histogramDtype : str = np.dtype( HistogramDtype ).name,
+                        histogramScale : Optional[float] = None ) -> Tuple[Dict[str, np.ndarray], Dict[str, List[Optional[str]]]]:
+        ''' This function converts given image data to arrays of
+            every section and lists of every string column, histograms
+            are quantized with given scale if dtype is integer
+        '''
+
+        #   Construct histogram matrix
+        histogramMatrix = np.zeros( ( len( imageDataList ), HistogramBinNum ), dtype=HistogramDtype )
+        for row, imageData in enumerate( imageDataList ):
+            histogramMatrix[ row ] = imageData.histogram
+
+        sectionDict = {
+            'imageId' : np.array( [ imageData.imageId for imageData in imageDataList ], dtype=np.int64 ),
+            'fileSize' : np.array( [ ImageIndex.getFileManifestValue( imageData, 'fileSize' ) for imageData in imageDataList ], dtype=np.int64 ),
+            'fileMtime' : np.array( [ ImageIndex.getFileManifestValue( imageData, 'fileMtime' ) for imageData in imageDataList ], dtype=np.int64 ),
+        }
+        sectionDict.update( ImageIndex.getHistogramSectionDict( histogramMatrix, histogramDtype, histogramScale ) )
+
+        stringListDict = {
+            'filePath' : [ imageData.imageFilePath for imageData in imageDataList ],
+            'fileHash' : [ getattr( imageData, 'fileHash', None ) for imageData in imageDataList ],
+        }
+
+        return sectionDict, stringListDict
+
+    @staticmethod
+    def getHistogramSectionDict( histogramMatrix : np.ndarray, histogramDtype : str = np.dtype( HistogramDtype ).name,
+                                    histogramScale : Optional[float] = None ) -> Dict[str, np.ndarray]:
+        ''' This function converts given float histogram matrix to
+            histogram section of given dtype and its coarse histogram
+            pyramid
+
+            Coarse histograms are merged from stored histograms, so
+            that they bound similarity of quantized histograms too,
+            see getCoarseHistogramDivisor()
+        '''
+
+        if histogramScale is not None:
+            histogramMatrix = ImageProcessor.quantizeColorHistogram( histogramMatrix, histogramScale, histogramDtype )
+        else:
+            histogramMatrix = np.asarray( histogramMatrix, dtype=histogramDtype )
+
+        sectionDict = { 'histogram' : histogramMatrix }
+
+        #   Construct coarse histogram pyramid
+        coarseHistogramDivisor = getCoarseHistogramDivisor( histogramDtype, histogramScale )
+        for coarseBinNum in CoarseBinNumList:
+            sectionDict[ 'coarseHistogram{}'.format( coarseBinNum ) ] = ImageProcessor.getCoarseColorHistogram( histogramMatrix, coarseBinNum, CoarseHistogramDtypeDict[ histogramDtype ], coarseHistogramDivisor )
+
+        return sectionDict
+
+    @staticmethod
+    def getFileManifestValue( imageData : ImageData, attributeName : str ) -> int:
+        ''' This function returns file manifest attribute of given
+            image data, or missing value if it has none
+        '''
+
+        value = getattr( imageData, attributeName, None )
+
+        return value if value is not None else MissingFileManifestValue
+
+    def getMaxDecodeSize( self ) -> Optional[int]:
+        ''' This function returns maximum decode size histograms in
+            this index were computed with, query histogram must be
+            computed with the same one
+        '''
+
+        return self.metadataDict.get( 'maxDecodeSize' )
+
+    def getHistogramScale( self ) -> Optional[float]:
+        ''' This function returns scale histograms in this index were
+            quantized with, or None if they are stored as float
+        '''
+
+        return self.metadataDict.get( 'histogramScale' )
+
+    def getHistogramDtype( self ) -> str:
+        ''' This function returns dtype histograms of this index are
+            stored as
+        '''
+
+        return self.histogramMatrix.dtype.name
+
+    def getHistogram( self, row : int ) -> np.ndarray:
+        ''' This function returns float histogram at given row, which
+            is scaled back from stored integers if quantized
+        '''
+
+        histogramScale = self.getHistogramScale()
+
+        if histogramScale is None:
+            return self.histogramMatrix[ row ]
+
+        return self.histogramMatrix[ row ] / np.float32( histogramScale )
+
+    def convertHistogram( self, histogramDtype : str, histogramScale : Optional[float] = None ) -> 'ImageIndex':
+        ''' This function returns in-memory copy of this index storing
+            histograms as given dtype, other sections are shared
+        '''
+
+        histogramScale = getHistogramScale( histogramDtype, histogramScale )
+
+        histogramMatrix = np.asarray( self.histogramMatrix, dtype=HistogramDtype )
+        if self.getHistogramScale() is not None:
+            histogramMatrix = histogramMatrix / np.float32( self.getHistogramScale() )
+
+        sectionDict = { sectionName : sectionArray for sectionName, sectionArray in self.sectionDict.items() if sectionName not in SparseHistogramSectionNameList }
+        sectionDict.update( ImageIndex.getHistogramSectionDict( histogramMatrix, histogramDtype, histogramScale ) )
+
+        imageIndex = ImageIndex( ImageIndex.getMetadataDict( len( self ), self.metadataDict, histogramScale ), sectionDict )
+
+        return imageIndex.convertHistogramLayout( self.getHistogramLayout() )
+
+    def getHistogramLayout( self ) -> str:
+        ''' This function returns whether histograms of this index are
+            stored dense or sparse
+        '''
+
+        return 'sparse' if isinstance( self.histogramMatrix, SparseHistogramMatrix ) else 'dense'
+
+    def getHistogramDensity( self ) -> float:
+        ''' This function returns fraction of histogram bins of this
+            index which are not empty
+        '''
+
+        if isinstance( self.histogramMatrix, SparseHistogramMatrix ):
+            return self.histogramMatrix.getDensity()
+
+        #   Count block by block, memory mapped section is never
+        #   copied whole at once
+        nonEmptyBinNum = sum( int( np.count_nonzero( self.histogramMatrix[ startRow:startRow+MergeBlockRowNum ] ) )
+                                for startRow in range( 0, len( self ), MergeBlockRowNum ) )
+
+        return nonEmptyBinNum / max( len( self )*HistogramBinNum, 1 )
+
+    def convertHistogramLayout( self, histogramLayout : str ) -> 'ImageIndex':
+        ''' This function returns index storing histograms dense or
+            sparse, auto picks sparse if at most SparseMaxDensity of
+            bins are filled, such as images of few colors. This index
+            is returned as it is if it already has that layout,
+            otherwise an in-memory index sharing other sections
+
+            Layout does not change search results, histograms of
+            either layout are summed exactly, see
+            ImageProcessor.compareColorHistogramMatrix()
+        '''
+
+        if histogramLayout not in HistogramLayoutList:
+            raise ValueError( 'convertHistogramLayout() - Invalid histogram layout {}.'.format( histogramLayout ) )
+
+        if histogramLayout == 'auto':
+            histogramLayout = 'sparse' if self.getHistogramDensity() <= SparseMaxDensity else 'dense'
+
+        if histogramLayout == self.getHistogramLayout():
+            return self
+
+        sectionDict = { sectionName : sectionArray for sectionName, sectionArray in self.sectionDict.items()
+                        if sectionName != 'histogram' and sectionName not in SparseHistogramSectionNameList }
+
+        if histogramLayout == 'sparse':
+            sectionDict.update( SparseHistogramMatrix.fromDense( self.histogramMatrix ).getSectionDict() )
+        else:
+            sectionDict[ 'histogram' ] = self.histogramMatrix.toDense()
+
+        return ImageIndex( dict( self.metadataDict ), sectionDict )
+
+    def selectRows( self, rowArray : np.ndarray ) -> 'ImageIndex':
+        ''' This function returns in-memory index of given sorted rows
+            of this index, with the same metadata and sections
+        '''
+
+        stringSectionNameSet = { stringSectionName + suffix for stringSectionName in StringSectionNameList for suffix in ( 'Offset', 'Data' ) }
+
+        sectionDict = { sectionName : np.array( sectionArray[ rowArray ] ) for sectionName, sectionArray in self.sectionDict.items()
+                        if sectionName not in stringSectionNameSet and sectionName not in SparseHistogramSectionNameList and not sectionName.startswith( 'ann' ) }
+
+        if isinstance( self.histogramMatrix, SparseHistogramMatrix ):
+            sectionDict.update( self.histogramMatrix.selectRows( rowArray ).getSectionDict() )
+
+        for stringSectionName in StringSectionNameList:
+            offsetArray, dataArray = self.sectionDict[ stringSectionName + 'Offset' ], self.sectionDict[ stringSectionName + 'Data' ]
+            stringList = [ unpackString( offsetArray, dataArray, row ) for row in rowArray.tolist() ]
+            sectionDict[ stringSectionName + 'Offset' ], sectionDict[ stringSectionName + 'Data' ] = packStringList( stringList )
+
+        if self.hasAnnIndex():
+            sectionDict.update( AnnIndex.selectRows( self.sectionDict, rowArray ) )
+
+        return ImageIndex( ImageIndex.getMetadataDict( len( rowArray ), self.metadataDict, self.getHistogramScale() ), sectionDict )
+
+    def applyDelta( self, imageIdToImageDataDict : Dict, deletedImageIdSet : Set[int], version : Optional[str] = None ) -> 'ImageIndex':
+        ''' This function returns in-memory index of this index with
+            given image data added, replacing image data of the same
+            image id, and given image ids removed, histograms are stored
+            as this index stores them
+
+            Approximate nearest neighbour centroids are kept, added
+            images join their nearest centroid
+        '''
+
+        histogramScale = self.getHistogramScale()
+
+        removedImageIdArray = np.array( sorted( deletedImageIdSet.union( imageIdToImageDataDict.keys() ) ), dtype=np.int64 )
+        keptRowArray = np.flatnonzero( ~np.isin( self.imageIdArray, removedImageIdArray ) )
+
+        addedImageDataList = [ imageIdToImageDataDict[ imageId ] for imageId in sorted( imageIdToImageDataDict.keys() ) ]
+        addedSectionDict, addedStringListDict = ImageIndex.getColumnDict( addedImageDataList, self.histogramMatrix.dtype.name, histogramScale )
+
+        #   Place kept and added rows at their position in image id
+        #   order, without sorting large sections
+        imageIdArray = np.sort( np.concatenate( ( self.imageIdArray[ keptRowArray ], addedSectionDict[ 'imageId' ] ) ) )
+        keptPositionArray = np.searchsorted( imageIdArray, self.imageIdArray[ keptRowArray ] )
+        addedPositionArray = np.searchsorted( imageIdArray, addedSectionDict[ 'imageId' ] )
+
+        sectionDict = dict()
+
+        #   Index written before coarse histograms existed keeps none,
+        #   nor does index whose quantized coarse histograms are wider
+        #   integers, undivided, and sparse histograms are merged as
+        #   they are stored
+        for sectionName, addedSectionArray in addedSectionDict.items():
+            if sectionName not in self.sectionDict or self.sectionDict[ sectionName ].dtype != addedSectionArray.dtype:
+                continue
+
+            sectionArray = self.sectionDict[ sectionName ]
+            mergedSectionArray = np.zeros( ( len( imageIdArray ), ) + sectionArray.shape[1:], dtype=sectionArray.dtype )
+
+            #   Copy kept rows block by block, memory mapped section is
+            #   never copied whole at once
+            for startPosition in range( 0, len( keptRowArray ), MergeBlockRowNum ):
+                endPosition = startPosition + MergeBlockRowNum
+                mergedSectionArray[ keptPositionArray[ startPosition:endPosition ] ] = sectionArray[ keptRowArray[ startPosition:endPosition ] ]
+
+            mergedSectionArray[ addedPositionArray ] = addedSectionArray
+            sectionDict[ sectionName ] = mergedSectionArray
+
+        if isinstance( self.histogramMatrix, SparseHistogramMatrix ):
+            sectionDict.update( self.histogramMatrix.mergeRows( keptRowArray, keptPositionArray, SparseHistogramMatrix.fromDense( addedSectionDict[ 'histogram' ] ),
+                                                                addedPositionArray ).getSectionDict() )
+
+        for stringSectionName in StringSectionNameList:
+            sectionDict[ stringSectionName + 'Offset' ], sectionDict[ stringSectionName + 'Data' ] = mergeStringTable(
+                self.sectionDict[ stringSectionName + 'Offset' ], self.sectionDict[ stringSectionName + 'Data' ], keptRowArray, keptPositionArray,
+                addedStringListDict[ stringSectionName ], addedPositionArray )
+
+        if self.hasAnnIndex():
+            sectionDict.update( AnnIndex.mergeRows( self.sectionDict, keptRowArray, keptPositionArray,
+                                                    addedSectionDict[ 'histogram' ], addedPositionArray, histogramScale ) )
+
+        return ImageIndex( ImageIndex.getMetadataDict( len( imageIdArray ), self.metadataDict, histogramScale ), sectionDict, version )
+
+    def compact( self ) -> 'ImageIndex':
+        ''' This function returns index with changes of its delta log
+            applied, see DeltaImageIndex, this index has none so it is
+            returned as it is
+        '''
+
+        return self
+
+    def iterateLoad( self, blockByteNum : int = DefaultLoadBlockByteNum ):
+        ''' This function reads every section of memory mapped index
+            block by block, so that its pages are loaded before they
+            are searched, and yields fraction of bytes read so far
+
+            Sections are read in the order a search reads them, coarse
+            histograms first, and index can be searched meanwhile
+        '''
+
+        searchSectionNameList = [ 'coarseHistogram{}'.format( coarseBinNum ) for coarseBinNum in CoarseBinNumList ] + [ 'histogram' ] + SparseHistogramSectionNameList
+        sectionNameList = [ sectionName for sectionName in searchSectionNameList if sectionName in self.sectionDict ]
+        sectionNameList += [ sectionName for sectionName in self.sectionDict.keys() if sectionName not in sectionNameList ]
+
+        totalByteNum = max( 1, sum( self.sectionDict[ sectionName ].nbytes for sectionName in sectionNameList ) )
+        loadedByteNum = 0
+
+        for sectionName in sectionNameList:
+
+            sectionArray = self.sectionDict[ sectionName ]
+            rowByteNum = max( 1, sectionArray.nbytes // max( 1, len( sectionArray ) ) )
+            blockRowNum = max( 1, blockByteNum // rowByteNum )
+
+            for startRow in range( 0, len( sectionArray ), blockRowNum ):
+                sectionBlock = sectionArray[ startRow:startRow+blockRowNum ]
+
+                #   Reduction touches every page without copying block
+                if sectionBlock.size > 0:
+                    np.max( sectionBlock )
+
+                loadedByteNum += sectionBlock.nbytes
+                yield loadedByteNum / totalByteNum
+
+        yield 1.0
+
+    def getCoarseHistogramMatrixList( self ) -> List[Tuple[int, np.ndarray]]:
+        ''' This function returns bins per channel and matrix of every
+            coarse histogram level this index has, coarsest first
+        '''
+
+        coarseHistogramMatrixList = list()
+
+        for coarseBinNum in CoarseBinNumList:
+            sectionName = 'coarseHistogram{}'.format( coarseBinNum )
+            if sectionName in self.sectionDict:
+                coarseHistogramMatrixList.append( ( coarseBinNum, self.sectionDict[ sectionName ] ) )
+
+        return coarseHistogramMatrixList
+
+    def getCoarseHistogramDivisor( self ) -> int:
+        ''' This function returns divisor of coarse histogram bins of
+            this index, see getCoarseHistogramDivisor(), index written
+            when quantized coarse bins were wider integers has none
+        '''
+
+        coarseHistogramMatrixList = self.getCoarseHistogramMatrixList()
+
+        if len( coarseHistogramMatrixList ) == 0 or coarseHistogramMatrixList[0][1].dtype != self.histogramMatrix.dtype:
+            return 1
+
+        return getCoarseHistogramDivisor( self.histogramMatrix.dtype.name, self.getHistogramScale() )
+
+    def hasAnnIndex( self ) -> bool:
+        ''' This function checks whether this index has approximate
+            nearest neighbour sections
+        '''
+
+        return 'annCentroid' in self.sectionDict
+
+    def getImageIdArray( self ) -> np.ndarray:
+        ''' This function returns sorted image ids of this index
+        '''
+
+        return self.imageIdArray
+
+    def getRow( self, imageId : int ) -> int:
+        ''' This function returns row of given image id in arrays,
+            or raises KeyError if there is no such image id
+        '''
+
+        row = int( np.searchsorted( self.imageIdArray, imageId ) )
+
+        if row == len( self.imageIdArray ) or self.imageIdArray[ row ] != imageId:
+            raise KeyError( imageId )
+
+        return row
+
+    def getImageFilePath( self, row : int ) -> str:
+        ''' This function returns image file path at given row
+        '''
+
+        return unpackString( self.sectionDict[ 'filePathOffset' ], self.sectionDict[ 'filePathData' ], row )
+
+    def getFileSizeMtime( self, row : int ) -> Tuple[Optional[int], Optional[int]]:
+        ''' This function returns file size and modification time at
+            given row, or None for those of unknown value
+        '''
+
+        fileSize = int( self.sectionDict[ 'fileSize' ][ row ] )
+        fileMtime = int( self.sectionDict[ 'fileMtime' ][ row ] )
+
+        return ( fileSize if fileSize != MissingFileManifestValue else None,
+                    fileMtime if fileMtime != MissingFileManifestValue else None )
+
+    def getImageData( self, row : int ) -> ImageData:
+        ''' This function constructs image data at given row
+        '''
+
+        fileSize = int( self.sectionDict[ 'fileSize' ][ row ] )
+        fileMtime = int( self.sectionDict[ 'fileMtime' ][ row ] )
+        fileHash = unpackString( self.sectionDict[ 'fileHashOffset' ], self.sectionDict[ 'fileHashData' ], row )
+
+        return ImageData( int( self.imageIdArray[ row ] ),
+                            self.getImageFilePath( row ),
+                            self.getHistogram( row ),
+                            fileSize if fileSize != MissingFileManifestValue else None,
+                            fileMtime if fileMtime != MissingFileManifestValue else None,
+                            fileHash if len( fileHash ) > 0 else None )
+
+    def __getitem__( self, imageId : int ) -> ImageData:
+        return self.getImageData( self.getRow( imageId ) )
+
+    def __iter__( self ):
+        return iter( self.imageIdArray.tolist() )
+
+    def __len__( self ):
+        return len( self.imageIdArray )
+
+    def __contains__( self, imageId ):
+        try:
+            self.getRow( imageId )
+        except KeyError:
+            return False
+        return True
+
+    def items( self ):
+        ''' This function iterates image id and image data pairs
+            row by row, without looking up each image id
+        '''
+
+        for row, imageId in enumerate( self.imageIdArray.tolist() ):
+            yield imageId, self.getImageData( row )
+
+    def values( self ):
+        ''' This function iterates image data row by row
+        '''
+
+        for row in range( len( self.imageIdArray ) ):
+            yield self.getImageData( row )
+
+class DeltaImageIndex( ImageIndex ):
+    ''' This class is an image index made of memory mapped base index
+        and small in-memory index of images added or updated by delta
+        log, see DeltaLog, so that applying delta log copies no section
+        of base index
+
+        Base rows of deleted or updated image ids are hidden. Rows of
+        this index are rows of base index followed by rows of delta
+        index, so a row of an image id is only valid for this index
+
+        Searcher searches base and delta index separately and merges
+        their results, as if delta log was applied, see compact()
+    '''
+
+    def __init__( self, baseImageIndex : ImageIndex, imageIdToImageDataDict : Dict, deletedImageIdSet : Set[int], version : Optional[str] = None ):
+
+        self.baseImageIndex = baseImageIndex
+        self.version = version
+
+        #   Delta histograms are stored as base ones are, so that both
+        #   give the same scores as a compacted index
+        self.deltaImageIndex = ImageIndex.fromImageDataDict( imageIdToImageDataDict, baseImageIndex.metadataDict,
+                                                                baseImageIndex.getHistogramDtype(), baseImageIndex.getHistogramScale() )
+        self.deltaImageIndex = self.deltaImageIndex.convertHistogramLayout( baseImageIndex.getHistogramLayout() )
+
+        #   Find base rows of removed image ids
+        removedImageIdArray = np.array( sorted( deletedImageIdSet.union( imageIdToImageDataDict.keys() ) ), dtype=np.int64 )
+        removedRowArray = np.searchsorted( baseImageIndex.imageIdArray, removedImageIdArray )
+        isFoundArray = removedRowArray < len( baseImageIndex.imageIdArray )
+        isFoundArray[ isFoundArray ] = baseImageIndex.imageIdArray[ removedRowArray[ isFoundArray ] ] == removedImageIdArray[ isFoundArray ]
+        self.removedRowArray = removedRowArray[ isFoundArray ]
+
+        self.metadataDict = ImageIndex.getMetadataDict( len( self ), baseImageIndex.metadataDict, baseImageIndex.getHistogramScale() )
+
+    def getRemovedImageIdSet( self ) -> Set[int]:
+        ''' This function returns image ids of base rows which are
+            hidden
+        '''
+
+        return set( self.baseImageIndex.imageIdArray[ self.removedRowArray ].tolist() )
+
+    def getImageIdArray( self ) -> np.ndarray:
+        ''' This function returns sorted image ids of this index
+        '''
+
+        return np.sort( np.concatenate( ( np.delete( self.baseImageIndex.imageIdArray, self.removedRowArray ), self.deltaImageIndex.imageIdArray ) ) )
+
+    def compact( self ) -> ImageIndex:
+        ''' This function returns in-memory index of base index with
+            delta applied, every section is copied
+        '''
+
+        imageIdToImageDataDict = dict( self.deltaImageIndex.items() )
+        deletedImageIdSet = self.getRemovedImageIdSet()
+
+        return self.baseImageIndex.applyDelta( imageIdToImageDataDict, deletedImageIdSet, self.version )
+
+    def getHistogramDtype( self ) -> str:
+        ''' This function returns dtype of base histograms, delta ones
+            are stored the same way
+        '''
+
+        return self.baseImageIndex.getHistogramDtype()
+
+    def getHistogramLayout( self ) -> str:
+        ''' This function returns layout of base histograms, delta ones
+            are stored the same way
+        '''
+
+        return self.baseImageIndex.getHistogramLayout()
+
+    def hasAnnIndex( self ) -> bool:
+        ''' This function checks whether base index has approximate
+            nearest neighbour sections, delta index never has
+        '''
+
+        return self.baseImageIndex.hasAnnIndex()
+
+    def iterateLoad( self, blockByteNum : int = DefaultLoadBlockByteNum ):
+        ''' This function reads base index block by block, delta index
+            is already in memory, see ImageIndex.iterateLoad()
+        '''
+
+        yield from self.baseImageIndex.iterateLoad( blockByteNum )
+
+    def getRow( self, imageId : int ) -> int:
+        ''' This function returns row of given image id in this index,
+            or raises KeyError if there is no such image id
+        '''
+
+        if imageId in self.deltaImageIndex:
+            return len( self.baseImageIndex ) + self.deltaImageIndex.getRow( imageId )
+
+        row = self.baseImageIndex.getRow( imageId )
+
+        position = int( np.searchsorted( self.removedRowArray, row ) )
+        if position < len( self.removedRowArray ) and self.removedRowArray[ position ] == row:
+            raise KeyError( imageId )
+
+        return row
+
+    def getImageFilePath( self, row : int ) -> str:
+        ''' This function returns image file path at given row
+        '''
+
+        baseRowNum = len( self.baseImageIndex )
+
+        if row >= baseRowNum:
+            return self.deltaImageIndex.getImageFilePath( row - baseRowNum )
+
+        return self.baseImageIndex.getImageFilePath( row )
+
+    def getFileSizeMtime( self, row : int ) -> Tuple[Optional[int], Optional[int]]:
+        ''' This function returns file size and modification time at
+            given row
+        '''
+
+        baseRowNum = len( self.baseImageIndex )
+
+        if row >= baseRowNum:
+            return self.deltaImageIndex.getFileSizeMtime( row - baseRowNum )
+
+        return self.baseImageIndex.getFileSizeMtime( row )
+
+    def getImageData( self, row : int ) -> ImageData:
+        ''' This function constructs image data at given row
+        '''
+
+        baseRowNum = len( self.baseImageIndex )
+
+        if row >= baseRowNum:
+            return self.deltaImageIndex.getImageData( row - baseRowNum )
+
+        return self.baseImageIndex.getImageData( row )
+
+    def __iter__( self ):
+        return iter( self.getImageIdArray().tolist() )
+
+    def __len__( self ):
+        return len( self.baseImageIndex ) - len( self.removedRowArray ) + len( self.deltaImageIndex )
+
+    def items( self ):
+        ''' This function iterates image id and image data pairs in
+            image id order
+        '''
+
+        for imageId in self:
+            yield imageId, self[ imageId ]
+
+    def values( self ):
+        ''' This function iterates image data in image id order
+        '''
+
+        for imageId in self:
+            yield self[ imageId ]
@@ -0,0 +1,420 @@
+##########################################################################
+#   IMPORT
+##########################################################################
+
+import os
+import json
+import zlib
+import struct
+import shutil
+import numpy as np
+from typing import List, Tuple, Dict, Optional, Iterable
+
+##########################################################################
+#   GLOBAL
+##########################################################################
+
+IndexFileMagic = b'SISEIDX\0'
+IndexFileVersion = 1
+
+#   Header layout: magic, version, flags, table offset, table length,
+#   table checksum and header checksum of all preceding fields
+HeaderStruct = struct.Struct( '<8sIIQQII' )
+HeaderSize = 64
+
+#   Every section starts at a multiple of this alignment, so that
+#   memory mapped arrays are aligned for any dtype
+SectionAlignment = 64
+
+CopyBlockSize = 1 << 20
+
+BuildDirSuffix = '.build'
+CheckpointFileName = 'checkpoint.json'
+SpoolFileExtension = '.spool'
+
+#   Sections of a string column, holding N+1 end offsets and bytes
+StringOffsetSectionSuffix = 'Offset'
+StringDataSectionSuffix = 'Data'
+
+##########################################################################
+#   HELPER
+##########################################################################
+
+def getAlignedOffset( offset : int ) -> int:
+    ''' This function rounds given offset up to section alignment
+    '''
+
+    return ( offset + SectionAlignment - 1 ) // SectionAlignment * SectionAlignment
+
+def getArrayBytes( array : np.ndarray ):
+    ''' This function returns raw bytes view of given contiguous
+        array
+    '''
+
+    #   Empty array cannot be cast
+    if array.size == 0:
+        return b''
+
+    return memoryview( array ).cast( 'B' )
+
+def packHeader( tableOffset : int, tableLength : int, tableCrc : int ) -> bytes:
+    ''' This function packs index file header with its checksum
+    '''
+
+    headerBytes = HeaderStruct.pack( IndexFileMagic, IndexFileVersion, 0, tableOffset, tableLength, tableCrc, 0 )
+    headerCrc = zlib.crc32( headerBytes[:HeaderStruct.size-4] )
+    headerBytes = HeaderStruct.pack( IndexFileMagic, IndexFileVersion, 0, tableOffset, tableLength, tableCrc, headerCrc )
+
+    return headerBytes.ljust( HeaderSize, b'\0' )
+
+def readHeader( indexFile, indexFilePath : str ) -> Tuple[int, int, int]:
+    ''' This function reads and validates header of given opened
+        index file, and returns its table offset, table length and
+        table checksum
+    '''
+
+    headerBytes = indexFile.read( HeaderSize )
+    if len( headerBytes ) < HeaderStruct.size or not headerBytes.startswith( IndexFileMagic ):
+        raise ValueError( 'readHeader() - {} is not an index file.'.format( indexFilePath ) )
+
+    magic, version, flags, tableOffset, tableLength, tableCrc, headerCrc = HeaderStruct.unpack_from( headerBytes )
+
+    if zlib.crc32( headerBytes[:HeaderStruct.size-4] ) != headerCrc:
+        raise ValueError( 'readHeader() - Corrupted header in index file {}.'.format( indexFilePath ) )
+
+    if version != IndexFileVersion:
+        raise ValueError( 'readHeader() - Unsupported index file version {} in {}.'.format( version, indexFilePath ) )
+
+    return tableOffset, tableLength, tableCrc
+
+def iterateFileBlock( filePath : str ) -> Iterable[bytes]:
+    ''' This function iterates content of given file block by block
+    '''
+
+    with open( filePath, 'rb' ) as inputFile:
+        for block in iter( lambda: inputFile.read( CopyBlockSize ), b'' ):
+            yield block
+
+def writeJsonFile( filePath : str, valueDict : Dict ):
+    ''' This function writes given dictionary as JSON file and
+        flushes it to disk, replacing existing file atomically
+    '''
+
+    temporaryFilePath = filePath + '.tmp'
+
+    with open( temporaryFilePath, 'w' ) as outputFile:
+        json.dump( valueDict, outputFile )
+        outputFile.flush()
+        os.fsync( outputFile.fileno() )
+
+    os.replace( temporaryFilePath, filePath )
+
+##########################################################################
+#   CLASS
+##########################################################################
+
+class IndexFile(object):
+    ''' This class reads and writes versioned index file which
+        stores named numpy arrays as contiguous sections, followed
+        by a JSON section table holding metadata, dtype, shape,
+        offset and checksum of each section
+    '''
+
+    @staticmethod
+    def write( indexFilePath : str, metadataDict : Dict, sectionDict : Dict[str, np.ndarray] ):
+        ''' This function writes metadata and sections to index file,
+            replacing existing file atomically
+        '''
+
+        sectionList = list()
+
+        for sectionName, sectionArray in sectionDict.items():
+            sectionArray = np.ascontiguousarray( sectionArray )
+            sectionList.append( ( sectionName, sectionArray.dtype, sectionArray.shape, [ getArrayBytes( sectionArray ) ] ) )
+
+        IndexFile.writeSectionList( indexFilePath, metadataDict, sectionList )
+
+    @staticmethod
+    def writeSectionList( indexFilePath : str, metadataDict : Dict, sectionList : List[Tuple[str, np.dtype, Tuple[int], Iterable[bytes]]] ):
+        ''' This function writes metadata and sections given as name,
+            dtype, shape and iterable of byte blocks to index file,
+            replacing existing file atomically
+        '''
+
+        temporaryIndexFilePath = indexFilePath + '.tmp'
+
+        sectionTableDict = dict()
+
+        with open( temporaryIndexFilePath, 'wb' ) as indexFile:
+
+            #   Reserve header, it is written once table is known
+            indexFile.write( b'\0'*HeaderSize )
+
+            for sectionName, dtype, shape, blockIterable in sectionList:
+
+                #   Pad to aligned section offset
+                offset = getAlignedOffset( indexFile.tell() )
+                indexFile.write( b'\0'*( offset - indexFile.tell() ) )
+
+                #   Write section block by block
+                sectionCrc = 0
+                for block in blockIterable:
+                    indexFile.write( block )
+                    sectionCrc = zlib.crc32( block, sectionCrc )
+
+                length = indexFile.tell() - offset
+                if length != int( np.prod( shape, dtype=np.int64 ) )*np.dtype( dtype ).itemsize:
+                    raise ValueError( 'writeSectionList() - Section {!r} length does not match its shape.'.format( sectionName ) )
+
+                sectionTableDict[ sectionName ] = {
+                    'dtype' : np.dtype( dtype ).str,
+                    'shape' : [ int( size ) for size in shape ],
+                    'offset' : offset,
+                    'length' : length,
+                    'crc32' : sectionCrc,
+                }
+
+            #   Write section table
+            tableBytes = json.dumps( { 'metadata' : metadataDict, 'sections' : sectionTableDict } ).encode( 'utf-8' )
+            tableOffset = indexFile.tell()
+            indexFile.write( tableBytes )
+
+            #   Write header
+            indexFile.seek( 0 )
+            indexFile.write( packHeader( tableOffset, len( tableBytes ), zlib.crc32( tableBytes ) ) )
+
+        os.replace( temporaryIndexFilePath, indexFilePath )
+
+    @staticmethod
+    def read( indexFilePath : str, isVerified : bool = False ) -> Tuple[Dict, Dict[str, np.ndarray]]:
+        ''' This function reads metadata from index file and memory
+            maps its sections as read only numpy arrays, checksum of
+            every section is only verified if asked since it reads
+            the whole file
+        '''
+
+        with open( indexFilePath, 'rb' ) as indexFile:
+
+            #   Read and validate header
+            tableOffset, tableLength, tableCrc = readHeader( indexFile, indexFilePath )
+
+            #   Read and validate section table
+            indexFile.seek( tableOffset )
+            tableBytes = indexFile.read( tableLength )
+            if len( tableBytes ) != tableLength or zlib.crc32( tableBytes ) != tableCrc:
+                raise ValueError( 'read() - Corrupted section table in index file {}.'.format( indexFilePath ) )
+
+        tableDict = json.loads( tableBytes.decode( 'utf-8' ) )
+
+        #   Memory map whole file once, every section is a view of it
+        fileArray = np.memmap( indexFilePath, dtype=np.uint8, mode='r' )
+
+        sectionDict = dict()
+
+        for sectionName, sectionInfoDict in tableDict[ 'sections' ].items():
+
+            offset = sectionInfoDict[ 'offset' ]
+            sectionArray = fileArray[ offset:offset+sectionInfoDict[ 'length' ] ].view( np.dtype( sectionInfoDict[ 'dtype' ] ) ).reshape( sectionInfoDict[ 'shape' ] )
+
+            if isVerified and zlib.crc32( getArrayBytes( sectionArray ) ) != sectionInfoDict[ 'crc32' ]:
+                raise ValueError( 'read() - Corrupted section {!r} in index file {}.'.format( sectionName, indexFilePath ) )
+
+            sectionDict[ sectionName ] = sectionArray
+
+        return tableDict[ 'metadata' ], sectionDict
+
+    @staticmethod
+    def readVersion( indexFilePath : str ) -> str:
+        ''' This function returns version of index file content, which
+            is checksum and length of its section table, since the
+            table holds metadata and checksum of every section
+        '''
+
+        with open( indexFilePath, 'rb' ) as indexFile:
+            _, tableLength, tableCrc = readHeader( indexFile, indexFilePath )
+
+        return '{:08x}-{}'.format( tableCrc, tableLength )
+
+class IndexFileWriter(object):
+    ''' This class writes index file in a streaming fashion, rows
+        are appended to one spool file per section inside a build
+        directory next to index file, so memory use does not depend
+        on row number
+
+        A checkpoint flushes spools to disk and records their length
+        with caller state, a writer opened again with the same build
+        setting resumes from the last checkpoint, dropping any row
+        appended after it
+    '''
+
+    def __init__(self, indexFilePath : str, sectionSpecDict : Dict[str, Tuple[str, Tuple[int]]],
+                    stringSectionNameList : List[str], buildSettingDict : Dict):
+        ''' Section spec maps section name to dtype string and row
+            shape, string section names are columns of strings stored
+            as offset and data section pair
+        '''
+
+        self.indexFilePath = indexFilePath
+        self.buildDir = indexFilePath + BuildDirSuffix
+        self.sectionSpecDict = dict( sectionSpecDict )
+        self.stringSectionNameList = list( stringSectionNameList )
+        self.buildSettingDict = buildSettingDict
+
+        for stringSectionName in self.stringSectionNameList:
+            self.sectionSpecDict[ stringSectionName + StringOffsetSectionSuffix ] = ( np.dtype( np.uint64 ).str, () )
+            self.sectionSpecDict[ stringSectionName + StringDataSectionSuffix ] = ( np.dtype( np.uint8 ).str, () )
+
+        self.rowNum = 0
+        self.checkpointStateDict = None
+
+        #   Resume from checkpoint written with the same setting,
+        #   otherwise start a new build
+        checkpointDict = self.readCheckpoint()
+
+        if checkpointDict is not None:
+            self.resume( checkpointDict )
+        else:
+            self.start()
+
+    def readCheckpoint( self ) -> Optional[Dict]:
+        ''' This function reads checkpoint of build directory, or
+            returns None if there is none matching current setting
+        '''
+
+        checkpointFilePath = os.path.join( self.buildDir, CheckpointFileName )
+
+        if not os.path.exists( checkpointFilePath ):
+            return None
+
+        try:
+            with open( checkpointFilePath, 'r' ) as checkpointFile:
+                checkpointDict = json.load( checkpointFile )
+        except ValueError:
+            return None
+
+        #   Setting and section spec go through JSON, so compare them
+        #   the same way
+        if checkpointDict.get( 'setting' ) != json.loads( json.dumps( self.buildSettingDict ) ):
+            return None
+        if checkpointDict.get( 'sectionSpec' ) != json.loads( json.dumps( self.sectionSpecDict ) ):
+            return None
+
+        return checkpointDict
+
+    def getSpoolFilePath( self, sectionName : str ) -> str:
+        return os.path.join( self.buildDir, sectionName + SpoolFileExtension )
+
+    def start( self ):
+        ''' This function creates empty build directory and spools
+        '''
+
+        shutil.rmtree( self.buildDir, ignore_errors=True )
+        os.makedirs( self.buildDir )
+
+        self.spoolFileDict = { sectionName : open( self.getSpoolFilePath( sectionName ), 'wb' ) for sectionName in self.sectionSpecDict }
+        self.stringDataLengthDict = { stringSectionName : 0 for stringSectionName in self.stringSectionNameList }
+
+        #   Offsets of string column start with zero
+        for stringSectionName in self.stringSectionNameList:
+            self.spoolFileDict[ stringSectionName + StringOffsetSectionSuffix ].write( getArrayBytes( np.zeros( 1, dtype=np.uint64 ) ) )
+
+    def resume( self, checkpointDict : Dict ):
+        ''' This function truncates spools to their length at given
+            checkpoint and reopens them for appending
+        '''
+
+        self.spoolFileDict = dict()
+
+        for sectionName, spoolLength in checkpointDict[ 'spoolLength' ].items():
+            spoolFile = open( self.getSpoolFilePath( sectionName ), 'r+b' )
+            spoolFile.truncate( spoolLength )
+            spoolFile.seek( spoolLength )
+            self.spoolFileDict[ sectionName ] = spoolFile
+
+        self.stringDataLengthDict = { stringSectionName : checkpointDict[ 'spoolLength' ][ stringSectionName + StringDataSectionSuffix ] for stringSectionName in self.stringSectionNameList }
+        self.rowNum = checkpointDict[ 'rowNum' ]
+        self.checkpointStateDict = checkpointDict[ 'state' ]
+
+    def restart( self ):
+        ''' This function drops rows of checkpoint resumed from, for
+            caller which finds its state no longer valid
+        '''
+
+        for spoolFile in self.spoolFileDict.values():
+            spoolFile.close()
+
+        self.rowNum = 0
+        self.checkpointStateDict = None
+
+        self.start()
+
+    def append( self, sectionArrayDict : Dict[str, np.ndarray], stringListDict : Dict[str, List[Optional[str]]] ):
+        ''' This function appends rows of every section and string
+            column, None is appended as empty string
+        '''
+
+        rowNumSet = { len( sectionArray ) for sectionArray in sectionArrayDict.values() } | { len( stringList ) for stringList in stringListDict.values() }
+        if len( rowNumSet ) != 1:
+            raise ValueError( 'append() - Sections have different row numbers.' )
+
+        for sectionName, sectionArray in sectionArrayDict.items():
+            dtype, rowShape = self.sectionSpecDict[ sectionName ]
+            sectionArray = np.ascontiguousarray( sectionArray, dtype=dtype ).reshape( ( -1, ) + tuple( rowShape ) )
+            self.spoolFileDict[ sectionName ].write( getArrayBytes( sectionArray ) )
+
+        for stringSectionName, stringList in stringListDict.items():
+
+            encodedStringList = [ os.fsencode( string ) if string is not None else b'' for string in stringList ]
+
+            #   Append end offset of every string
+            offsetArray = self.stringDataLengthDict[ stringSectionName ] + np.cumsum( [ len( encodedString ) for encodedString in encodedStringList ], dtype=np.uint64 )
+            self.spoolFileDict[ stringSectionName + StringOffsetSectionSuffix ].write( getArrayBytes( offsetArray.astype( np.uint64 ) ) )
+            self.spoolFileDict[ stringSectionName + StringDataSectionSuffix ].write( b''.join( encodedStringList ) )
+
+            self.stringDataLengthDict[ stringSectionName ] += sum( len( encodedString ) for encodedString in encodedStringList )
+
+        self.rowNum += rowNumSet.pop()
+
+    def checkpoint( self, stateDict : Dict ):
+        ''' This function flushes spools to disk and records their
+            length with given caller state
+        '''
+
+        spoolLengthDict = dict()
+
+        for sectionName, spoolFile in self.spoolFileDict.items():
+            spoolFile.flush()
+            os.fsync( spoolFile.fileno() )
+            spoolLengthDict[ sectionName ] = spoolFile.tell()
+
+        writeJsonFile( os.path.join( self.buildDir, CheckpointFileName ), {
+            'setting' : self.buildSettingDict,
+            'sectionSpec' : self.sectionSpecDict,
+            'spoolLength' : spoolLengthDict,
+            'rowNum' : self.rowNum,
+            'state' : stateDict,
+        } )
+
+        self.checkpointStateDict = stateDict
+
+    def close( self, metadataDict : Dict ):
+        ''' This function concatenates spools into index file and
+            removes build directory
+        '''
+
+        for spoolFile in self.spoolFileDict.values():
+            spoolFile.close()
+
+        sectionList = list()
+
+        for sectionName, ( dtype, rowShape ) in self.sectionSpecDict.items():
+
+            spoolFilePath = self.getSpoolFilePath( sectionName )
+            rowSize = int( np.prod( rowShape, dtype=np.int64 ) )*np.dtype( dtype ).itemsize
+
+            shape = ( os.path.getsize( spoolFilePath ) // rowSize, ) + tuple( rowShape )
+            sectionList.append( ( sectionName, dtype, shape, iterateFileBlock( spoolFilePath ) ) )
+
+        IndexFile.writeSectionList( self.indexFilePath, metadataDict, sectionList )
+
+        shutil.rmtree( self.buildDir, ignore_errors=True )
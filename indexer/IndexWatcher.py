@@ -0,0 +1,237 @@
+##########################################################################
+#   IMPORT
+##########################################################################
+
+import os
+import time
+from typing import Dict, Optional
+from indexer.Indexer import Indexer, DefaultWorkerNum, getDeltaLogFileName
+from indexer.IndexFile import IndexFile
+from indexer.ImageIndex import DeltaImageIndex
+from indexer.DeltaLog import DeltaLog, DeltaLogWriter, DeltaAdd, DeltaUpdate, DeltaDelete
+from indexer.ImageFileWalker import ImageFileWalker
+from indexer.HistogramCache import HistogramCache
+from indexer.IngestPipeline import DefaultIoThreadNum
+from metrics.Metrics import Metrics
+
+##########################################################################
+#   GLOBAL
+##########################################################################
+
+DefaultPollSeconds = 2.0
+
+#   Files modified more recently than this are left to next poll, since
+#   they may still be being written
+SettleSeconds = 1.0
+
+##########################################################################
+#   HELPER
+##########################################################################
+
+##########################################################################
+#   CLASS
+##########################################################################
+
+class IndexWatcher(object):
+    ''' This class keeps index of image directory up to date by polling
+        it, which works on any file system without notification service
+
+        Each poll walks image directory and compares size and
+        modification time of every image file with index, histograms
+        are only computed for created or modified files, then adds,
+        updates and deletes are appended to delta log of index file in
+        one write, see DeltaLog. Index read from then on includes them,
+        and compactIndex() folds them into index file
+
+        Image which cannot be read is reported once and tried again once
+        its file changes. If index file is written again, by a build or
+        compaction, it is read again and changes not in it are found by
+        next poll
+    '''
+
+    def __init__( self, imageDir : str, indexDir : str, indexFileName : str, workerNum : int = DefaultWorkerNum,
+                    ioThreadNum : int = DefaultIoThreadNum, isHashed : bool = False, imageFileWalker : Optional[ImageFileWalker] = None,
+                    histogramCache : Optional[HistogramCache] = None, pollSeconds : float = DefaultPollSeconds ):
+
+        if not pollSeconds > 0:
+            raise ValueError( 'IndexWatcher() - Invalid poll seconds {}.'.format( pollSeconds ) )
+
+        self.imageDir = imageDir
+        self.indexDir = indexDir
+        self.indexFileName = indexFileName
+        self.workerNum = workerNum
+        self.ioThreadNum = ioThreadNum
+        self.isHashed = isHashed
+        self.imageFileWalker = imageFileWalker if imageFileWalker is not None else ImageFileWalker()
+        self.histogramCache = histogramCache
+        self.pollSeconds = pollSeconds
+
+        self.baseVersion = None
+        self.maxDecodeSize = None
+        self.deltaLogWriter = None
+
+        #   Image file path to image id, file size and modification
+        #   time of index
+        self.imageFilePathToEntryDict = dict()
+
+        #   Image file path to file size and modification time at which
+        #   it could not be read
+        self.failedImageFilePathToManifestDict = dict()
+
+        self.nextImageId = 0
+
+    def load( self ):
+        ''' This function reads index with its delta log, and continues
+            delta log of index file
+        '''
+
+        imageIndex = Indexer.readIndex( self.indexDir, self.indexFileName )
+
+        self.baseVersion = DeltaLog.getBaseVersion( imageIndex.version )
+        self.maxDecodeSize = imageIndex.getMaxDecodeSize()
+
+        #   Images of delta log replace their rows of index file
+        partList = [ ( imageIndex, set() ) ]
+        if isinstance( imageIndex, DeltaImageIndex ):
+            partList = [ ( imageIndex.baseImageIndex, set( imageIndex.removedRowArray.tolist() ) ), ( imageIndex.deltaImageIndex, set() ) ]
+
+        self.imageFilePathToEntryDict = dict()
+
+        for partImageIndex, removedRowSet in partList:
+
+            fileSizeList = partImageIndex.sectionDict[ 'fileSize' ].tolist()
+            fileMtimeList = partImageIndex.sectionDict[ 'fileMtime' ].tolist()
+
+            self.imageFilePathToEntryDict.update( { partImageIndex.getImageFilePath( row ) : ( imageId, fileSizeList[ row ], fileMtimeList[ row ] )
+                                                    for row, imageId in enumerate( partImageIndex.imageIdArray.tolist() ) if row not in removedRowSet } )
+
+        self.failedImageFilePathToManifestDict = dict()
+
+        #   New images continue after the largest image id, as a build
+        #   numbers them
+        self.nextImageId = int( imageIndex.getImageIdArray().max() ) + 1 if len( imageIndex ) > 0 else 0
+
+        if self.deltaLogWriter is not None:
+            self.deltaLogWriter.close()
+
+        self.deltaLogWriter = DeltaLogWriter( os.path.join( self.indexDir, getDeltaLogFileName( self.indexFileName ) ), self.baseVersion )
+
+    def poll( self ) -> Dict[str, int]:
+        ''' This function records changes of image files since last poll
+            in delta log, and returns numbers of images added, updated,
+            deleted, skipped and left to next poll
+        '''
+
+        #   Index file written again by another build
+        if IndexFile.readVersion( os.path.join( self.indexDir, self.indexFileName ) ) != self.baseVersion:
+            print( 'watch() - Index file was written again, read it again.' )
+            self.load()
+
+        startTime = time.perf_counter()
+        reportDict = { 'add' : 0, 'update' : 0, 'delete' : 0, 'skip' : 0, 'pending' : 0 }
+
+        changedImageFilePathList = list()
+        changedFileManifestList = list()
+        imageFilePathSet = set()
+
+        with Metrics.time( 'watcher.walk' ):
+
+            currentTime = time.time()
+
+            for imageFilePath in self.imageFileWalker.iterate( self.imageDir ):
+
+                try:
+                    fileStat = os.stat( imageFilePath )
+                except OSError:
+                    continue
+
+                imageFilePathSet.add( imageFilePath )
+                fileManifest = ( fileStat.st_size, fileStat.st_mtime_ns )
+
+                entry = self.imageFilePathToEntryDict.get( imageFilePath )
+                if entry is not None and entry[1:] == fileManifest:
+                    continue
+
+                if self.failedImageFilePathToManifestDict.get( imageFilePath ) == fileManifest:
+                    continue
+
+                if currentTime - fileStat.st_mtime < SettleSeconds:
+                    reportDict[ 'pending' ] += 1
+                    continue
+
+                changedImageFilePathList.append( imageFilePath )
+                changedFileManifestList.append( fileManifest )
+
+        recordList = list()
+
+        #   Compute histograms of created or modified images only, they
+        #   come in the same order as their paths
+        imageDataIterable = list()
+        if len( changedImageFilePathList ) > 0:
+            imageDataIterable = Indexer.iterateIndex( changedImageFilePathList, self.workerNum, self.ioThreadNum, isHashed=self.isHashed,
+                                                        maxDecodeSize=self.maxDecodeSize, histogramCache=self.histogramCache )
+
+        for imageData, imageFilePath, fileManifest in zip( imageDataIterable, changedImageFilePathList, changedFileManifestList ):
+
+            #   Image which cannot be read keeps its previous image data
+            #   until its file changes again
+            if imageData is None:
+                self.failedImageFilePathToManifestDict[ imageFilePath ] = fileManifest
+                reportDict[ 'skip' ] += 1
+                continue
+
+            self.failedImageFilePathToManifestDict.pop( imageFilePath, None )
+
+            entry = self.imageFilePathToEntryDict.get( imageFilePath )
+
+            if entry is not None:
+                imageData.imageId = entry[0]
+                recordList.append( ( DeltaUpdate, imageData.imageId, imageData ) )
+                reportDict[ 'update' ] += 1
+            else:
+                imageData.imageId = self.nextImageId
+                self.nextImageId += 1
+                recordList.append( ( DeltaAdd, imageData.imageId, imageData ) )
+                reportDict[ 'add' ] += 1
+
+            self.imageFilePathToEntryDict[ imageFilePath ] = ( imageData.imageId, imageData.fileSize, imageData.fileMtime )
+
+        for imageFilePath in [ imageFilePath for imageFilePath in self.imageFilePathToEntryDict.keys() if imageFilePath not in imageFilePathSet ]:
+            recordList.append( ( DeltaDelete, self.imageFilePathToEntryDict.pop( imageFilePath )[0], None ) )
+            self.failedImageFilePathToManifestDict.pop( imageFilePath, None )
+            reportDict[ 'delete' ] += 1
+
+        self.deltaLogWriter.append( recordList )
+
+        for reportKey in ( 'add', 'update', 'delete', 'skip' ):
+            Metrics.count( 'watcher.{}ImageNum'.format( reportKey ), reportDict[ reportKey ] )
+
+        if len( recordList ) > 0 or reportDict[ 'skip' ] > 0:
+            print( 'watch() - Add {} images, update {} images, delete {} images, skip {} images in {:.2f} seconds.'.format(
+                reportDict[ 'add' ], reportDict[ 'update' ], reportDict[ 'delete' ], reportDict[ 'skip' ], time.perf_counter() - startTime ) )
+
+        return reportDict
+
+    def run( self ):
+        ''' This function polls image directory until interrupted
+        '''
+
+        self.load()
+
+        print( 'watch() - Watch {} every {} seconds, press Ctrl+C to stop.'.format( self.imageDir, self.pollSeconds ) )
+
+        try:
+            while True:
+                with Metrics.time( 'watcher.poll' ):
+                    self.poll()
+                time.sleep( self.pollSeconds )
+        finally:
+            self.close()
+
+    def close( self ):
+        ''' This function closes delta log
+        '''
+
+        if self.deltaLogWriter is not None:
+            self.deltaLogWriter.close()
+            self.deltaLogWriter = None
@@ -3,65 +3,703 @@
 ##########################################################################
 
 import os
+import json
 import pickle
-from typing import Tuple, Dict
+import hashlib
+import functools
+import itertools
+import numpy as np
+from typing import List, Tuple, Dict, Optional, Iterable
 from imageprocessor.ImageProcessor import ImageProcessor
+from indexer.ImageData import ImageData
+from indexer.ImageIndex import ImageIndex, DeltaImageIndex, HistogramDtype, StringSectionNameList, DefaultHistogramLayout, getSectionSpecDict, getHistogramScale
+from indexer.IndexFile import IndexFile, IndexFileWriter, writeJsonFile
+from indexer.AnnIndex import AnnIndex, DefaultIterationNum, DefaultSampleNum
+from indexer.ImageFileWalker import ImageFileWalker
+from indexer.HistogramCache import HistogramCache, getReaderHistogramCache
+from indexer.IngestPipeline import IngestPipeline, DefaultWorkerNum, DefaultIoThreadNum
+from indexer.DeltaLog import DeltaLog
+from indexer.ThumbnailPack import ThumbnailPack, ThumbnailPackWriter
+from metrics.Metrics import Metrics
 
 ##########################################################################
 #   GLOBAL
 ##########################################################################
 
+#   Number of images written to index file between checkpoints
+DefaultBatchSize = 1024
+
+FileHashBlockSize = 1 << 20
+
 ##########################################################################
 #   HELPER
 ##########################################################################
 
+def getFileManifest( imageFilePath : str, isHashed : bool = False ) -> Optional[Tuple[int, int, Optional[str]]]:
+    ''' This function returns file size, modification time in
+        nanoseconds and optionally content hash of given file,
+        or None if the file cannot be read
+    '''
+
+    try:
+        fileStat = os.stat( imageFilePath )
+
+        fileHash = None
+        if isHashed:
+            with Metrics.time( 'indexer.fileHash' ):
+                hashObject = hashlib.sha256()
+                with open( imageFilePath, 'rb' ) as imageFile:
+                    for block in iter( lambda: imageFile.read( FileHashBlockSize ), b'' ):
+                        hashObject.update( block )
+                fileHash = hashObject.hexdigest()
+            Metrics.count( 'indexer.hashByteNum', fileStat.st_size )
+
+    except OSError:
+        return None
+
+    return fileStat.st_size, fileStat.st_mtime_ns, fileHash
+
+def isFileUnchanged( previousFileManifest : Optional[Tuple[int, int, Optional[str]]], fileManifest : Optional[Tuple[int, int, Optional[str]]] ) -> bool:
+    ''' This function checks whether previous file manifest still
+        matches given one, by content hash when both have one,
+        otherwise by size and modification time
+    '''
+
+    if previousFileManifest is None or fileManifest is None:
+        return False
+
+    previousFileSize, previousFileMtime, previousFileHash = previousFileManifest
+    fileSize, fileMtime, fileHash = fileManifest
+
+    #   Index written before manifest existed has no file size
+    if previousFileSize is None or previousFileSize != fileSize:
+        return False
+
+    if fileHash is not None and previousFileHash is not None:
+        return fileHash == previousFileHash
+
+    return previousFileMtime == fileMtime
+
+def readImageFile( task : Tuple[int, str, Optional[Tuple]], isHashed : bool = False, maxDecodeSize : Optional[int] = None,
+                    histogramCacheFilePath : Optional[str] = None, isThumbnailed : bool = False ) -> Tuple[Tuple, Optional[bytes]]:
+    ''' This function is read stage of image given by task of image
+        id, file path and previous manifest, see IngestPipeline, and
+        returns image id, file path, file manifest, histogram, cached
+        flag and error message tuple, with file bytes to decode unless
+        histogram is known
+
+        File is not read if it is unchanged since previous manifest by
+        size and modification time, histogram is then None since
+        previous one can be reused. If histogram cache file is given,
+        file content is hashed and histogram of the same content is
+        read from cache instead of decoding the image, unless image is
+        thumbnailed since cache holds no thumbnail
+
+        Error message is returned instead of raising, so that one bad
+        image cannot abort a whole index build
+    '''
+
+    imageId, imageFilePath, previousFileManifest = task
+
+    try:
+        with open( imageFilePath, 'rb' ) as imageFile:
+
+            fileStat = os.fstat( imageFile.fileno() )
+            fileManifest = ( fileStat.st_size, fileStat.st_mtime_ns, None )
+
+            if not isHashed and isFileUnchanged( previousFileManifest, fileManifest ):
+                return ( imageId, imageFilePath, fileManifest, None, False, None ), None
+
+            with Metrics.time( 'indexer.readFile' ):
+                imageBytes = imageFile.read()
+
+    except OSError as e:
+        return ( imageId, imageFilePath, None, None, False, '{}: {}'.format( type(e).__name__, e ) ), None
+
+    Metrics.count( 'indexer.readByteNum', len( imageBytes ) )
+
+    if isHashed or histogramCacheFilePath is not None:
+
+        with Metrics.time( 'indexer.fileHash' ):
+            fileManifest = ( fileStat.st_size, fileStat.st_mtime_ns, hashlib.sha256( imageBytes ).hexdigest() )
+        Metrics.count( 'indexer.hashByteNum', len( imageBytes ) )
+
+        if isHashed and isFileUnchanged( previousFileManifest, fileManifest ):
+            return ( imageId, imageFilePath, fileManifest, None, False, None ), None
+
+    if histogramCacheFilePath is not None and not isThumbnailed:
+        histogram = getReaderHistogramCache( histogramCacheFilePath ).get( fileManifest[2], maxDecodeSize )
+        if histogram is not None:
+            return ( imageId, imageFilePath, fileManifest, histogram, True, None ), None
+
+    return ( imageId, imageFilePath, fileManifest, None, False, None ), imageBytes
+
+def decodeImageBytes( imageBytes : bytes, maxDecodeSize : Optional[int] = None,
+                        thumbnailSize : Optional[int] = None ) -> Tuple[Optional[Tuple[float]], Optional[bytes], Optional[str]]:
+    ''' This function is decode stage of image file read by
+        readImageFile(), and returns color histogram, thumbnail bytes
+        and error message tuple, thumbnail is only made if thumbnail
+        size is given
+    '''
+
+    try:
+        if thumbnailSize is not None:
+            return ImageProcessor.getBytesColorHistogramThumbnail( imageBytes, maxDecodeSize, thumbnailSize ) + ( None, )
+        return ImageProcessor.getBytesColorHistogram( imageBytes, maxDecodeSize ), None, None
+    except Exception as e:
+        return None, None, '{}: {}'.format( type(e).__name__, e )
+
+def getShardFileName( indexFileName : str, shard : int, shardNum : int ) -> str:
+    ''' This function returns file name of given shard of index file
+        split into given number of shards
+    '''
+
+    indexFileRoot, indexFileExtension = os.path.splitext( indexFileName )
+
+    return '{}.shard-{:03d}-of-{:03d}{}'.format( indexFileRoot, shard, shardNum, indexFileExtension )
+
+def getShardManifestFileName( indexFileName : str ) -> str:
+    ''' This function returns file name of shard manifest of index
+        file, which lists its shards
+    '''
+
+    return os.path.splitext( indexFileName )[0] + '.shards.json'
+
+def getDeltaLogFileName( indexFileName : str ) -> str:
+    ''' This function returns file name of delta log of index file,
+        which records changes of image files since it was written
+    '''
+
+    return os.path.splitext( indexFileName )[0] + '.delta.log'
+
+def getThumbnailPackFileName( indexFileName : str ) -> str:
+    ''' This function returns file name of thumbnail pack of index
+        file, which holds thumbnails of its images
+    '''
+
+    return os.path.splitext( indexFileName )[0] + '.thumbnails.bin'
+
+def isIndexFileEqual( imageIndex : ImageIndex, indexFilePath : str ) -> bool:
+    ''' This function checks whether index file holds exactly the
+        metadata and sections of given index, so that rewriting it
+        can be skipped
+    '''
+
+    try:
+        metadataDict, sectionDict = IndexFile.read( indexFilePath )
+    except ( OSError, ValueError ):
+        return False
+
+    #   Compare metadata as it is stored
+    if metadataDict != json.loads( json.dumps( imageIndex.metadataDict ) ) or sectionDict.keys() != imageIndex.sectionDict.keys():
+        return False
+
+    return all( sectionArray.dtype == sectionDict[ sectionName ].dtype and np.array_equal( sectionArray, sectionDict[ sectionName ] )
+                for sectionName, sectionArray in imageIndex.sectionDict.items() )
+
+def getPreviousFileManifest( imageData : ImageData ) -> Tuple[Optional[int], Optional[int], Optional[str]]:
+    ''' This function returns file manifest of indexed image data,
+        index written before manifest existed has no such attributes
+    '''
+
+    return getattr( imageData, 'fileSize', None ), getattr( imageData, 'fileMtime', None ), getattr( imageData, 'fileHash', None )
+
+def iterateTask( imageFilePathIterable : Iterable[str], previousImageIdToImageDataDict : Dict, isReusable : bool,
+                    thumbnailPack : Optional[ThumbnailPack] = None ):
+    ''' This function yields image id, file path and previous manifest
+        task of each image to index, previous manifest is None if
+        previous histogram cannot be reused, or if thumbnail pack is
+        given and has no thumbnail of the same previous image file
+
+        Previous images which still exist keep their image id, then new
+        images continue after the largest one. Without previous images,
+        given paths are not listed ahead, so tasks start as soon as
+        first path is found
+    '''
+
+    if len( previousImageIdToImageDataDict ) == 0:
+        yield from ( ( imageId, imageFilePath, None ) for imageId, imageFilePath in enumerate( imageFilePathIterable ) )
+        return
+
+    imageFilePathList = list( imageFilePathIterable )
+    imageFilePathSet = set( imageFilePathList )
+    previousImageIdList = sorted( previousImageIdToImageDataDict.keys() )
+    previousImageFilePathSet = set()
+
+    for imageId in previousImageIdList:
+        previousImageData = previousImageIdToImageDataDict[ imageId ]
+        previousImageFilePathSet.add( previousImageData.imageFilePath )
+        if previousImageData.imageFilePath in imageFilePathSet:
+            previousFileManifest = getPreviousFileManifest( previousImageData ) if isReusable else None
+
+            #   Image without thumbnail is decoded again to make one
+            if previousFileManifest is not None and thumbnailPack is not None and not thumbnailPack.hasThumbnail( imageId, *previousFileManifest[:2] ):
+                previousFileManifest = None
+
+            yield imageId, previousImageData.imageFilePath, previousFileManifest
+
+    nextImageId = previousImageIdList[-1] + 1
+
+    for imageFilePath in imageFilePathList:
+        if imageFilePath not in previousImageFilePathSet:
+            yield nextImageId, imageFilePath, None
+            nextImageId += 1
+
+def getTaskHash( taskHash : str, imageFilePath : str ) -> str:
+    ''' This function chains given task hash with image file path of
+        next task, so that hash of first tasks identifies them without
+        keeping their paths
+    '''
+
+    return hashlib.sha256( ( taskHash + '\0' + imageFilePath ).encode( 'utf-8', 'surrogateescape' ) ).hexdigest()
+
 ##########################################################################
 #   CLASS
 ##########################################################################
 
-class ImageData(object):
+class Indexer(object):
 
-    def __init__(self, imageId : int, imageFilePath : str, histogram : Tuple[float] ):
-        self.imageId = imageId
-        self.imageFilePath = imageFilePath
-        self.histogram = histogram
+    @staticmethod
+    def listImageFile( imageDir : str, imageFileWalker : Optional[ImageFileWalker] = None ) -> List[str]:
+        ''' This function lists image file paths inside given image
+            directory tree, in directory listing order, see
+            ImageFileWalker
+        '''
 
-    def __str__(self):
-        return 'ImageData( imageId={}, imageFilePath={} )'.format( self.imageId, self.imageFilePath )
+        if imageFileWalker is None:
+            imageFileWalker = ImageFileWalker()
 
-class Indexer(object):
+        return list( imageFileWalker.iterate( imageDir ) )
 
     @staticmethod
-    def index( imageDir : str ):
+    def iterateIndex( imageFilePathIterable : Iterable[str], workerNum : int = DefaultWorkerNum, ioThreadNum : int = DefaultIoThreadNum,
+                        previousImageIdToImageDataDict : Optional[Dict] = None, isHashed : bool = False,
+                        maxDecodeSize : Optional[int] = None, startTaskNum : int = 0, reportDict : Optional[Dict] = None,
+                        histogramDtype : str = np.dtype( HistogramDtype ).name, histogramScale : Optional[float] = None,
+                        histogramCache : Optional[HistogramCache] = None, thumbnailSize : Optional[int] = None,
+                        previousThumbnailPack : Optional[ThumbnailPack] = None ):
+        ''' This function computes image data of given image files in
+            ascending image id order, reading files with a pool of
+            threads and decoding them with a pool of worker processes
+            if worker number is more than one, see IngestPipeline, and
+            yields one image data per image or None for image which
+            fails, then prints how busy each stage was
+
+            If previous index is given, only new or modified images
+            are processed, unchanged images keep their image data
+            and image id, and deleted images are dropped
+
+            Images are processed in a deterministic order, so the
+            first images up to start task number can be skipped to
+            resume a build, and counts of reused, computed, skipped
+            and dropped images are added to report if given, along
+            with task hash chained over paths of processed images
+            from the one in report, see getTaskHash()
+
+            Without previous index, image file paths are consumed as
+            they come, see iterateTask()
+
+            If histogram cache is given, new or modified images whose
+            content is cached are not decoded, and computed histograms
+            are added to it, see HistogramCache
+
+            Histogram dtype and scale are those the index will be
+            stored with, previous histograms are only reused if they
+            were stored as float or quantized the same way
+
+            If thumbnail size is given, image data also holds thumbnail
+            made while decoding, see ImageProcessor.getThumbnailBytes(),
+            unchanged images keep their thumbnail of previous thumbnail
+            pack and are decoded again if it has none. Histogram cache
+            is then not read, since it holds no thumbnail
+        '''
+
+        if workerNum < 1:
+            raise ValueError( 'iterateIndex() - Invalid worker number {}.'.format( workerNum ) )
+
+        if thumbnailSize is not None and thumbnailSize < 1:
+            raise ValueError( 'iterateIndex() - Invalid thumbnail size {}.'.format( thumbnailSize ) )
+
+        #   Previous thumbnails of another size are made again
+        if thumbnailSize is None or ( previousThumbnailPack is not None and previousThumbnailPack.thumbnailSize != thumbnailSize ):
+            previousThumbnailPack = None
+
+        if maxDecodeSize is not None and maxDecodeSize < 1:
+            raise ValueError( 'iterateIndex() - Invalid maximum decode size {}.'.format( maxDecodeSize ) )
+
+        histogramScale = getHistogramScale( histogramDtype, histogramScale )
+
+        if previousImageIdToImageDataDict is None:
+            previousImageIdToImageDataDict = dict()
+
+        if reportDict is None:
+            reportDict = dict()
+
+        for reportKey in ( 'reuse', 'cache', 'compute', 'skip', 'drop' ):
+            reportDict.setdefault( reportKey, 0 )
+
+        reportDict.setdefault( 'taskHash', '' )
+
+        #   Histograms computed with other maximum decode size cannot
+        #   be reused, nor can histograms quantized another way since
+        #   rounding them again would add up error, though image ids
+        #   are still kept
+        previousHistogramSetting = Indexer.getHistogramSetting( previousImageIdToImageDataDict )
+        isReusable = ( Indexer.getMaxDecodeSize( previousImageIdToImageDataDict ) == maxDecodeSize and
+                        ( previousHistogramSetting[1] is None or previousHistogramSetting == ( histogramDtype, histogramScale ) ) and
+                        ( thumbnailSize is None or previousThumbnailPack is not None ) )
+
+        #   Previous images which no longer exist are dropped
+        if len( previousImageIdToImageDataDict ) > 0:
+            imageFilePathList = list( imageFilePathIterable )
+            imageFilePathIterable = imageFilePathList
+            previousImageFilePathSet = { imageData.imageFilePath for imageData in previousImageIdToImageDataDict.values() }
+            reportDict[ 'drop' ] += len( previousImageFilePathSet.difference( imageFilePathList ) )
+
+        taskIterator = itertools.islice( iterateTask( imageFilePathIterable, previousImageIdToImageDataDict, isReusable, previousThumbnailPack ), startTaskNum, None )
+        histogramCacheFilePath = histogramCache.histogramCacheFilePath if histogramCache is not None else None
+        readFunc = functools.partial( readImageFile, isHashed=isHashed, maxDecodeSize=maxDecodeSize, histogramCacheFilePath=histogramCacheFilePath,
+                                        isThumbnailed=thumbnailSize is not None )
+        decodeFunc = functools.partial( decodeImageBytes, maxDecodeSize=maxDecodeSize, thumbnailSize=thumbnailSize )
+
+        ingestPipeline = IngestPipeline( readFunc, decodeFunc, workerNum, ioThreadNum )
+
+        try:
+
+            #   Pipeline keeps results in the same order as its input
+            #   whichever worker finishes first, hence image id order
+            #   is deterministic
+            for ( imageId, imageFilePath, fileManifest, histogram, isCached, errorMessage ), decodeResult in ingestPipeline.iterate( taskIterator ):
+
+                thumbnail = None
+                if decodeResult is not None:
+                    histogram, thumbnail, errorMessage = decodeResult
+
+                reportDict[ 'taskHash' ] = getTaskHash( reportDict[ 'taskHash' ], imageFilePath )
+
+                #   Report and skip failed image
+                if errorMessage is not None:
+                    print( 'index() - Skip image at {}, {}'.format( imageFilePath, errorMessage ) )
+                    reportDict[ 'skip' ] += 1
+                    Metrics.count( 'indexer.skipImageNum' )
+                    yield None
+                    continue
+
+                #   Reuse histogram of unchanged image
+                if histogram is None:
+                    previousImageData = previousImageIdToImageDataDict[ imageId ]
+                    histogram = previousImageData.histogram
+                    if previousThumbnailPack is not None:
+                        thumbnail = previousThumbnailPack.getThumbnail( imageId, *getPreviousFileManifest( previousImageData )[:2] )
+                    reportDict[ 'reuse' ] += 1
+                    Metrics.count( 'indexer.reuseImageNum' )
+                elif isCached:
+                    histogramCache.touch( fileManifest[2], maxDecodeSize )
+                    reportDict[ 'cache' ] += 1
+                    Metrics.count( 'indexer.cacheImageNum' )
+                else:
+                    if histogramCache is not None and fileManifest is not None and fileManifest[2] is not None:
+                        histogramCache.put( fileManifest[2], maxDecodeSize, histogram )
+                    reportDict[ 'compute' ] += 1
+                    Metrics.count( 'indexer.computeImageNum' )
+
+                #   Image readable by PIL but not by stat has no manifest,
+                #   it is then always recomputed on next index
+                if fileManifest is None:
+                    fileManifest = ( None, None, None )
+
+                yield ImageData( imageId, imageFilePath, histogram, *fileManifest, thumbnail=thumbnail )
+
+            ingestPipeline.printReport()
+
+        finally:
+
+            #   Stop workers right away if build is interrupted
+            ingestPipeline.close()
+
+    @staticmethod
+    def iterateHistogram( imageFilePathList : List[str], workerNum : int = DefaultWorkerNum, ioThreadNum : int = DefaultIoThreadNum,
+                            maxDecodeSize : Optional[int] = None ):
+        ''' This function computes color histograms of given image files
+            in the same order, reading files with a pool of threads and
+            decoding them with a pool of worker processes if worker
+            number is more than one, see IngestPipeline, and yields
+            image file path, color histogram and error message tuple per
+            image, histogram is None for image which fails
+        '''
+
+        if workerNum < 1:
+            raise ValueError( 'iterateHistogram() - Invalid worker number {}.'.format( workerNum ) )
+
+        taskIterator = ( ( taskNum, imageFilePath, None ) for taskNum, imageFilePath in enumerate( imageFilePathList ) )
+
+        ingestPipeline = IngestPipeline( readImageFile, functools.partial( decodeImageBytes, maxDecodeSize=maxDecodeSize ), workerNum, ioThreadNum )
+
+        try:
+
+            for ( _, imageFilePath, _, histogram, _, errorMessage ), decodeResult in ingestPipeline.iterate( taskIterator ):
+
+                if decodeResult is not None:
+                    histogram, _, errorMessage = decodeResult
+
+                yield imageFilePath, histogram, errorMessage
+
+        finally:
+            ingestPipeline.close()
+
+    @staticmethod
+    def index( imageDir : str, workerNum : int = DefaultWorkerNum, ioThreadNum : int = DefaultIoThreadNum,
+                previousImageIdToImageDataDict : Optional[Dict] = None, isHashed : bool = False,
+                maxDecodeSize : Optional[int] = None, histogramDtype : str = np.dtype( HistogramDtype ).name,
+                histogramScale : Optional[float] = None, imageFileWalker : Optional[ImageFileWalker] = None,
+                histogramCache : Optional[HistogramCache] = None ) -> ImageIndex:
         ''' This function indexes images inside given image directory
-            by color histrogram value
+            tree by color histrogram value in memory, see iterateIndex()
+            and ImageFileWalker
+
+            If maximum decode size is given, images are decoded at
+            reduced resolution, the setting is recorded in returned
+            index metadata so that queries use the same one
+
+            If histogram dtype is unsigned integer, histograms are
+            quantized with given scale, by default its largest value
         '''
 
-        #   Check if image directory exists
-        if not os.path.exists( imageDir ):
-            raise ValueError( 'index() - Cannot find image directory at {}.'.format( imageDir ) )
+        histogramScale = getHistogramScale( histogramDtype, histogramScale )
+
+        if imageFileWalker is None:
+            imageFileWalker = ImageFileWalker()
 
-        #   Get image file name list from given directory
-        imageFileNameList = os.listdir( imageDir )
+        reportDict = dict()
 
         #   Initialize image id to image data dictionary
         imageIdToImageDataDict = dict()
 
-        for imageId, imageFileName in enumerate( imageFileNameList ):
+        for imageData in Indexer.iterateIndex( imageFileWalker.iterate( imageDir ), workerNum, ioThreadNum, previousImageIdToImageDataDict, isHashed, maxDecodeSize,
+                                                reportDict=reportDict, histogramDtype=histogramDtype, histogramScale=histogramScale, histogramCache=histogramCache ):
+            if imageData is not None:
+                imageIdToImageDataDict[ imageData.imageId ] = imageData
+
+        if ( previousImageIdToImageDataDict is not None and len( previousImageIdToImageDataDict ) > 0 ) or histogramCache is not None:
+            Indexer.printReport( reportDict )
+
+        return ImageIndex.fromImageDataDict( imageIdToImageDataDict, { 'maxDecodeSize' : maxDecodeSize }, histogramDtype, histogramScale )
+
+    @staticmethod
+    def indexToFile( imageDir : str, indexDir : str, indexFileName : str,
+                        workerNum : int = DefaultWorkerNum, ioThreadNum : int = DefaultIoThreadNum,
+                        isIncremental : bool = True, isHashed : bool = False,
+                        maxDecodeSize : Optional[int] = None, batchSize : int = DefaultBatchSize,
+                        histogramDtype : str = np.dtype( HistogramDtype ).name, histogramScale : Optional[float] = None,
+                        imageFileWalker : Optional[ImageFileWalker] = None, histogramCache : Optional[HistogramCache] = None,
+                        histogramLayout : str = DefaultHistogramLayout, thumbnailSize : Optional[int] = None ):
+        ''' This function indexes images inside given image directory
+            tree by color histrogram value straight into index file, see
+            iterateIndex() and ImageFileWalker
+
+            Image data is written in batches with a checkpoint after
+            each batch, so memory use does not depend on image number
+            and an interrupted build resumes from its last checkpoint
+            when run again with the same settings
+
+            If incremental, existing index file is used as previous
+            index, and histograms are quantized as in index()
+
+            Checkpoint records task hash of images written so far, a
+            build only resumes if walking image directory again gives
+            the same first images
+
+            Histograms are written dense, then index file is written
+            again with sparse histograms if given layout asks for it,
+            see ImageIndex.convertHistogramLayout()
+
+            If thumbnail size is given, thumbnails made while decoding
+            are written to thumbnail pack file next to index file, with
+            the same checkpoints, see ThumbnailPack. Otherwise existing
+            thumbnail pack is left as it is, thumbnails of images since
+            modified are not shown
+        '''
+
+        if batchSize < 1:
+            raise ValueError( 'indexToFile() - Invalid batch size {}.'.format( batchSize ) )
+
+        histogramScale = getHistogramScale( histogramDtype, histogramScale )
+
+        #   Construct index file path
+        indexFilePath = os.path.join( indexDir, indexFileName )
+
+        if imageFileWalker is None:
+            imageFileWalker = ImageFileWalker()
+
+        #   Read previous index
+        previousImageIndex = None
+        if isIncremental and os.path.exists( indexFilePath ):
+            previousImageIndex = Indexer.readIndex( indexDir, indexFileName )
+
+        #   Checkpoint is only valid for the same image files, settings
+        #   and previous index
+        buildSettingDict = {
+            'imageDir' : os.path.abspath( imageDir ),
+            'walkSetting' : imageFileWalker.getSettingDict(),
+            'isHashed' : isHashed,
+            'maxDecodeSize' : maxDecodeSize,
+            'histogramDtype' : histogramDtype,
+            'histogramScale' : histogramScale,
+            'previousIndexManifest' : getFileManifest( indexFilePath ) if previousImageIndex is not None else None,
+            'previousIndexVersion' : previousImageIndex.version if previousImageIndex is not None else None,
+        }
+
+        indexFileWriter = IndexFileWriter( indexFilePath, getSectionSpecDict( histogramDtype ), StringSectionNameList, buildSettingDict )
+
+        thumbnailPackWriter = None
+        previousThumbnailPack = None
+
+        if thumbnailSize is not None:
+            #   Thumbnails of corrupted pack are made again
+            if previousImageIndex is not None:
+                try:
+                    previousThumbnailPack = Indexer.readThumbnailPack( indexDir, indexFileName )
+                except ValueError as e:
+                    print( 'indexToFile() - Cannot read thumbnail pack, {}'.format( e ) )
+
+            thumbnailPackWriter = ThumbnailPackWriter( os.path.join( indexDir, getThumbnailPackFileName( indexFileName ) ), thumbnailSize, buildSettingDict )
+
+        #   Index file and thumbnail pack resume from the same checkpoint
+        #   only, build interrupted between their checkpoints restarts
+        if thumbnailPackWriter is not None and thumbnailPackWriter.checkpointStateDict != indexFileWriter.checkpointStateDict:
+            if indexFileWriter.checkpointStateDict is not None:
+                print( 'indexToFile() - Thumbnail pack does not match checkpoint, restart build.' )
+            indexFileWriter.restart()
+            thumbnailPackWriter.restart()
 
-            #   Construct image file path
-            imageFilePath = os.path.join( imageDir, imageFileName )
+        #   Resume after images written before last checkpoint, if
+        #   image directory still starts with the same images
+        taskNum = 0
+        reportDict = dict()
 
-            #   Compute color histogram
-            histogram = ImageProcessor.getColorHistogram( imageFilePath )
+        if indexFileWriter.checkpointStateDict is not None:
+            taskNum = indexFileWriter.checkpointStateDict[ 'taskNum' ]
+            taskHash = indexFileWriter.checkpointStateDict.get( 'taskHash' )
 
-            #   Construct image data
-            imageData = ImageData( imageId, imageFilePath, histogram )
+            if Indexer.getCheckpointTaskHash( imageFileWalker.iterate( imageDir ), previousImageIndex, taskNum ) == taskHash:
+                print( 'indexToFile() - Resume after {} images from checkpoint.'.format( taskNum ) )
+                reportDict[ 'taskHash' ] = taskHash
+            else:
+                print( 'indexToFile() - Image files changed since checkpoint, restart build.' )
+                indexFileWriter.restart()
+                if thumbnailPackWriter is not None:
+                    thumbnailPackWriter.restart()
+                taskNum = 0
 
-            #   Assign to dictionary
-            imageIdToImageDataDict[ imageId ] = imageData
+        imageDataList = list()
+        checkpointTaskNum = taskNum
 
-        return imageIdToImageDataDict
+        for imageData in Indexer.iterateIndex( imageFileWalker.iterate( imageDir ), workerNum, ioThreadNum, previousImageIndex, isHashed, maxDecodeSize, taskNum,
+                                                reportDict, histogramDtype, histogramScale, histogramCache, thumbnailSize, previousThumbnailPack ):
+
+            taskNum += 1
+
+            if imageData is not None:
+                imageDataList.append( imageData )
+
+            #   Write batch and checkpoint
+            if taskNum - checkpointTaskNum >= batchSize:
+                Indexer.writeBatch( indexFileWriter, imageDataList, taskNum, reportDict[ 'taskHash' ], histogramDtype, histogramScale, thumbnailPackWriter )
+                imageDataList = list()
+                checkpointTaskNum = taskNum
+
+        Indexer.writeBatch( indexFileWriter, imageDataList, taskNum, reportDict[ 'taskHash' ], histogramDtype, histogramScale, thumbnailPackWriter )
+
+        if ( previousImageIndex is not None and len( previousImageIndex ) > 0 ) or histogramCache is not None:
+            Indexer.printReport( reportDict )
+
+        #   Write index file
+        with Metrics.time( 'indexer.closeIndexFile' ):
+            indexFileWriter.close( ImageIndex.getMetadataDict( indexFileWriter.rowNum, { 'maxDecodeSize' : maxDecodeSize }, histogramScale ) )
+
+        with Metrics.time( 'indexer.convertHistogramLayout' ):
+            imageIndex = Indexer.readIndex( indexDir, indexFileName, isDeltaApplied=False )
+            layoutImageIndex = imageIndex.convertHistogramLayout( histogramLayout )
+
+            if layoutImageIndex is not imageIndex:
+                IndexFile.write( indexFilePath, layoutImageIndex.metadataDict, layoutImageIndex.sectionDict )
+
+        if thumbnailPackWriter is not None:
+            with Metrics.time( 'indexer.closeThumbnailPack' ):
+                thumbnailPackWriter.close()
+
+        #   Changes of delta log were read with previous index, or
+        #   found again by walking image directory
+        DeltaLog.remove( os.path.join( indexDir, getDeltaLogFileName( indexFileName ) ) )
+
+    @staticmethod
+    def writeBatch( indexFileWriter : IndexFileWriter, imageDataList : List[ImageData], taskNum : int, taskHash : str,
+                    histogramDtype : str = np.dtype( HistogramDtype ).name, histogramScale : Optional[float] = None,
+                    thumbnailPackWriter : Optional[ThumbnailPackWriter] = None ):
+        ''' This function appends given image data to index file writer
+            and checkpoints it with task number and task hash of images
+            processed so far, and so does thumbnail pack writer if given
+        '''
+
+        with Metrics.time( 'indexer.writeBatch' ):
+            sectionDict, stringListDict = ImageIndex.getColumnDict( imageDataList, histogramDtype, histogramScale )
+            stateDict = { 'taskNum' : taskNum, 'taskHash' : taskHash }
+
+            if thumbnailPackWriter is not None:
+                thumbnailPackWriter.append( imageDataList )
+                thumbnailPackWriter.checkpoint( stateDict )
+
+            indexFileWriter.append( sectionDict, stringListDict )
+            indexFileWriter.checkpoint( stateDict )
+
+    @staticmethod
+    def getCheckpointTaskHash( imageFilePathIterable : Iterable[str], previousImageIdToImageDataDict : Optional[Dict], taskNum : int ) -> str:
+        ''' This function returns task hash of first tasks up to given
+            task number an index build of given image files would run,
+            see iterateIndex()
+        '''
+
+        taskHash = ''
+
+        for _, imageFilePath, _ in itertools.islice( iterateTask( imageFilePathIterable, previousImageIdToImageDataDict or dict(), False ), taskNum ):
+            taskHash = getTaskHash( taskHash, imageFilePath )
+
+        return taskHash
+
+    @staticmethod
+    def printReport( reportDict : Dict ):
+        ''' This function prints counts of index build report, decodes
+            saved are those of images reused from previous index or
+            read from histogram cache
+        '''
+
+        print( 'index() - Reuse {} images, read {} images from histogram cache, compute {} images, skip {} images, drop {} images, save {} decodes.'.format(
+            reportDict[ 'reuse' ], reportDict[ 'cache' ], reportDict[ 'compute' ], reportDict[ 'skip' ], reportDict[ 'drop' ],
+            reportDict[ 'reuse' ] + reportDict[ 'cache' ] ) )
+
+    @staticmethod
+    def getMaxDecodeSize( imageIdToImageDataDict : Dict ) -> Optional[int]:
+        ''' This function returns maximum decode size given index was
+            computed with, dictionary of image data has no such
+            setting and is always computed at full resolution
+        '''
+
+        if isinstance( imageIdToImageDataDict, ImageIndex ):
+            return imageIdToImageDataDict.getMaxDecodeSize()
+
+        return None
+
+    @staticmethod
+    def getHistogramSetting( imageIdToImageDataDict : Dict ) -> Tuple[str, Optional[float]]:
+        ''' This function returns histogram dtype and quantization scale
+            given index was stored with, dictionary of image data keeps
+            float histograms
+        '''
+
+        if isinstance( imageIdToImageDataDict, ImageIndex ):
+            return imageIdToImageDataDict.getHistogramDtype(), imageIdToImageDataDict.getHistogramScale()
+
+        return np.dtype( HistogramDtype ).name, None
 
     @staticmethod
     def writeIndex( imageIdToImageDataDict : Dict, indexDir : str, indexFileName : str ):
@@ -71,13 +709,25 @@ class Indexer(object):
         #   Construct index file path
         indexFilePath = os.path.join( indexDir, indexFileName )
 
+        #   Convert dictionary of image data to columnar image index
+        if isinstance( imageIdToImageDataDict, ImageIndex ):
+            imageIndex = imageIdToImageDataDict.compact()
+        else:
+            imageIndex = ImageIndex.fromImageDataDict( imageIdToImageDataDict )
+
         #   Write index file
-        with open( indexFilePath, 'wb' ) as indexFile:
-            pickle.dump( imageIdToImageDataDict, indexFile )
+        IndexFile.write( indexFilePath, imageIndex.metadataDict, imageIndex.sectionDict )
 
     @staticmethod
-    def readIndex( indexDir : str, indexFileName : str ):
-        ''' This function reads index from file
+    def readIndex( indexDir : str, indexFileName : str, isVerified : bool = False, isDeltaApplied : bool = True ) -> ImageIndex:
+        ''' This function reads index from file, index file is
+            memory mapped so only pages being used are loaded
+
+            If applied, changes recorded in delta log of index file
+            since it was written are applied, index file then stays
+            memory mapped under a small in-memory index of changed
+            images, see DeltaImageIndex, and version also covers delta
+            log, see DeltaLog
         '''
 
         #   Construct index file path
@@ -87,8 +737,239 @@ class Indexer(object):
         if not os.path.exists( indexFilePath ):
             raise ValueError( 'readIndex() - Cannot find index file at {}.'.format( indexFilePath ) )
 
-        #   Write index file
-        with open( indexFilePath, 'rb' ) as indexFile:
-            imageIdToImageDataDict = pickle.load( indexFile )
+        with Metrics.time( 'indexer.readIndex' ):
+
+            #   Read version before content, so that index replaced in
+            #   between is seen as changed when read again
+            version = IndexFile.readVersion( indexFilePath )
+
+            #   Read index file
+            metadataDict, sectionDict = IndexFile.read( indexFilePath, isVerified )
+
+        imageIndex = ImageIndex( metadataDict, sectionDict, version )
+
+        if not isDeltaApplied:
+            return imageIndex
+
+        with Metrics.time( 'indexer.readDeltaLog' ):
+            deltaLogTuple = DeltaLog.read( os.path.join( indexDir, getDeltaLogFileName( indexFileName ) ), version )
+
+        if deltaLogTuple is None or len( deltaLogTuple[0] ) == 0:
+            return imageIndex
+
+        recordList, deltaVersion = deltaLogTuple
+        imageIdToImageDataDict, deletedImageIdSet = DeltaLog.getChangeDict( recordList )
+
+        with Metrics.time( 'indexer.applyDeltaLog' ):
+            imageIndex = DeltaImageIndex( imageIndex, imageIdToImageDataDict, deletedImageIdSet, deltaVersion )
+
+        Metrics.count( 'indexer.deltaRecordNum', len( recordList ) )
+
+        return imageIndex
+
+    @staticmethod
+    def readIndexVersion( indexDir : str, indexFileName : str ) -> str:
+        ''' This function returns version readIndex() would read, with
+            only headers of index file and delta log, so that checking
+            for changes is cheap
+        '''
+
+        version = IndexFile.readVersion( os.path.join( indexDir, indexFileName ) )
+
+        return DeltaLog.readVersion( os.path.join( indexDir, getDeltaLogFileName( indexFileName ) ), version )
+
+    @staticmethod
+    def readDeltaRecordNum( indexDir : str, indexFileName : str ) -> int:
+        ''' This function returns number of records in delta log of
+            index file, changes which index file and its shards do not
+            include yet
+        '''
+
+        version = IndexFile.readVersion( os.path.join( indexDir, indexFileName ) )
+        deltaLogTuple = DeltaLog.read( os.path.join( indexDir, getDeltaLogFileName( indexFileName ) ), version )
+
+        return len( deltaLogTuple[0] ) if deltaLogTuple is not None else 0
+
+    @staticmethod
+    def readThumbnailPack( indexDir : str, indexFileName : str ) -> Optional[ThumbnailPack]:
+        ''' This function memory maps thumbnail pack of index file, or
+            returns None if index was built without thumbnails
+        '''
+
+        try:
+            return ThumbnailPack.read( os.path.join( indexDir, getThumbnailPackFileName( indexFileName ) ) )
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def readThumbnailPackVersion( indexDir : str, indexFileName : str ) -> Optional[str]:
+        ''' This function returns version of thumbnail pack of index file,
+            or None if there is none, see readThumbnailPack()
+        '''
+
+        try:
+            return IndexFile.readVersion( os.path.join( indexDir, getThumbnailPackFileName( indexFileName ) ) )
+        except FileNotFoundError:
+            return None
 
-        return imageIdToImageDataDict
\ No newline at end of file
+    @staticmethod
+    def compactIndex( indexDir : str, indexFileName : str ) -> int:
+        ''' This function writes index file with changes of its delta
+            log applied and removes delta log, and returns number of
+            records folded into index file
+        '''
+
+        indexFilePath = os.path.join( indexDir, indexFileName )
+        deltaLogFilePath = os.path.join( indexDir, getDeltaLogFileName( indexFileName ) )
+
+        if not os.path.exists( indexFilePath ):
+            raise ValueError( 'compactIndex() - Cannot find index file at {}.'.format( indexFilePath ) )
+
+        deltaLogTuple = DeltaLog.read( deltaLogFilePath, IndexFile.readVersion( indexFilePath ) )
+        recordNum = len( deltaLogTuple[0] ) if deltaLogTuple is not None else 0
+
+        if recordNum > 0:
+
+            imageIndex = Indexer.readIndex( indexDir, indexFileName ).compact()
+
+            #   Index file is replaced atomically, delta log of previous
+            #   index file is stale from then on
+            with Metrics.time( 'indexer.compactIndex' ):
+                IndexFile.write( indexFilePath, imageIndex.metadataDict, imageIndex.sectionDict )
+
+        DeltaLog.remove( deltaLogFilePath )
+
+        return recordNum
+
+    @staticmethod
+    def buildAnnIndex( indexDir : str, indexFileName : str, clusterNum : int,
+                        iterationNum : int = DefaultIterationNum, sampleNum : int = DefaultSampleNum ):
+        ''' This function adds approximate nearest neighbour sections
+            of given cluster number to index file, replacing existing
+            ones
+        '''
+
+        #   Construct index file path
+        indexFilePath = os.path.join( indexDir, indexFileName )
+
+        imageIndex = Indexer.readIndex( indexDir, indexFileName ).compact()
+
+        sectionDict = { sectionName : sectionArray for sectionName, sectionArray in imageIndex.sectionDict.items() if not sectionName.startswith( 'ann' ) }
+        sectionDict.update( AnnIndex.build( imageIndex.histogramMatrix, clusterNum, iterationNum, sampleNum, histogramScale=imageIndex.getHistogramScale() ) )
+
+        metadataDict = dict( imageIndex.metadataDict )
+        metadataDict[ 'annClusterNum' ] = len( sectionDict[ 'annCentroid' ] )
+
+        #   Write index file, changes of delta log are folded into it
+        IndexFile.write( indexFilePath, metadataDict, sectionDict )
+        DeltaLog.remove( os.path.join( indexDir, getDeltaLogFileName( indexFileName ) ) )
+
+    @staticmethod
+    def getAnnClusterNum( indexDir : str, indexFileName : str ) -> Optional[int]:
+        ''' This function returns cluster number of approximate nearest
+            neighbour sections of index file, or None if it has none or
+            does not exist
+        '''
+
+        #   Construct index file path
+        indexFilePath = os.path.join( indexDir, indexFileName )
+
+        if not os.path.exists( indexFilePath ):
+            return None
+
+        metadataDict, _ = IndexFile.read( indexFilePath )
+
+        return metadataDict.get( 'annClusterNum' )
+
+    @staticmethod
+    def writeShardIndex( indexDir : str, indexFileName : str, shardNum : int, histogramLayout : str = DefaultHistogramLayout ) -> List[int]:
+        ''' This function splits index file into given number of shard
+            files, each holding images whose image id modulo shard
+            number is its shard, and writes shard manifest listing them
+
+            Each shard stores histograms in given layout, so auto picks
+            dense or sparse histograms shard by shard, which does not
+            change scores since both layouts are summed exactly
+
+            Image ids are kept across rebuilds, so a shard whose images
+            are unchanged is left as it is and only changed shards are
+            written, their shard numbers are returned. Shard files of
+            another shard number are removed
+        '''
+
+        if shardNum < 1:
+            raise ValueError( 'writeShardIndex() - Invalid shard number {}.'.format( shardNum ) )
+
+        #   Shard manifest pins version of index file, so shards are
+        #   split from it without delta log
+        imageIndex = Indexer.readIndex( indexDir, indexFileName, isDeltaApplied=False )
+
+        shardFileNameList = [ getShardFileName( indexFileName, shard, shardNum ) for shard in range( shardNum ) ]
+        writtenShardList = list()
+
+        for shard, shardFileName in enumerate( shardFileNameList ):
+
+            shardFilePath = os.path.join( indexDir, shardFileName )
+            shardIndex = imageIndex.selectRows( np.flatnonzero( imageIndex.imageIdArray % shardNum == shard ) ).convertHistogramLayout( histogramLayout )
+
+            if not isIndexFileEqual( shardIndex, shardFilePath ):
+                IndexFile.write( shardFilePath, shardIndex.metadataDict, shardIndex.sectionDict )
+                writtenShardList.append( shard )
+
+        #   Shard manifest pins index version and shard versions, so
+        #   that stale or partly written shards are never searched
+        writeJsonFile( os.path.join( indexDir, getShardManifestFileName( indexFileName ) ), {
+            'indexVersion' : imageIndex.version,
+            'metadata' : imageIndex.metadataDict,
+            'shardList' : [ { 'fileName' : shardFileName, 'version' : IndexFile.readVersion( os.path.join( indexDir, shardFileName ) ) }
+                            for shardFileName in shardFileNameList ],
+        } )
+
+        #   Remove shards of previous shard number
+        shardFilePrefix = os.path.splitext( indexFileName )[0] + '.shard-'
+        for fileName in os.listdir( indexDir ):
+            if fileName.startswith( shardFilePrefix ) and fileName not in shardFileNameList and not fileName.endswith( '.tmp' ):
+                os.remove( os.path.join( indexDir, fileName ) )
+
+        return writtenShardList
+
+    @staticmethod
+    def readShardManifest( indexDir : str, indexFileName : str ) -> Dict:
+        ''' This function reads shard manifest of index file, and checks
+            that shards were split from current index file and not
+            changed since
+        '''
+
+        shardManifestFilePath = os.path.join( indexDir, getShardManifestFileName( indexFileName ) )
+
+        if not os.path.exists( shardManifestFilePath ):
+            raise ValueError( 'readShardManifest() - Cannot find shard manifest at {}.'.format( shardManifestFilePath ) )
+
+        with open( shardManifestFilePath, 'r' ) as shardManifestFile:
+            shardManifestDict = json.load( shardManifestFile )
+
+        if shardManifestDict[ 'indexVersion' ] != IndexFile.readVersion( os.path.join( indexDir, indexFileName ) ):
+            raise ValueError( 'readShardManifest() - Shards of {} are out of date, split index again.'.format( indexFileName ) )
+
+        for shardDict in shardManifestDict[ 'shardList' ]:
+            if shardDict[ 'version' ] != IndexFile.readVersion( os.path.join( indexDir, shardDict[ 'fileName' ] ) ):
+                raise ValueError( 'readShardManifest() - Shard {} was changed, split index again.'.format( shardDict[ 'fileName' ] ) )
+
+        return shardManifestDict
+
+    @staticmethod
+    def convertPickleIndex( pickleIndexFilePath : str, indexDir : str, indexFileName : str ):
+        ''' This function converts index file pickled by previous
+            version to current index file format
+        '''
+
+        #   Check if pickle index file exists
+        if not os.path.exists( pickleIndexFilePath ):
+            raise ValueError( 'convertPickleIndex() - Cannot find pickle index file at {}.'.format( pickleIndexFilePath ) )
+
+        #   Read pickle index file
+        with open( pickleIndexFilePath, 'rb' ) as pickleIndexFile:
+            imageIdToImageDataDict = pickle.load( pickleIndexFile )
+
+        #   Write index file
+        Indexer.writeIndex( imageIdToImageDataDict, indexDir, indexFileName )
@@ -0,0 +1,290 @@
+##########################################################################
+#   IMPORT
+##########################################################################
+
+import time
+import threading
+import collections
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+from metrics.Metrics import Metrics
+
+##########################################################################
+#   GLOBAL
+##########################################################################
+
+DefaultWorkerNum = 1
+DefaultIoThreadNum = 4
+
+#   Tasks in flight per reader thread or decoder process, which
+#   bounds memory held by read file bytes
+InFlightTaskNumPerWorker = 4
+
+#   Decode chunks queued per decoder process by default, so that each
+#   process has the next chunk at hand when it finishes one
+QueuedChunkNumPerWorker = 2
+
+StageNameList = [ 'read', 'decode', 'write' ]
+
+##########################################################################
+#   HELPER
+##########################################################################
+
+def runDecodeChunk( decodeFunc, decodeArgumentList : List ):
+    ''' This function runs decode stage of a chunk of tasks inside a
+        worker process and returns result and exception of each, so
+        that a failing task does not fail the others, with duration of
+        the chunk and metrics it recorded, so that parent process can
+        merge them
+    '''
+
+    startTime = time.perf_counter()
+
+    decodeResultList = list()
+
+    for decodeArgument in decodeArgumentList:
+        try:
+            decodeResultList.append( ( decodeFunc( decodeArgument ), None ) )
+        except Exception as e:
+            decodeResultList.append( ( None, e ) )
+
+    return decodeResultList, time.perf_counter() - startTime, Metrics.popMetricsDict()
+
+##########################################################################
+#   CLASS
+##########################################################################
+
+class IngestPipeline(object):
+    ''' This class runs tasks through three stages connected by a
+        bounded window of tasks in flight, so that file I/O, decoding
+        and writing results overlap
+
+        Read stage runs given read function in a pool of threads, it
+        returns a state and file bytes to decode, or None if the task
+        needs no decoding. Decode stage runs given decode function of
+        those bytes in a pool of worker processes, or in the calling
+        thread if worker number is one. Write stage is the caller,
+        which gets state and decode result of each task in task order
+
+        At most a fixed number of tasks are in flight, a new task is
+        only read once the oldest one is written, so memory stays flat
+        however slow the write stage is. Time each stage is busy is
+        measured, see getUtilizationDict()
+
+        Read tasks are sent to worker processes in chunks, as chunksize
+        of Pool.map() does, so that a small image does not cost a round
+        trip to a process. A chunk is sent once it is full, or once no
+        read is left in flight to fill it, since tasks in flight are
+        bounded and the oldest one may be waiting in it
+    '''
+
+    def __init__( self, readFunc, decodeFunc, workerNum : int = DefaultWorkerNum, ioThreadNum : int = DefaultIoThreadNum,
+                    maxInFlightNum : Optional[int] = None, decodeChunkSize : Optional[int] = None ):
+
+        if workerNum < 1:
+            raise ValueError( 'IngestPipeline() - Invalid worker number {}.'.format( workerNum ) )
+
+        if ioThreadNum < 1:
+            raise ValueError( 'IngestPipeline() - Invalid I/O thread number {}.'.format( ioThreadNum ) )
+
+        if maxInFlightNum is None:
+            maxInFlightNum = InFlightTaskNumPerWorker*max( workerNum, ioThreadNum )
+
+        if maxInFlightNum < 1:
+            raise ValueError( 'IngestPipeline() - Invalid maximum in flight number {}.'.format( maxInFlightNum ) )
+
+        if decodeChunkSize is None:
+            decodeChunkSize = max( 1, maxInFlightNum // ( QueuedChunkNumPerWorker*workerNum ) )
+
+        if decodeChunkSize < 1:
+            raise ValueError( 'IngestPipeline() - Invalid decode chunk size {}.'.format( decodeChunkSize ) )
+
+        self.readFunc = readFunc
+        self.decodeFunc = decodeFunc
+        self.workerNum = workerNum
+        self.ioThreadNum = ioThreadNum
+        self.maxInFlightNum = maxInFlightNum
+        self.decodeChunkSize = decodeChunkSize
+
+        self.readExecutor = ThreadPoolExecutor( ioThreadNum )
+        self.decodeExecutor = ProcessPoolExecutor( workerNum, initializer=Metrics.reset ) if workerNum > 1 else None
+
+        self.lock = threading.Lock()
+        self.readingNum = 0
+        self.pendingDecodeList = list()
+        self.stageSecondsDict = { stageName : 0.0 for stageName in StageNameList }
+        self.startTime = None
+        self.endTime = None
+
+    def addStageSeconds( self, stageName : str, seconds : float ):
+        ''' This function adds given busy seconds to given stage
+        '''
+
+        with self.lock:
+            self.stageSecondsDict[ stageName ] += seconds
+
+        Metrics.addTime( 'ingest.' + stageName, seconds )
+
+    def read( self, task ):
+        ''' This function runs read stage of given task in a reader
+            thread
+        '''
+
+        startTime = time.perf_counter()
+
+        try:
+            return self.readFunc( task )
+        finally:
+            self.addStageSeconds( 'read', time.perf_counter() - startTime )
+
+    def submit( self, task ) -> Future:
+        ''' This function starts given task and returns future of its
+            state, file bytes and decode result, decode is queued in
+            next chunk as soon as read is done
+        '''
+
+        taskFuture = Future()
+
+        with self.lock:
+            self.readingNum += 1
+
+        def finishRead( readFuture : Future ):
+
+            try:
+                state, imageBytes = readFuture.result()
+
+                #   Without worker processes, caller decodes
+                if imageBytes is None or self.decodeExecutor is None:
+                    taskFuture.set_result( ( state, imageBytes, None ) )
+                else:
+                    with self.lock:
+                        self.pendingDecodeList.append( ( taskFuture, state, imageBytes ) )
+
+            except BaseException as e:
+                taskFuture.set_exception( e )
+
+            finally:
+                decodeChunk = None
+
+                with self.lock:
+                    self.readingNum -= 1
+                    if len( self.pendingDecodeList ) >= self.decodeChunkSize or ( self.readingNum == 0 and len( self.pendingDecodeList ) > 0 ):
+                        decodeChunk, self.pendingDecodeList = self.pendingDecodeList, list()
+
+                if decodeChunk is not None:
+                    self.submitDecodeChunk( decodeChunk )
+
+        self.readExecutor.submit( self.read, task ).add_done_callback( finishRead )
+
+        return taskFuture
+
+    def submitDecodeChunk( self, decodeChunk : List ):
+        ''' This function sends given chunk of task future, state and
+            file bytes to a worker process, and completes each task
+            future with its decode result
+        '''
+
+        def finishDecode( decodeFuture : Future ):
+
+            try:
+                decodeResultList, decodeSeconds, metricsDict = decodeFuture.result()
+            except BaseException as e:
+                for taskFuture, _, _ in decodeChunk:
+                    taskFuture.set_exception( e )
+                return
+
+            Metrics.merge( metricsDict )
+            self.addStageSeconds( 'decode', decodeSeconds )
+
+            for ( taskFuture, state, _ ), ( decodeResult, exception ) in zip( decodeChunk, decodeResultList ):
+                if exception is not None:
+                    taskFuture.set_exception( exception )
+                else:
+                    taskFuture.set_result( ( state, None, decodeResult ) )
+
+        try:
+            decodeFuture = self.decodeExecutor.submit( runDecodeChunk, self.decodeFunc, [ imageBytes for _, _, imageBytes in decodeChunk ] )
+        except BaseException as e:
+            for taskFuture, _, _ in decodeChunk:
+                taskFuture.set_exception( e )
+            return
+
+        decodeFuture.add_done_callback( finishDecode )
+
+    def iterate( self, taskIterable : Iterable ):
+        ''' This function yields state and decode result of each given
+            task in task order, decode result is None for task which
+            needs no decoding
+        '''
+
+        self.startTime = time.perf_counter()
+
+        taskIterator = iter( taskIterable )
+        taskFutureQueue = collections.deque()
+
+        for task in taskIterator:
+            taskFutureQueue.append( self.submit( task ) )
+            if len( taskFutureQueue ) >= self.maxInFlightNum:
+                break
+
+        while len( taskFutureQueue ) > 0:
+
+            #   Wait for oldest task
+            with Metrics.time( 'ingest.wait' ):
+                state, imageBytes, decodeResult = taskFutureQueue.popleft().result()
+
+            if imageBytes is not None:
+                decodeStartTime = time.perf_counter()
+                decodeResult = self.decodeFunc( imageBytes )
+                self.addStageSeconds( 'decode', time.perf_counter() - decodeStartTime )
+                imageBytes = None
+
+            #   Start next task in its place
+            task = next( taskIterator, None )
+            if task is not None:
+                taskFutureQueue.append( self.submit( task ) )
+
+            writeStartTime = time.perf_counter()
+            yield state, decodeResult
+            self.addStageSeconds( 'write', time.perf_counter() - writeStartTime )
+
+        self.endTime = time.perf_counter()
+
+    def getUtilizationDict( self ) -> Dict[str, float]:
+        ''' This function returns fraction of time each stage was busy,
+            summed over its threads or processes, since iterate()
+            started, caller thread is shared by decode stage if there
+            is no worker process
+        '''
+
+        endTime = self.endTime if self.endTime is not None else time.perf_counter()
+        elapsedSeconds = max( endTime - self.startTime, 1e-9 ) if self.startTime is not None else 1e-9
+
+        with self.lock:
+            return {
+                'read' : self.stageSecondsDict[ 'read' ] / ( elapsedSeconds*self.ioThreadNum ),
+                'decode' : self.stageSecondsDict[ 'decode' ] / ( elapsedSeconds*self.workerNum ),
+                'write' : self.stageSecondsDict[ 'write' ] / elapsedSeconds,
+            }
+
+    def printReport( self ):
+        ''' This function prints how busy each stage was and which one
+            limits throughput
+        '''
+
+        utilizationDict = self.getUtilizationDict()
+
+        print( 'ingest() - Read busy {:.0%} of {} threads, decode busy {:.0%} of {} {}, write busy {:.0%}, bottleneck {}.'.format(
+            utilizationDict[ 'read' ], self.ioThreadNum, utilizationDict[ 'decode' ], self.workerNum,
+            'processes' if self.decodeExecutor is not None else 'caller thread', utilizationDict[ 'write' ],
+            max( StageNameList, key=lambda stageName: utilizationDict[ stageName ] ) ) )
+
+    def close( self ):
+        ''' This function drops tasks not started and stops threads and
+            worker processes
+        '''
+
+        self.readExecutor.shutdown( wait=True, cancel_futures=True )
+
+        if self.decodeExecutor is not None:
+            self.decodeExecutor.shutdown( wait=True, cancel_futures=True )
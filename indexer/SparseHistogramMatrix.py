@@ -0,0 +1,235 @@
+##########################################################################
+#   IMPORT
+##########################################################################
+
+import numpy as np
+from typing import Dict
+
+##########################################################################
+#   GLOBAL
+##########################################################################
+
+#   Number of channels of color histogram, each row of sparse matrix
+#   has one segment of bins per channel
+ChannelNum = 3
+
+#   Number of rows converted at once from dense histograms
+DefaultConvertBlockRowNum = 1 << 12
+
+SparseHistogramSectionNameList = [ 'histogramOffset', 'histogramBin', 'histogramValue' ]
+
+##########################################################################
+#   HELPER
+##########################################################################
+
+def getRangeIndexArray( startArray : np.ndarray, lengthArray : np.ndarray ) -> np.ndarray:
+    ''' This function returns index of every element of given ranges,
+        range after range
+    '''
+
+    startArray = startArray.astype( np.int64 )
+    lengthArray = lengthArray.astype( np.int64 )
+
+    return np.repeat( startArray - ( np.cumsum( lengthArray ) - lengthArray ), lengthArray ) + np.arange( lengthArray.sum() )
+
+##########################################################################
+#   CLASS
+##########################################################################
+
+class SparseHistogramMatrix(object):
+    ''' This class is a histogram matrix which keeps non-empty bins of
+        every row only, as compressed sparse rows, bin numbers and
+        values of a row are stored one channel after another, and
+        offset array holds start of every channel of every row followed
+        by end of last one
+
+        It is indexed like a dense matrix, a slice of rows gives a
+        sparse view, while a row or an array of rows gives dense
+        histograms, so code which reads a few rows does not care how
+        histograms are stored
+    '''
+
+    def __init__( self, offsetArray : np.ndarray, binArray : np.ndarray, valueArray : np.ndarray, binNum : int ):
+
+        if ( len( offsetArray ) - 1 ) % ChannelNum != 0 or binNum % ChannelNum != 0:
+            raise ValueError( 'SparseHistogramMatrix() - Offsets of {} channels and {} bins do not match.'.format( len( offsetArray ) - 1, binNum ) )
+
+        self.offsetArray = offsetArray
+        self.binArray = binArray
+        self.valueArray = valueArray
+        self.binNum = binNum
+
+    @staticmethod
+    def fromDense( histogramMatrix : np.ndarray, blockRowNum : int = DefaultConvertBlockRowNum ) -> 'SparseHistogramMatrix':
+        ''' This function converts given dense histogram matrix, block
+            by block so memory mapped matrix is never loaded whole
+        '''
+
+        rowNum, binNum = histogramMatrix.shape
+        channelBinNum = binNum // ChannelNum
+
+        offsetArray = np.zeros( ChannelNum*rowNum + 1, dtype=np.int64 )
+        binArrayList = list()
+        valueArrayList = list()
+
+        for startRow in range( 0, rowNum, blockRowNum ):
+            histogramBlock = np.asarray( histogramMatrix[ startRow:startRow+blockRowNum ] )
+
+            #   Non-zero bins come row by row in ascending bin order,
+            #   hence channel by channel
+            blockRowArray, blockBinArray = np.nonzero( histogramBlock )
+            binArrayList.append( blockBinArray.astype( np.uint16 ) )
+            valueArrayList.append( histogramBlock[ blockRowArray, blockBinArray ] )
+
+            channelLengthArray = np.bincount( blockRowArray*ChannelNum + blockBinArray//channelBinNum, minlength=ChannelNum*len( histogramBlock ) )
+            offsetArray[ ChannelNum*startRow+1:ChannelNum*( startRow + len( histogramBlock ) )+1 ] = channelLengthArray
+
+        np.cumsum( offsetArray, out=offsetArray )
+
+        binArray = np.concatenate( binArrayList ) if len( binArrayList ) > 0 else np.zeros( 0, dtype=np.uint16 )
+        valueArray = np.concatenate( valueArrayList ) if len( valueArrayList ) > 0 else np.zeros( 0, dtype=histogramMatrix.dtype )
+
+        return SparseHistogramMatrix( offsetArray, binArray, valueArray, binNum )
+
+    @staticmethod
+    def fromSectionDict( sectionDict : Dict[str, np.ndarray], binNum : int ) -> 'SparseHistogramMatrix':
+        ''' This function constructs sparse histogram matrix of given
+            index sections, see getSectionDict()
+        '''
+
+        return SparseHistogramMatrix( sectionDict[ 'histogramOffset' ], sectionDict[ 'histogramBin' ], sectionDict[ 'histogramValue' ], binNum )
+
+    def getSectionDict( self ) -> Dict[str, np.ndarray]:
+        ''' This function returns index sections of this matrix, offsets
+            of a view are rebased to its own bins
+        '''
+
+        startOffset, endOffset = int( self.offsetArray[0] ), int( self.offsetArray[-1] )
+
+        return {
+            'histogramOffset' : self.offsetArray - startOffset if startOffset > 0 else self.offsetArray,
+            'histogramBin' : self.binArray[ startOffset:endOffset ],
+            'histogramValue' : self.valueArray[ startOffset:endOffset ],
+        }
+
+    @property
+    def shape( self ):
+        return ( len( self ), self.binNum )
+
+    @property
+    def dtype( self ):
+        return self.valueArray.dtype
+
+    @property
+    def nbytes( self ):
+        return sum( sectionArray.nbytes for sectionArray in self.getSectionDict().values() )
+
+    def __len__( self ):
+        return ( len( self.offsetArray ) - 1 ) // ChannelNum
+
+    def getStoredBinNum( self ) -> int:
+        ''' This function returns number of non-empty bins stored
+        '''
+
+        return int( self.offsetArray[-1] ) - int( self.offsetArray[0] )
+
+    def getDensity( self ) -> float:
+        ''' This function returns fraction of bins which are not empty
+        '''
+
+        return self.getStoredBinNum() / max( len( self )*self.binNum, 1 )
+
+    def selectRows( self, rowArray : np.ndarray ) -> 'SparseHistogramMatrix':
+        ''' This function returns in-memory sparse matrix of given rows
+            in given order
+        '''
+
+        rowArray = np.asarray( rowArray, dtype=np.int64 )
+
+        #   Start and end of each row span all of its channels
+        startArray = self.offsetArray[ ChannelNum*rowArray ]
+        channelLengthArray = np.diff( self.offsetArray[ ( ChannelNum*rowArray )[ :, None ] + np.arange( ChannelNum + 1 ) ], axis=1 )
+
+        offsetArray = np.zeros( ChannelNum*len( rowArray ) + 1, dtype=np.int64 )
+        np.cumsum( channelLengthArray.reshape( -1 ), out=offsetArray[1:] )
+
+        indexArray = getRangeIndexArray( startArray, channelLengthArray.sum( axis=1 ) )
+
+        return SparseHistogramMatrix( offsetArray, self.binArray[ indexArray ], self.valueArray[ indexArray ], self.binNum )
+
+    def mergeRows( self, keptRowArray : np.ndarray, keptPositionArray : np.ndarray,
+                    addedMatrix : 'SparseHistogramMatrix', addedPositionArray : np.ndarray ) -> 'SparseHistogramMatrix':
+        ''' This function returns in-memory sparse matrix of given kept
+            rows of this matrix and every row of given added matrix, at
+            given positions, stored bins are copied without converting
+            them to dense rows
+        '''
+
+        keptRowArray = np.asarray( keptRowArray, dtype=np.int64 )
+        addedSectionDict = addedMatrix.getSectionDict()
+        addedOffsetArray = addedSectionDict[ 'histogramOffset' ]
+
+        #   Length of every channel of every merged row
+        channelLengthMatrix = np.zeros( ( len( keptPositionArray ) + len( addedPositionArray ), ChannelNum ), dtype=np.int64 )
+        channelLengthMatrix[ keptPositionArray ] = np.diff( self.offsetArray[ ( ChannelNum*keptRowArray )[ :, None ] + np.arange( ChannelNum + 1 ) ], axis=1 )
+        channelLengthMatrix[ addedPositionArray ] = np.diff( addedOffsetArray ).reshape( -1, ChannelNum )
+
+        offsetArray = np.zeros( channelLengthMatrix.size + 1, dtype=np.int64 )
+        np.cumsum( channelLengthMatrix.reshape( -1 ), out=offsetArray[1:] )
+
+        rowLengthArray = channelLengthMatrix.sum( axis=1 )
+        keptIndexArray = getRangeIndexArray( self.offsetArray[ ChannelNum*keptRowArray ], rowLengthArray[ keptPositionArray ] )
+        keptMergedIndexArray = getRangeIndexArray( offsetArray[ ChannelNum*np.asarray( keptPositionArray, dtype=np.int64 ) ], rowLengthArray[ keptPositionArray ] )
+        addedMergedIndexArray = getRangeIndexArray( offsetArray[ ChannelNum*np.asarray( addedPositionArray, dtype=np.int64 ) ], rowLengthArray[ addedPositionArray ] )
+
+        binArray = np.zeros( int( offsetArray[-1] ), dtype=np.uint16 )
+        valueArray = np.zeros( int( offsetArray[-1] ), dtype=self.valueArray.dtype )
+
+        binArray[ keptMergedIndexArray ] = self.binArray[ keptIndexArray ]
+        valueArray[ keptMergedIndexArray ] = self.valueArray[ keptIndexArray ]
+        binArray[ addedMergedIndexArray ] = addedSectionDict[ 'histogramBin' ]
+        valueArray[ addedMergedIndexArray ] = addedSectionDict[ 'histogramValue' ].astype( self.valueArray.dtype )
+
+        return SparseHistogramMatrix( offsetArray, binArray, valueArray, self.binNum )
+
+    def toDense( self, dtype=None ) -> np.ndarray:
+        ''' This function returns dense histogram matrix of this matrix
+        '''
+
+        startOffset, endOffset = int( self.offsetArray[0] ), int( self.offsetArray[-1] )
+
+        rowArray = np.repeat( np.arange( len( self ) ), np.diff( self.offsetArray[ ::ChannelNum ] ) )
+
+        histogramMatrix = np.zeros( self.shape, dtype=dtype if dtype is not None else self.dtype )
+        histogramMatrix[ rowArray, self.binArray[ startOffset:endOffset ] ] = self.valueArray[ startOffset:endOffset ]
+
+        return histogramMatrix
+
+    def __array__( self, dtype=None, copy=None ):
+        return self.toDense( dtype )
+
+    def __getitem__( self, key ):
+
+        if isinstance( key, slice ):
+            startRow, endRow, step = key.indices( len( self ) )
+            if step != 1:
+                raise IndexError( 'SparseHistogramMatrix() - Step of row slice must be 1.' )
+
+            endRow = max( startRow, endRow )
+
+            return SparseHistogramMatrix( self.offsetArray[ ChannelNum*startRow:ChannelNum*endRow+1 ], self.binArray, self.valueArray, self.binNum )
+
+        if np.ndim( key ) == 0:
+            row = int( key )
+            if row < 0:
+                row += len( self )
+            if not 0 <= row < len( self ):
+                raise IndexError( 'SparseHistogramMatrix() - Row {} is out of range.'.format( key ) )
+
+            return self.selectRows( np.array( [ row ] ) ).toDense()[0]
+
+        rowArray = np.asarray( key )
+        if rowArray.dtype == np.bool_:
+            rowArray = np.flatnonzero( rowArray )
+
+        return self.selectRows( rowArray ).toDense()
@@ -0,0 +1,168 @@
+##########################################################################
+#   IMPORT
+##########################################################################
+
+import numpy as np
+from typing import Dict, List, Optional
+from indexer.ImageData import ImageData
+from indexer.ImageIndex import MissingFileManifestValue
+from indexer.IndexFile import IndexFile, IndexFileWriter, StringOffsetSectionSuffix, StringDataSectionSuffix
+
+##########################################################################
+#   GLOBAL
+##########################################################################
+
+ThumbnailStringSectionNameList = [ 'thumbnail' ]
+
+##########################################################################
+#   HELPER
+##########################################################################
+
+def getThumbnailSectionSpecDict() -> Dict:
+    ''' This function returns dtype and row shape of every section of
+        thumbnail pack file but thumbnail bytes, see IndexFileWriter
+    '''
+
+    return {
+        'imageId' : ( np.dtype( np.int64 ).str, () ),
+        'fileSize' : ( np.dtype( np.int64 ).str, () ),
+        'fileMtime' : ( np.dtype( np.int64 ).str, () ),
+    }
+
+def getFileManifestValue( value : Optional[int] ) -> int:
+    ''' This function returns given file manifest value as stored, or
+        missing value if there is none
+    '''
+
+    return int( value ) if value is not None else MissingFileManifestValue
+
+##########################################################################
+#   CLASS
+##########################################################################
+
+class ThumbnailPack(object):
+    ''' This class reads thumbnail pack file written next to index file,
+        which holds JPEG thumbnail of every image in one data section
+        with a table of their offsets, sorted by image id, see
+        ThumbnailPackWriter
+
+        Pack file is memory mapped, so only thumbnails looked up are
+        read from disk. Each thumbnail keeps file size and modification
+        time of image file it was made of, it is only returned for the
+        same ones, so a pack older than its index never shows a
+        modified image with its previous thumbnail
+    '''
+
+    def __init__( self, metadataDict : Dict, sectionDict : Dict[str, np.ndarray], version : Optional[str] = None ):
+        self.metadataDict = metadataDict
+        self.version = version
+        self.thumbnailSize = metadataDict[ 'thumbnailSize' ]
+        self.imageIdArray = sectionDict[ 'imageId' ]
+        self.fileSizeArray = sectionDict[ 'fileSize' ]
+        self.fileMtimeArray = sectionDict[ 'fileMtime' ]
+        self.offsetArray = sectionDict[ 'thumbnail' + StringOffsetSectionSuffix ]
+        self.dataArray = sectionDict[ 'thumbnail' + StringDataSectionSuffix ]
+
+    @staticmethod
+    def read( thumbnailPackFilePath : str ) -> 'ThumbnailPack':
+        ''' This function memory maps given thumbnail pack file, with
+            its version, see IndexFile.readVersion()
+        '''
+
+        version = IndexFile.readVersion( thumbnailPackFilePath )
+        metadataDict, sectionDict = IndexFile.read( thumbnailPackFilePath )
+
+        if 'thumbnailSize' not in metadataDict:
+            raise ValueError( 'read() - {} is not a thumbnail pack file.'.format( thumbnailPackFilePath ) )
+
+        return ThumbnailPack( metadataDict, sectionDict, version )
+
+    def __len__( self ):
+        return len( self.imageIdArray )
+
+    def getRow( self, imageId : int ) -> Optional[int]:
+        ''' This function returns row of given image id, or None if
+            there is no thumbnail of it
+        '''
+
+        row = int( np.searchsorted( self.imageIdArray, imageId ) )
+
+        if row == len( self.imageIdArray ) or self.imageIdArray[ row ] != imageId:
+            return None
+
+        return row
+
+    def getThumbnail( self, imageId : int, fileSize : Optional[int], fileMtime : Optional[int] ) -> Optional[bytes]:
+        ''' This function returns thumbnail bytes of given image id, or
+            None if there is none made of image file of given size and
+            modification time
+        '''
+
+        row = self.getRow( imageId )
+
+        if row is None or self.fileSizeArray[ row ] != getFileManifestValue( fileSize ) or self.fileMtimeArray[ row ] != getFileManifestValue( fileMtime ):
+            return None
+
+        thumbnailBytes = self.dataArray[ int( self.offsetArray[ row ] ):int( self.offsetArray[ row+1 ] ) ].tobytes()
+
+        return thumbnailBytes if len( thumbnailBytes ) > 0 else None
+
+    def hasThumbnail( self, imageId : int, fileSize : Optional[int], fileMtime : Optional[int] ) -> bool:
+        ''' This function checks whether there is thumbnail of given
+            image id made of image file of given size and modification
+            time, without reading it
+        '''
+
+        row = self.getRow( imageId )
+
+        return ( row is not None and self.fileSizeArray[ row ] == getFileManifestValue( fileSize ) and
+                    self.fileMtimeArray[ row ] == getFileManifestValue( fileMtime ) and self.offsetArray[ row+1 ] > self.offsetArray[ row ] )
+
+class ThumbnailPackWriter(object):
+    ''' This class writes thumbnail pack file in a streaming fashion,
+        alongside index file, see IndexFileWriter
+
+        Thumbnails must be appended in ascending image id order, as
+        index builds process images
+    '''
+
+    def __init__( self, thumbnailPackFilePath : str, thumbnailSize : int, buildSettingDict : Dict ):
+        self.thumbnailSize = thumbnailSize
+        self.indexFileWriter = IndexFileWriter( thumbnailPackFilePath, getThumbnailSectionSpecDict(), ThumbnailStringSectionNameList,
+                                                dict( buildSettingDict, thumbnailSize=thumbnailSize ) )
+
+    @property
+    def checkpointStateDict( self ) -> Optional[Dict]:
+        return self.indexFileWriter.checkpointStateDict
+
+    def restart( self ):
+        ''' This function drops thumbnails of checkpoint resumed from
+        '''
+
+        self.indexFileWriter.restart()
+
+    def append( self, imageDataList : List[ImageData] ):
+        ''' This function appends thumbnail of given image data, image
+            data without thumbnail is appended with an empty one
+        '''
+
+        self.indexFileWriter.append( {
+            'imageId' : np.array( [ imageData.imageId for imageData in imageDataList ], dtype=np.int64 ),
+            'fileSize' : np.array( [ getFileManifestValue( imageData.fileSize ) for imageData in imageDataList ], dtype=np.int64 ),
+            'fileMtime' : np.array( [ getFileManifestValue( imageData.fileMtime ) for imageData in imageDataList ], dtype=np.int64 ),
+        }, {
+            'thumbnail' : [ getattr( imageData, 'thumbnail', None ) for imageData in imageDataList ],
+        } )
+
+    def checkpoint( self, stateDict : Dict ):
+        ''' This function flushes thumbnails to disk with given caller
+            state, see IndexFileWriter.checkpoint()
+        '''
+
+        self.indexFileWriter.checkpoint( stateDict )
+
+    def close( self ):
+        ''' This function writes thumbnail pack file
+        '''
+
+        self.indexFileWriter.close( { 'thumbnailSize' : self.thumbnailSize, 'imageNum' : self.indexFileWriter.rowNum } )
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+##########################################################################
+#   IMPORT
+##########################################################################
+
+import sys
+import time
+import numpy as np
+from optparse import OptionParser
+from indexer.Indexer import Indexer
+from searcher.Searcher import Searcher
+
+##########################################################################
+#   GLOBAL
+##########################################################################
+
+NumRequiredArgs = 0
+IndexDir = 'index'
+IndexFileName = 'index.bin'
+DefaultQueryNum = 100
+DefaultMaxResultNum = 10
+DefaultProbeNumList = '1,2,4,8,16,32'
+
+##########################################################################
+#   HELPER
+##########################################################################
+
+def searchWithTimer( imageIndex, histogram, maxResultNum, probeNum ):
+    ''' This function searches index and returns result image id
+        set with elapsed time
+    '''
+
+    startTime = time.time()
+    resultList = Searcher.search( imageIndex, histogram, maxResultNum, probeNum )
+
+    return set( imageId for imageId, _ in resultList ), time.time() - startTime
+
+##########################################################################
+#   CLASS
+##########################################################################
+
+##########################################################################
+#   MAIN
+##########################################################################
+
+def main():
+
+    parser = OptionParser(usage='usage: %prog [options]',
+                            version='%prog 0.0')
+    parser.add_option( '--queries',
+                        action='store',
+                        type='int',
+                        dest='queryNum',
+                        default=DefaultQueryNum,
+                        help='number of indexed images used as queries (default = {!r})'.format(DefaultQueryNum) )
+    parser.add_option( '--maxResult',
+                        action='store',
+                        type='int',
+                        dest='maxResultNum',
+                        default=DefaultMaxResultNum,
+                        help='number of top results k of recall@k (default = {!r})'.format(DefaultMaxResultNum) )
+    parser.add_option( '--probes',
+                        action='store',
+                        dest='probeNumList',
+                        default=DefaultProbeNumList,
+                        help='comma separated probe numbers to measure (default = {!r})'.format(DefaultProbeNumList) )
+
+    (options, args) = parser.parse_args()
+
+    if len(args) != NumRequiredArgs:
+        parser.error('Incorrect number of arguments')
+        sys.exit(-1)
+
+    #   Parse options
+    maxResultNum = options.maxResultNum
+    probeNumList = [ int( probeNum ) for probeNum in options.probeNumList.split( ',' ) ]
+
+    #   Read image index
+    imageIndex = Indexer.readIndex( IndexDir, IndexFileName ).compact()
+
+    if not imageIndex.hasAnnIndex():
+        print( 'measure_ann_recall() - Index has no approximate nearest neighbour index, run generate_index_dir.py with --annClusters.' )
+        sys.exit(-1)
+
+    #   Use evenly spread indexed images as queries
+    queryRowArray = np.unique( np.linspace( 0, len( imageIndex ) - 1, min( options.queryNum, len( imageIndex ) ) ).astype( np.int64 ) )
+    histogramList = [ np.array( imageIndex.getHistogram( queryRow ) ) for queryRow in queryRowArray ]
+
+    #   Exact ranking as ground truth
+    exactResultList = list()
+    exactDeltaTime = 0
+    for histogram in histogramList:
+        resultSet, deltaTime = searchWithTimer( imageIndex, histogram, maxResultNum, None )
+        exactResultList.append( resultSet )
+        exactDeltaTime += deltaTime
+
+    print( 'Index has {} images in {} clusters, {} queries, k = {}.'.format( len( imageIndex ), imageIndex.metadataDict[ 'annClusterNum' ], len( queryRowArray ), maxResultNum ) )
+    print( 'exact      recall@k = 1.0000, mean query time = {:.6f} seconds'.format( exactDeltaTime / len( queryRowArray ) ) )
+
+    for probeNum in probeNumList:
+
+        recallList = list()
+        approximateDeltaTime = 0
+
+        for histogram, exactResultSet in zip( histogramList, exactResultList ):
+            resultSet, deltaTime = searchWithTimer( imageIndex, histogram, maxResultNum, probeNum )
+            recallList.append( len( resultSet & exactResultSet ) / max( len( exactResultSet ), 1 ) )
+            approximateDeltaTime += deltaTime
+
+        print( 'probe {:<4} recall@k = {:.4f}, mean query time = {:.6f} seconds'.format( probeNum, np.mean( recallList ), approximateDeltaTime / len( queryRowArray ) ) )
+
+##########################################################################
+#   RUN
+##########################################################################
+
+if __name__ == '__main__':
+    main()
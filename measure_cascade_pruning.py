@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+##########################################################################
+#   IMPORT
+##########################################################################
+
+import sys
+import time
+import numpy as np
+from optparse import OptionParser
+from indexer.Indexer import Indexer
+from searcher.Searcher import Searcher
+
+##########################################################################
+#   GLOBAL
+##########################################################################
+
+NumRequiredArgs = 0
+IndexDir = 'index'
+IndexFileName = 'index.bin'
+DefaultQueryNum = 100
+DefaultMaxResultNum = 10
+
+##########################################################################
+#   HELPER
+##########################################################################
+
+def searchWithTimer( imageIndex, histogram, maxResultNum, minScore, isCascaded ):
+    ''' This function searches index and returns results with
+        search report and elapsed time
+    '''
+
+    reportDict = dict()
+
+    startTime = time.time()
+    resultList = Searcher.search( imageIndex, histogram, maxResultNum, minScore=minScore, isCascaded=isCascaded, reportDict=reportDict )
+
+    return resultList, reportDict, time.time() - startTime
+
+##########################################################################
+#   CLASS
+##########################################################################
+
+##########################################################################
+#   MAIN
+##########################################################################
+
+def main():
+
+    parser = OptionParser(usage='usage: %prog [options]',
+                            version='%prog 0.0')
+    parser.add_option( '--queries',
+                        action='store',
+                        type='int',
+                        dest='queryNum',
+                        default=DefaultQueryNum,
+                        help='number of indexed images used as queries (default = {!r})'.format(DefaultQueryNum) )
+    parser.add_option( '--maxResult',
+                        action='store',
+                        type='int',
+                        dest='maxResultNum',
+                        default=DefaultMaxResultNum,
+                        help='maximum number of results (default = {!r})'.format(DefaultMaxResultNum) )
+    parser.add_option( '--minScore',
+                        action='store',
+                        type='float',
+                        dest='minScore',
+                        default=None,
+                        help='minimum histogram similarity of results (default = none)' )
+
+    (options, args) = parser.parse_args()
+
+    if len(args) != NumRequiredArgs:
+        parser.error('Incorrect number of arguments')
+        sys.exit(-1)
+
+    #   Read image index
+    imageIndex = Indexer.readIndex( IndexDir, IndexFileName ).compact()
+
+    if len( imageIndex.getCoarseHistogramMatrixList() ) == 0:
+        print( 'measure_cascade_pruning() - Index has no coarse histograms, run generate_index_dir.py with --full.' )
+        sys.exit(-1)
+
+    #   Use evenly spread indexed images as queries
+    queryRowArray = np.unique( np.linspace( 0, len( imageIndex ) - 1, min( options.queryNum, len( imageIndex ) ) ).astype( np.int64 ) )
+
+    mismatchNum = 0
+    binNumDict = { False : 0, True : 0 }
+    deltaTimeDict = { False : 0, True : 0 }
+
+    for queryRow in queryRowArray:
+
+        histogram = np.array( imageIndex.getHistogram( queryRow ) )
+
+        resultListDict = dict()
+        for isCascaded in ( False, True ):
+            resultListDict[ isCascaded ], reportDict, deltaTime = searchWithTimer( imageIndex, histogram, options.maxResultNum, options.minScore, isCascaded )
+            binNumDict[ isCascaded ] += reportDict[ 'binNum' ]
+            deltaTimeDict[ isCascaded ] += deltaTime
+
+        if resultListDict[ False ] != resultListDict[ True ]:
+            mismatchNum += 1
+
+    queryNum = len( queryRowArray )
+
+    print( 'Index has {} images, {} queries, maxResult = {}, minScore = {}.'.format( len( imageIndex ), queryNum, options.maxResultNum, options.minScore ) )
+    print( 'exhaustive bins per query = {:.0f}, mean query time = {:.6f} seconds'.format( binNumDict[ False ] / queryNum, deltaTimeDict[ False ] / queryNum ) )
+    print( 'cascade    bins per query = {:.0f} ({:.2%}), mean query time = {:.6f} seconds'.format( binNumDict[ True ] / queryNum, binNumDict[ True ] / max( binNumDict[ False ], 1 ), deltaTimeDict[ True ] / queryNum ) )
+    print( 'Queries with results different from exhaustive search: {}'.format( mismatchNum ) )
+
+##########################################################################
+#   RUN
+##########################################################################
+
+if __name__ == '__main__':
+    main()
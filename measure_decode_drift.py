@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+##########################################################################
+#   IMPORT
+##########################################################################
+
+import sys
+import time
+import numpy as np
+from optparse import OptionParser
+from indexer.Indexer import Indexer, DefaultWorkerNum
+from searcher.Searcher import Searcher
+
+##########################################################################
+#   GLOBAL
+##########################################################################
+
+NumRequiredArgs = 0
+ImageDir = '../image'
+DefaultMaxDecodeSize = 256
+DefaultQueryNum = 20
+DefaultMaxResultNum = 10
+
+##########################################################################
+#   HELPER
+##########################################################################
+
+def indexWithTimer( imageDir, workerNum, maxDecodeSize ):
+    ''' This function indexes given image directory and returns
+        index with elapsed time
+    '''
+
+    startTime = time.time()
+    imageIndex = Indexer.index( imageDir, workerNum, maxDecodeSize=maxDecodeSize )
+
+    return imageIndex, time.time() - startTime
+
+##########################################################################
+#   CLASS
+##########################################################################
+
+##########################################################################
+#   MAIN
+##########################################################################
+
+def main():
+
+    parser = OptionParser(usage='usage: %prog [options]',
+                            version='%prog 0.0')
+    parser.add_option( '--imgDir',
+                        action='store',
+                        dest='imgDir',
+                        default=ImageDir,
+                        help='image directory (default = {!r})'.format(ImageDir) )
+    parser.add_option( '--workers',
+                        action='store',
+                        type='int',
+                        dest='workerNum',
+                        default=DefaultWorkerNum,
+                        help='number of worker processes (default = {!r})'.format(DefaultWorkerNum) )
+    parser.add_option( '--maxDecodeSize',
+                        action='store',
+                        type='int',
+                        dest='maxDecodeSize',
+                        default=DefaultMaxDecodeSize,
+                        help='maximum decode size to compare with full resolution (default = {!r})'.format(DefaultMaxDecodeSize) )
+    parser.add_option( '--queries',
+                        action='store',
+                        type='int',
+                        dest='queryNum',
+                        default=DefaultQueryNum,
+                        help='number of indexed images used as queries (default = {!r})'.format(DefaultQueryNum) )
+    parser.add_option( '--maxResult',
+                        action='store',
+                        type='int',
+                        dest='maxResultNum',
+                        default=DefaultMaxResultNum,
+                        help='number of top results compared per query (default = {!r})'.format(DefaultMaxResultNum) )
+
+    (options, args) = parser.parse_args()
+
+    if len(args) != NumRequiredArgs:
+        parser.error('Incorrect number of arguments')
+        sys.exit(-1)
+
+    #   Index at full and at reduced resolution
+    fullImageIndex, fullDeltaTime = indexWithTimer( options.imgDir, options.workerNum, None )
+    reducedImageIndex, reducedDeltaTime = indexWithTimer( options.imgDir, options.workerNum, options.maxDecodeSize )
+
+    print( 'Indexed {} images at full resolution in {:.3f} seconds.'.format( len( fullImageIndex ), fullDeltaTime ) )
+    print( 'Indexed {} images at maximum decode size {} in {:.3f} seconds.'.format( len( reducedImageIndex ), options.maxDecodeSize, reducedDeltaTime ) )
+
+    #   Compare only images both indexes have
+    imageIdArray = np.intersect1d( fullImageIndex.imageIdArray, reducedImageIndex.imageIdArray )
+    if len( imageIdArray ) == 0:
+        print( 'No image to compare.' )
+        return
+
+    fullHistogramMatrix = fullImageIndex.histogramMatrix[ np.searchsorted( fullImageIndex.imageIdArray, imageIdArray ) ]
+    reducedHistogramMatrix = reducedImageIndex.histogramMatrix[ np.searchsorted( reducedImageIndex.imageIdArray, imageIdArray ) ]
+
+    #   Histogram drift as L1 distance per channel, from 0 to 2
+    histogramDistanceArray = np.abs( fullHistogramMatrix - reducedHistogramMatrix ).sum( axis=1 ) / 3
+
+    print( 'Histogram L1 distance per channel: mean = {:.6f}, max = {:.6f}'.format( histogramDistanceArray.mean(), histogramDistanceArray.max() ) )
+
+    #   Ranking drift, using evenly spread indexed images as queries
+    queryRowArray = np.unique( np.linspace( 0, len( imageIdArray ) - 1, min( options.queryNum, len( imageIdArray ) ) ).astype( np.int64 ) )
+
+    overlapList = list()
+    scoreDifferenceList = list()
+
+    for queryRow in queryRowArray:
+
+        fullResultList = Searcher.search( fullImageIndex, fullHistogramMatrix[ queryRow ], options.maxResultNum )
+        reducedResultList = Searcher.search( reducedImageIndex, reducedHistogramMatrix[ queryRow ], options.maxResultNum )
+
+        #   Fraction of full resolution top results also found at
+        #   reduced resolution
+        overlapList.append( len( set( imageId for imageId, _ in fullResultList ) & set( imageId for imageId, _ in reducedResultList ) ) / len( fullResultList ) )
+
+        #   Difference of scores at the same rank
+        scoreDifferenceList.extend( abs( fullScore - reducedScore ) for ( _, fullScore ), ( _, reducedScore ) in zip( fullResultList, reducedResultList ) )
+
+    print( 'Top {} overlap over {} queries: mean = {:.4f}, min = {:.4f}'.format( options.maxResultNum, len( queryRowArray ), np.mean( overlapList ), np.min( overlapList ) ) )
+    print( 'Score difference at same rank: mean = {:.6f}, max = {:.6f}'.format( np.mean( scoreDifferenceList ), np.max( scoreDifferenceList ) ) )
+
+##########################################################################
+#   RUN
+##########################################################################
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+##########################################################################
+#   IMPORT
+##########################################################################
+
+import sys
+import time
+import numpy as np
+from optparse import OptionParser
+from indexer.Indexer import Indexer
+from searcher.Searcher import Searcher
+
+##########################################################################
+#   GLOBAL
+##########################################################################
+
+NumRequiredArgs = 0
+IndexDir = 'index'
+IndexFileName = 'index.bin'
+DefaultQueryNum = 100
+DefaultMaxResultNum = 10
+DefaultSettingList = 'uint16,uint8'
+
+#   Number of images projected memory use is reported for
+ProjectedImageNum = 10000000
+
+##########################################################################
+#   HELPER
+##########################################################################
+
+def parseSetting( setting ):
+    ''' This function parses histogram setting as dtype, optionally
+        followed by colon and scale
+    '''
+
+    histogramDtype, _, histogramScale = setting.partition( ':' )
+
+    return histogramDtype, float( histogramScale ) if len( histogramScale ) > 0 else None
+
+def getHistogramByteNum( imageIndex ):
+    ''' This function returns bytes of histogram and coarse histogram
+        sections of given index
+    '''
+
+    return imageIndex.histogramMatrix.nbytes + sum( coarseHistogramMatrix.nbytes for _, coarseHistogramMatrix in imageIndex.getCoarseHistogramMatrixList() )
+
+def getScoreErrorBound( histogram, histogramScale ):
+    ''' This function returns bound of similarity error of quantized
+        histograms for given query, see Searcher.scoreIndex()
+    '''
+
+    nonEmptyBinNum = np.count_nonzero( np.asarray( histogram ).reshape( 3, -1 ), axis=1 ).max()
+
+    return 3*nonEmptyBinNum / ( 2*histogramScale )
+
+def searchWithTimer( imageIndex, histogram, maxResultNum, isCascaded ):
+    ''' This function searches index and returns results with
+        elapsed time
+    '''
+
+    startTime = time.time()
+    resultList = Searcher.search( imageIndex, histogram, maxResultNum, isCascaded=isCascaded )
+
+    return resultList, time.time() - startTime
+
+##########################################################################
+#   CLASS
+##########################################################################
+
+##########################################################################
+#   MAIN
+##########################################################################
+
+def main():
+
+    parser = OptionParser(usage='usage: %prog [options]',
+                            version='%prog 0.0')
+    parser.add_option( '--queries',
+                        action='store',
+                        type='int',
+                        dest='queryNum',
+                        default=DefaultQueryNum,
+                        help='number of indexed images used as queries (default = {!r})'.format(DefaultQueryNum) )
+    parser.add_option( '--maxResult',
+                        action='store',
+                        type='int',
+                        dest='maxResultNum',
+                        default=DefaultMaxResultNum,
+                        help='maximum number of results (default = {!r})'.format(DefaultMaxResultNum) )
+    parser.add_option( '--settings',
+                        action='store',
+                        dest='settingList',
+                        default=DefaultSettingList,
+                        help='comma separated histogram dtypes to compare, each optionally followed by colon and scale (default = {!r})'.format(DefaultSettingList) )
+
+    (options, args) = parser.parse_args()
+
+    if len(args) != NumRequiredArgs:
+        parser.error('Incorrect number of arguments')
+        sys.exit(-1)
+
+    #   Read image index, then load float histograms into memory so
+    #   every setting is measured on resident histograms
+    imageIndex = Indexer.readIndex( IndexDir, IndexFileName ).compact()
+
+    if imageIndex.getHistogramScale() is not None:
+        print( 'measure_histogram_quantization() - Index histograms are quantized, run generate_index_dir.py without --histogramDtype.' )
+        sys.exit(-1)
+
+    floatImageIndex = imageIndex.convertHistogram( 'float32' )
+
+    #   Use evenly spread indexed images as queries
+    queryRowArray = np.unique( np.linspace( 0, len( imageIndex ) - 1, min( options.queryNum, len( imageIndex ) ) ).astype( np.int64 ) )
+    histogramList = [ floatImageIndex.getHistogram( queryRow ) for queryRow in queryRowArray ]
+
+    #   Compute float results as reference
+    floatByteNum = getHistogramByteNum( floatImageIndex )
+    referenceResultList = list()
+    deltaTimeDict = { False : 0, True : 0 }
+    for histogram in histogramList:
+        for isCascaded in ( False, True ):
+            resultList, deltaTime = searchWithTimer( floatImageIndex, histogram, options.maxResultNum, isCascaded )
+            deltaTimeDict[ isCascaded ] += deltaTime
+        referenceResultList.append( resultList )
+
+    queryNum = len( queryRowArray )
+
+    print( 'Index has {} images, {} queries, maxResult = {}.'.format( len( imageIndex ), queryNum, options.maxResultNum ) )
+    print( '{:>14}: {:7.1f} bytes per image, {:7.2f} GB per {} images, exhaustive {:.6f} seconds, cascade {:.6f} seconds'.format(
+        'float32', floatByteNum / len( imageIndex ), floatByteNum / len( imageIndex )*ProjectedImageNum / 1e9, ProjectedImageNum,
+        deltaTimeDict[ False ] / queryNum, deltaTimeDict[ True ] / queryNum ) )
+
+    for setting in options.settingList.split( ',' ):
+
+        histogramDtype, histogramScale = parseSetting( setting )
+        quantizedImageIndex = floatImageIndex.convertHistogram( histogramDtype, histogramScale )
+        histogramScale = quantizedImageIndex.getHistogramScale()
+
+        byteNum = getHistogramByteNum( quantizedImageIndex )
+
+        matchNum = 0
+        maxScoreError = 0
+        maxErrorBound = 0
+        boundViolationNum = 0
+        deltaTimeDict = { False : 0, True : 0 }
+
+        for histogram, referenceList in zip( histogramList, referenceResultList ):
+
+            for isCascaded in ( False, True ):
+                resultList, deltaTime = searchWithTimer( quantizedImageIndex, histogram, options.maxResultNum, isCascaded )
+                deltaTimeDict[ isCascaded ] += deltaTime
+
+            #   Recall of float results, and error of quantized scores
+            #   against float scores of the same images
+            matchNum += len( set( imageId for imageId, _ in referenceList ) & set( imageId for imageId, _ in resultList ) )
+
+            rowArray = np.array( [ quantizedImageIndex.getRow( imageId ) for imageId, _ in resultList ], dtype=np.int64 )
+            floatScoreArray = Searcher.scoreIndex( floatImageIndex, histogram, rowArray )
+            scoreErrorArray = np.abs( np.array( [ score for _, score in resultList ] ) - floatScoreArray )
+
+            errorBound = getScoreErrorBound( histogram, histogramScale )
+            maxScoreError = max( [ maxScoreError ] + scoreErrorArray.tolist() )
+            maxErrorBound = max( maxErrorBound, errorBound )
+            boundViolationNum += int( np.count_nonzero( scoreErrorArray > errorBound ) )
+
+        print( '{:>14}: {:7.1f} bytes per image, {:7.2f} GB per {} images, exhaustive {:.6f} seconds, cascade {:.6f} seconds'.format(
+            setting, byteNum / len( imageIndex ), byteNum / len( imageIndex )*ProjectedImageNum / 1e9, ProjectedImageNum,
+            deltaTimeDict[ False ] / queryNum, deltaTimeDict[ True ] / queryNum ) )
+        print( '{:>14}  scale = {:g}, memory {:.1f}x smaller, recall@{} = {:.4f}, max score error = {:.6f}, max error bound = {:.6f}, results beyond bound = {}'.format(
+            '', histogramScale, floatByteNum / byteNum, options.maxResultNum, matchNum / max( sum( len( referenceList ) for referenceList in referenceResultList ), 1 ),
+            maxScoreError, maxErrorBound, boundViolationNum ) )
+
+##########################################################################
+#   RUN
+##########################################################################
+
+if __name__ == '__main__':
+    main()
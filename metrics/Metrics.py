@@ -0,0 +1,201 @@
+##########################################################################
+#   IMPORT
+##########################################################################
+
+import sys
+import json
+import time
+import atexit
+import pstats
+import cProfile
+import threading
+import contextlib
+from optparse import OptionParser
+from typing import Dict, Optional
+
+##########################################################################
+#   GLOBAL
+##########################################################################
+
+MetricsFileVersion = 1
+
+#   Number of functions listed in text profile report
+ProfileReportLineNum = 40
+
+##########################################################################
+#   HELPER
+##########################################################################
+
+def addMetricsOption( parser : OptionParser ):
+    ''' This function adds --metrics and --profile options of an entry
+        point, see Metrics.startRun()
+    '''
+
+    parser.add_option( '--metrics',
+                        action='store',
+                        dest='metricsFilePath',
+                        default=None,
+                        help='write stage timers and counters of this run as JSON to this file (default = none)' )
+    parser.add_option( '--profile',
+                        action='store',
+                        dest='profileFilePath',
+                        default=None,
+                        help='profile main thread of this run with cProfile, write pstats to this file and text report next to it (default = none)' )
+
+##########################################################################
+#   CLASS
+##########################################################################
+
+class Metrics(object):
+    ''' This class keeps per stage timers and counters of this process,
+        such as decode time or number of images processed, shared by
+        all threads
+
+        Recording costs a clock read and a dictionary update, so it is
+        always on. Worker processes start empty, and their metrics are
+        returned by popMetricsDict() and merged by parent process
+    '''
+
+    lock = threading.Lock()
+
+    #   Stage name to number of runs, total and maximum seconds
+    timerDict = dict()
+
+    #   Counter name to value
+    counterDict = dict()
+
+    @staticmethod
+    @contextlib.contextmanager
+    def time( stageName : str ):
+        ''' This function times enclosed block as one run of given stage,
+            a block which raises is timed too
+        '''
+
+        startTime = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            Metrics.addTime( stageName, time.perf_counter() - startTime )
+
+    @staticmethod
+    def addTime( stageName : str, seconds : float, runNum : int = 1, maxSeconds : Optional[float] = None ):
+        ''' This function adds given runs and seconds to given stage
+        '''
+
+        with Metrics.lock:
+            timer = Metrics.timerDict.setdefault( stageName, [ 0, 0.0, 0.0 ] )
+            timer[0] += runNum
+            timer[1] += seconds
+            timer[2] = max( timer[2], maxSeconds if maxSeconds is not None else seconds )
+
+    @staticmethod
+    def count( counterName : str, value : int = 1 ):
+        ''' This function adds given value to given counter
+        '''
+
+        with Metrics.lock:
+            Metrics.counterDict[ counterName ] = Metrics.counterDict.get( counterName, 0 ) + value
+
+    @staticmethod
+    def getMetricsDict() -> Dict:
+        ''' This function returns copy of timers and counters as JSON
+            ready dictionary
+        '''
+
+        with Metrics.lock:
+            return {
+                'version' : MetricsFileVersion,
+                'timers' : { stageName : { 'count' : runNum, 'totalSeconds' : totalSeconds, 'meanSeconds' : totalSeconds / max( runNum, 1 ), 'maxSeconds' : maxSeconds }
+                                for stageName, ( runNum, totalSeconds, maxSeconds ) in sorted( Metrics.timerDict.items() ) },
+                'counters' : dict( sorted( Metrics.counterDict.items() ) ),
+            }
+
+    @staticmethod
+    def reset():
+        ''' This function drops every timer and counter, it also starts
+            worker processes empty
+        '''
+
+        with Metrics.lock:
+            Metrics.timerDict = dict()
+            Metrics.counterDict = dict()
+
+    @staticmethod
+    def popMetricsDict() -> Dict:
+        ''' This function returns timers and counters, then drops them
+        '''
+
+        with Metrics.lock:
+            metricsDict = { 'timers' : Metrics.timerDict, 'counters' : Metrics.counterDict }
+            Metrics.timerDict = dict()
+            Metrics.counterDict = dict()
+
+        return metricsDict
+
+    @staticmethod
+    def merge( metricsDict : Dict ):
+        ''' This function adds timers and counters returned by
+            popMetricsDict() of another process
+        '''
+
+        for stageName, ( runNum, totalSeconds, maxSeconds ) in metricsDict[ 'timers' ].items():
+            Metrics.addTime( stageName, totalSeconds, runNum, maxSeconds )
+
+        for counterName, value in metricsDict[ 'counters' ].items():
+            Metrics.count( counterName, value )
+
+    @staticmethod
+    def getTimerReport() -> str:
+        ''' This function returns timers as text table, one stage per
+            line
+        '''
+
+        lineList = [ '{:<32} {:>8} {:>12} {:>12} {:>12}'.format( 'stage', 'count', 'total (s)', 'mean (s)', 'max (s)' ) ]
+
+        for stageName, timerDict in Metrics.getMetricsDict()[ 'timers' ].items():
+            lineList.append( '{:<32} {:>8} {:>12.6f} {:>12.6f} {:>12.6f}'.format( stageName, timerDict[ 'count' ], timerDict[ 'totalSeconds' ], timerDict[ 'meanSeconds' ], timerDict[ 'maxSeconds' ] ) )
+
+        return '\n'.join( lineList )
+
+    @staticmethod
+    def write( metricsFilePath : str ):
+        ''' This function writes timers and counters as JSON file
+        '''
+
+        with open( metricsFilePath, 'w' ) as metricsFile:
+            json.dump( Metrics.getMetricsDict(), metricsFile, indent=2 )
+
+    @staticmethod
+    def startRun( metricsFilePath : Optional[str] = None, profileFilePath : Optional[str] = None ):
+        ''' This function starts profiling main thread if profile file
+            path is given, and writes profile and metrics when process
+            exits, including by sys.exit() or KeyboardInterrupt
+
+            Profile is written as pstats file, loadable by pstats module
+            or a viewer such as snakeviz, with text report of functions
+            by cumulative time next to it
+        '''
+
+        profiler = None
+
+        if profileFilePath is not None:
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        def finishRun():
+
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats( profileFilePath )
+
+                with open( profileFilePath + '.txt', 'w' ) as reportFile:
+                    pstats.Stats( profiler, stream=reportFile ).sort_stats( 'cumulative' ).print_stats( ProfileReportLineNum )
+
+                print( 'Wrote profile to {}.'.format( profileFilePath ), file=sys.stderr )
+
+            if metricsFilePath is not None:
+                Metrics.write( metricsFilePath )
+                print( 'Wrote metrics to {}.'.format( metricsFilePath ), file=sys.stderr )
+
+        atexit.register( finishRun )
@@ -6,9 +6,19 @@
 
 import sys
 import os
+import csv
+import json
+import itertools
 from optparse import OptionParser
-from indexer.Indexer import Indexer
+from metrics.Metrics import Metrics, addMetricsOption
+from typing import List, Optional
+from indexer.Indexer import Indexer, DefaultWorkerNum
+from indexer.ImageIndex import ImageIndex
 from imageprocessor.ImageProcessor import ImageProcessor
+from searcher.Searcher import Searcher
+from searcher.QueryCache import QueryCache
+from searcher.SearchClient import SearchClient
+from searcher.ShardSearcher import ShardSearcher
 
 ##########################################################################
 #   GLOBAL
@@ -17,12 +27,103 @@ from imageprocessor.ImageProcessor import ImageProcessor
 NumRequiredArgs = 1
 
 IndexDir = 'index'
-IndexFileName = 'index.pickle'
+IndexFileName = 'index.bin'
+QueryCacheFileName = 'query_cache.pickle'
+
+#   Number of query images searched at once in batch mode
+BatchQueryNum = 64
+
+BatchFormatList = [ 'jsonl', 'csv' ]
+
+#   Number of results of each query in batch mode unless given, every
+#   result of a batch is kept until it is written, so keeping all of
+#   them grows with index size times batch size
+DefaultBatchMaxResultNum = 100
 
 ##########################################################################
 #   HELPER
 ##########################################################################
 
+def listQueryFile( queryPath : str ) -> List[str]:
+    ''' This function lists query image file paths of given directory,
+        or of given list file with one path per line
+    '''
+
+    if os.path.isdir( queryPath ):
+        return Indexer.listImageFile( queryPath )
+
+    if not os.path.exists( queryPath ):
+        raise ValueError( 'listQueryFile() - Cannot find query directory or list file at {}.'.format( queryPath ) )
+
+    with open( queryPath, 'r' ) as queryListFile:
+        return [ line.strip() for line in queryListFile if len( line.strip() ) > 0 ]
+
+def searchBatch( imageIndex : Optional[ImageIndex], queryFilePathList : List[str], outputFile, outputFormat : str, workerNum : int,
+                    maxResultNum : Optional[int], probeNum : Optional[int], minScore : Optional[float],
+                    shardSearcher : Optional[ShardSearcher] = None ):
+    ''' This function searches index for each of given query image
+        files, batch by batch while next histograms are computed by
+        workers, and writes results of each query to output file as
+        soon as its batch is searched
+
+        Each JSON line holds query file path and its results, or its
+        error, each CSV row holds one result or one error
+
+        If shard searcher is given, batches are searched by its shards
+        instead of index, and image file paths of results are looked
+        up in shards too, since index with delta log applied may no
+        longer have images shards return, index is then not used
+    '''
+
+    csvWriter = None
+    if outputFormat == 'csv':
+        csvWriter = csv.writer( outputFile )
+        csvWriter.writerow( [ 'queryFilePath', 'rank', 'imageId', 'histogramSimilarity', 'imageFilePath', 'error' ] )
+
+    #   Compute query histograms at the same resolution as the index
+    #   was computed
+    maxDecodeSize = shardSearcher.getMaxDecodeSize() if shardSearcher is not None else Indexer.getMaxDecodeSize( imageIndex )
+    histogramIterator = Indexer.iterateHistogram( queryFilePathList, workerNum, maxDecodeSize=maxDecodeSize )
+
+    while True:
+
+        batchList = list( itertools.islice( histogramIterator, BatchQueryNum ) )
+        if len( batchList ) == 0:
+            break
+
+        #   Search readable queries of batch together
+        imageHistogramList = [ histogram for _, histogram, errorMessage in batchList if errorMessage is None ]
+        if shardSearcher is not None:
+            resultListList = shardSearcher.searchBatch( imageHistogramList, maxResultNum, probeNum, minScore )
+            imageFilePathDict = shardSearcher.getImageFilePathDict( sorted( { imageId for resultList in resultListList for imageId, _ in resultList } ) )
+        else:
+            resultListList = Searcher.searchBatch( imageIndex, imageHistogramList, maxResultNum, probeNum, minScore )
+            imageFilePathDict = { imageId : imageIndex.getImageFilePath( imageIndex.getRow( imageId ) ) for resultList in resultListList for imageId, _ in resultList }
+
+        resultListIterator = iter( resultListList )
+
+        for queryFilePath, _, errorMessage in batchList:
+
+            resultList = next( resultListIterator ) if errorMessage is None else list()
+            resultDictList = [ { 'imageId' : imageId, 'histogramSimilarity' : histogramSimilarity, 'imageFilePath' : imageFilePathDict[ imageId ] }
+                                for imageId, histogramSimilarity in resultList ]
+
+            Metrics.count( 'search_index_dir.queryNum' )
+            if errorMessage is not None:
+                Metrics.count( 'search_index_dir.queryFailureNum' )
+
+            if csvWriter is not None:
+                if errorMessage is not None:
+                    csvWriter.writerow( [ queryFilePath, '', '', '', '', errorMessage ] )
+                for rank, resultDict in enumerate( resultDictList ):
+                    csvWriter.writerow( [ queryFilePath, rank, resultDict[ 'imageId' ], resultDict[ 'histogramSimilarity' ], resultDict[ 'imageFilePath' ], '' ] )
+            elif errorMessage is not None:
+                outputFile.write( json.dumps( { 'queryFilePath' : queryFilePath, 'error' : errorMessage } ) + '\n' )
+            else:
+                outputFile.write( json.dumps( { 'queryFilePath' : queryFilePath, 'results' : resultDictList } ) + '\n' )
+
+        outputFile.flush()
+
 ##########################################################################
 #   CLASS
 ##########################################################################
@@ -33,36 +134,183 @@ IndexFileName = 'index.pickle'
 
 def main():
 
-    parser = OptionParser(usage='usage: %prog [options] <image_file_path>',
+    parser = OptionParser(usage='usage: %prog [options] <image_file_path>\n       %prog [options] --batch <query_dir_or_list_file>',
                             version='%prog 0.0')
+    parser.add_option( '--maxResult',
+                        action='store',
+                        type='int',
+                        dest='maxResultNum',
+                        default=None,
+                        help='maximum number of results (default = all, {} per query with --batch)'.format( DefaultBatchMaxResultNum ) )
+    parser.add_option( '--probe',
+                        action='store',
+                        type='int',
+                        dest='probeNum',
+                        default=None,
+                        help='only compare images in this many nearest clusters of approximate nearest neighbour index (default = compare all)' )
+    parser.add_option( '--minScore',
+                        action='store',
+                        type='float',
+                        dest='minScore',
+                        default=None,
+                        help='minimum histogram similarity of results (default = none)' )
+    parser.add_option( '--noCache',
+                        dest='isCached',
+                        action='store_false',
+                        default=True,
+                        help='decode and search again instead of using results cached by previous searches or search server' )
+    parser.add_option( '--noServer',
+                        dest='isServerUsed',
+                        action='store_false',
+                        default=True,
+                        help='search locally even if search_server.py is running' )
+    parser.add_option( '--cacheStats',
+                        dest='isCacheStatsShown',
+                        action='store_true',
+                        default=False,
+                        help='print cache hit and miss counters' )
+    parser.add_option( '--batch',
+                        dest='isBatch',
+                        action='store_true',
+                        default=False,
+                        help='search every image of given directory, or every path of given list file, and stream results as JSON lines or CSV' )
+    parser.add_option( '--output',
+                        action='store',
+                        type='string',
+                        dest='outputFilePath',
+                        default=None,
+                        help='file to write batch results to (default = standard output)' )
+    parser.add_option( '--format',
+                        action='store',
+                        type='choice',
+                        choices=BatchFormatList,
+                        dest='outputFormat',
+                        default=BatchFormatList[0],
+                        help='format of batch results: {} (default = %default)'.format( ', '.join( BatchFormatList ) ) )
+    parser.add_option( '--workers',
+                        action='store',
+                        type='int',
+                        dest='workerNum',
+                        default=DefaultWorkerNum,
+                        help='number of worker processes computing batch query histograms (default = %default)' )
+    parser.add_option( '--shards',
+                        dest='isSharded',
+                        action='store_true',
+                        default=False,
+                        help='search shards split by generate_index_dir.py --shards in parallel, one process per shard, which pays off for batches since each run starts processes and reads shards again' )
+
+    addMetricsOption( parser )
 
     (options, args) = parser.parse_args()
 
+    #   Parse options
+    maxResultNum = options.maxResultNum
+    probeNum = options.probeNum
+    minScore = options.minScore
+    isCached = options.isCached
+
     if len(args) != NumRequiredArgs:
         parser.error('Incorrect number of arguments')
         sys.exit(-1)
 
+    #   Record metrics and profile of this run if asked
+    Metrics.startRun( options.metricsFilePath, options.profileFilePath )
+
+    #   Search query batch locally, query cache and search server
+    #   only serve single searches
+    if options.isBatch:
+
+        if maxResultNum is None:
+            maxResultNum = DefaultBatchMaxResultNum
+
+        queryFilePathList = listQueryFile( args[0] )
+        shardSearcher = ShardSearcher( IndexDir, IndexFileName ) if options.isSharded else None
+        imageIndex = Indexer.readIndex( IndexDir, IndexFileName ) if shardSearcher is None else None
+
+        try:
+            if options.outputFilePath is None:
+                searchBatch( imageIndex, queryFilePathList, sys.stdout, options.outputFormat, options.workerNum, maxResultNum, probeNum, minScore, shardSearcher )
+            else:
+                with open( options.outputFilePath, 'w', newline='' ) as outputFile:
+                    searchBatch( imageIndex, queryFilePathList, outputFile, options.outputFormat, options.workerNum, maxResultNum, probeNum, minScore, shardSearcher )
+        finally:
+            if shardSearcher is not None:
+                shardSearcher.close()
+
+        return
+
     imageFilePath = args[0]
 
     #   Check if given image file path exists
     if not os.path.exists( imageFilePath ):
         print( 'search_index_dir() - Cannot find image file at {}.'.format( imageFilePath ) )
 
-    #   Compute given image color histogram
-    imageHistogram = ImageProcessor.getColorHistogram( imageFilePath )
+    #   Search through running search server, which has index
+    #   loaded already
+    searchClient = SearchClient.connect( IndexDir ) if isCached and options.isServerUsed and not options.isSharded else None
+
+    if searchClient is not None:
+
+        for imageId, histogramSimilarity, resultImageFilePath in searchClient.search( imageFilePath, maxResultNum=maxResultNum, probeNum=probeNum, minScore=minScore ):
+            print('imageId = {}, histogramSimilarity = {}, imageFilePath = {}'.format(imageId, histogramSimilarity, resultImageFilePath ))
+
+        if options.isCacheStatsShown:
+            print( 'search_index_dir() - Server cache counters {}.'.format( searchClient.getStatus()[ 'cacheCounters' ] ) )
+
+        return
+
+    if options.isSharded:
+
+        #   Search every shard in parallel and merge their results,
+        #   shards also resolve image file paths of results so whole
+        #   index is not read besides them
+        shardSearcher = ShardSearcher( IndexDir, IndexFileName )
+
+        try:
+            imageHistogram = ImageProcessor.getColorHistogram( imageFilePath, shardSearcher.getMaxDecodeSize() )
+            imageIdToHistogramSimilarityTupleList = shardSearcher.search( imageHistogram, maxResultNum, probeNum, minScore )
+            imageFilePathDict = shardSearcher.getImageFilePathDict( [ imageId for imageId, _ in imageIdToHistogramSimilarityTupleList ] )
+        finally:
+            shardSearcher.close()
+
+        with Metrics.time( 'search_index_dir.printResult' ):
+
+            for imageId, histogramSimilarity in imageIdToHistogramSimilarityTupleList:
+
+                print('imageId = {}, histogramSimilarity = {}, imageFilePath = {}'.format(imageId, histogramSimilarity, imageFilePathDict[imageId] ))
+
+        return
 
     #   Read image index
     imageIdToImageDataDict = Indexer.readIndex( IndexDir, IndexFileName )
 
-    #   Compare color histogram of input image with index
-    imageIdToHistogramSimilarityTupleList = [ ( imageId, ImageProcessor.compareColorHistogram( imageHistogram, imageData.histogram ) ) for imageId, imageData in imageIdToImageDataDict.items() ]
+    if isCached:
+
+        #   Search through cache of previous searches, which drops
+        #   results of previous index versions by itself
+        queryCacheFilePath = os.path.join( IndexDir, QueryCacheFileName )
+        queryCache = QueryCache.read( queryCacheFilePath )
+        imageIdToHistogramSimilarityTupleList = queryCache.search( imageIdToImageDataDict, imageFilePath, maxResultNum, probeNum, minScore )
+        queryCache.write( queryCacheFilePath )
+
+        if options.isCacheStatsShown:
+            print( 'search_index_dir() - Cache counters {}.'.format( queryCache.getCounterDict() ) )
+
+    else:
+
+        #   Compute given image color histogram, at the same resolution
+        #   as the index was computed
+        imageHistogram = ImageProcessor.getColorHistogram( imageFilePath, Indexer.getMaxDecodeSize( imageIdToImageDataDict ) )
+
+        #   Compare color histogram of input image with index and
+        #   select most similar ones
+        imageIdToHistogramSimilarityTupleList = Searcher.search( imageIdToImageDataDict, imageHistogram, maxResultNum, probeNum, minScore )
 
-    #   Sort by color histogram similarity
-    imageIdToHistogramSimilarityTupleList.sort( key=lambda x: x[1], reverse=True )
+    with Metrics.time( 'search_index_dir.printResult' ):
 
-    for imageId, histogramSimilarity in imageIdToHistogramSimilarityTupleList:
+        for imageId, histogramSimilarity in imageIdToHistogramSimilarityTupleList:
 
-        print('imageId = {}, histogramSimilarity = {}, imageFilePath = {}'.format(imageId, histogramSimilarity, imageIdToImageDataDict[imageId].imageFilePath ))
+            print('imageId = {}, histogramSimilarity = {}, imageFilePath = {}'.format(imageId, histogramSimilarity, imageIdToImageDataDict[imageId].imageFilePath ))
 
 ##########################################################################
 #   RUN
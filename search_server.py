@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+##########################################################################
+#   IMPORT
+##########################################################################
+
+import sys
+from optparse import OptionParser
+from metrics.Metrics import Metrics, addMetricsOption
+from searcher.SearchServer import SearchServer, DefaultPort
+from searcher.SearchClient import SearchClient
+
+##########################################################################
+#   GLOBAL
+##########################################################################
+
+NumRequiredArgs = 0
+IndexDir = 'index'
+IndexFileName = 'index.bin'
+
+##########################################################################
+#   HELPER
+##########################################################################
+
+##########################################################################
+#   CLASS
+##########################################################################
+
+##########################################################################
+#   MAIN
+##########################################################################
+
+def main():
+
+    parser = OptionParser(usage='usage: %prog [options]',
+                            version='%prog 0.0')
+    parser.add_option( '--port',
+                        action='store',
+                        type='int',
+                        dest='port',
+                        default=DefaultPort,
+                        help='localhost port to listen on (default = any free port)' )
+    parser.add_option( '--debug',
+                        dest='isDebug',
+                        action='store_true',
+                        default=False,
+                        help='log every request' )
+    parser.add_option( '--reload',
+                        dest='isReloaded',
+                        action='store_true',
+                        default=False,
+                        help='tell running server to read index again, after generate_index_dir.py' )
+    parser.add_option( '--status',
+                        dest='isStatusShown',
+                        action='store_true',
+                        default=False,
+                        help='print status of running server' )
+    parser.add_option( '--stop',
+                        dest='isStopped',
+                        action='store_true',
+                        default=False,
+                        help='stop running server' )
+
+    addMetricsOption( parser )
+
+    (options, args) = parser.parse_args()
+
+    if len(args) != NumRequiredArgs:
+        parser.error('Incorrect number of arguments')
+        sys.exit(-1)
+
+    #   Record metrics and profile of this run if asked
+    Metrics.startRun( options.metricsFilePath, options.profileFilePath )
+
+    #   Send command to running server
+    if options.isReloaded or options.isStatusShown or options.isStopped:
+
+        searchClient = SearchClient.connect( IndexDir )
+
+        if searchClient is None:
+            print( 'search_server() - No search server is running for {}.'.format( IndexDir ) )
+            sys.exit(-1)
+
+        if options.isReloaded:
+            print( 'search_server() - Reloaded index version {}.'.format( searchClient.reload() ) )
+        if options.isStatusShown:
+            print( 'search_server() - Status {}.'.format( searchClient.getStatus() ) )
+        if options.isStopped:
+            searchClient.stop()
+
+        return
+
+    if SearchClient.connect( IndexDir ) is not None:
+        print( 'search_server() - Search server is already running for {}.'.format( IndexDir ) )
+        sys.exit(-1)
+
+    #   Keep index loaded and serve searches until stopped
+    searchServer = SearchServer( IndexDir, IndexFileName, port=options.port, isDebug=options.isDebug )
+
+    host, port = searchServer.httpServer.server_address[:2]
+    print( 'search_server() - Serving {} images on http://{}:{}.'.format( len( searchServer.imageIndex ), host, port ) )
+
+    try:
+        searchServer.serveForever()
+    except KeyboardInterrupt:
+        pass
+
+##########################################################################
+#   RUN
+##########################################################################
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,378 @@
+##########################################################################
+#   IMPORT
+##########################################################################
+
+import os
+import pickle
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import List, Tuple, Dict, Optional, Iterator
+from imageprocessor.ImageProcessor import ImageProcessor
+from indexer.ImageIndex import ImageIndex
+from indexer.Indexer import Indexer, getFileManifest
+from searcher.Searcher import Searcher, DefaultChunkRowNum
+from metrics.Metrics import Metrics
+
+##########################################################################
+#   GLOBAL
+##########################################################################
+
+DefaultMaxByteNum = 32 << 20
+
+#   Cache file layout version, cache file of another version is
+#   ignored
+QueryCacheFileVersion = 1
+
+#   Estimated bytes of entry key and bookkeeping
+EntryOverheadByteNum = 256
+
+##########################################################################
+#   HELPER
+##########################################################################
+
+def getFileHash( imageFilePath : str ) -> Optional[str]:
+    ''' This function returns content hash of given file, or None if
+        the file cannot be read
+    '''
+
+    fileManifest = getFileManifest( imageFilePath, isHashed=True )
+
+    return fileManifest[2] if fileManifest is not None else None
+
+##########################################################################
+#   CLASS
+##########################################################################
+
+class QueryCache(object):
+    ''' This class memoizes query histograms and search results in
+        memory, keyed by content hash of query image file so that a
+        renamed or copied image still hits, and evicts least recently
+        used entries beyond given byte size
+
+        Results are also keyed by index version and search settings,
+        results of other index versions are dropped as soon as an
+        index of new version is searched. Histograms only depend on
+        maximum decode size, so they survive index rebuilds
+
+        Cache is shared by threads, values are computed outside lock
+        so a slow query never blocks a cached one
+    '''
+
+    def __init__( self, maxByteNum : int = DefaultMaxByteNum ):
+
+        if maxByteNum < 0:
+            raise ValueError( 'QueryCache() - Invalid maximum byte number {}.'.format( maxByteNum ) )
+
+        self.maxByteNum = maxByteNum
+        self.byteNum = 0
+        self.entryDict = OrderedDict()
+        self.indexVersion = None
+        self.counterDict = { 'histogramHit' : 0, 'histogramMiss' : 0, 'resultHit' : 0, 'resultMiss' : 0 }
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def read( cacheFilePath : str, maxByteNum : int = DefaultMaxByteNum ) -> 'QueryCache':
+        ''' This function reads cache written by write(), or returns
+            an empty cache if the file does not exist or is unreadable,
+            since losing a cache only costs recomputing it
+        '''
+
+        queryCache = QueryCache( maxByteNum )
+
+        try:
+            with open( cacheFilePath, 'rb' ) as cacheFile:
+                cacheDict = pickle.load( cacheFile )
+        except ( OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError ):
+            return queryCache
+
+        if not isinstance( cacheDict, dict ) or cacheDict.get( 'version' ) != QueryCacheFileVersion:
+            return queryCache
+
+        queryCache.indexVersion = cacheDict[ 'indexVersion' ]
+        queryCache.counterDict.update( cacheDict[ 'counterDict' ] )
+
+        #   Entries are stored least recently used first, with their
+        #   overhead
+        for key, ( value, byteNum ) in cacheDict[ 'entryList' ]:
+            queryCache.put( key, value, byteNum - EntryOverheadByteNum )
+
+        return queryCache
+
+    def write( self, cacheFilePath : str ):
+        ''' This function writes entries and counters to cache file,
+            replacing existing file atomically
+        '''
+
+        with self.lock:
+            cacheDict = {
+                'version' : QueryCacheFileVersion,
+                'indexVersion' : self.indexVersion,
+                'counterDict' : dict( self.counterDict ),
+                'entryList' : list( self.entryDict.items() ),
+            }
+
+        temporaryCacheFilePath = cacheFilePath + '.tmp'
+
+        with open( temporaryCacheFilePath, 'wb' ) as cacheFile:
+            pickle.dump( cacheDict, cacheFile, protocol=pickle.HIGHEST_PROTOCOL )
+
+        os.replace( temporaryCacheFilePath, cacheFilePath )
+
+    def get( self, key : Tuple ):
+        ''' This function returns cached value of given key and marks
+            it most recently used, or None if it is not cached
+        '''
+
+        with self.lock:
+
+            if key not in self.entryDict:
+                return None
+
+            self.entryDict.move_to_end( key )
+
+            return self.entryDict[ key ][0]
+
+    def put( self, key : Tuple, value, byteNum : int ):
+        ''' This function caches value of given key and size, evicting
+            least recently used entries, value larger than the whole
+            cache is not cached
+        '''
+
+        byteNum += EntryOverheadByteNum
+
+        if byteNum > self.maxByteNum:
+            return
+
+        with self.lock:
+
+            if key in self.entryDict:
+                self.byteNum -= self.entryDict.pop( key )[1]
+
+            self.entryDict[ key ] = ( value, byteNum )
+            self.byteNum += byteNum
+
+            while self.byteNum > self.maxByteNum:
+                _, ( _, evictedByteNum ) = self.entryDict.popitem( last=False )
+                self.byteNum -= evictedByteNum
+
+    def count( self, counterName : str ):
+        ''' This function increments given hit or miss counter
+        '''
+
+        with self.lock:
+            self.counterDict[ counterName ] += 1
+
+        Metrics.count( 'querycache.' + counterName )
+
+    def getCounterDict( self ) -> Dict[str, int]:
+        ''' This function returns copy of hit and miss counters
+        '''
+
+        with self.lock:
+            return dict( self.counterDict )
+
+    def setIndexVersion( self, indexVersion : Optional[str] ):
+        ''' This function drops results of index versions other than
+            given one
+        '''
+
+        with self.lock:
+
+            if indexVersion == self.indexVersion:
+                return
+
+            for key in [ key for key in self.entryDict.keys() if key[0] == 'result' ]:
+                self.byteNum -= self.entryDict.pop( key )[1]
+
+            self.indexVersion = indexVersion
+
+    def getContentColorHistogram( self, contentHash : str, maxDecodeSize : Optional[int], histogramFunc ) -> np.ndarray:
+        ''' This function returns color histogram of image content of
+            given hash, from cache if the same content was seen, or
+            computed by given function
+        '''
+
+        key = ( 'histogram', contentHash, maxDecodeSize )
+
+        histogram = self.get( key )
+        if histogram is not None:
+            self.count( 'histogramHit' )
+            return histogram
+
+        self.count( 'histogramMiss' )
+
+        #   Keep full precision, so cached histogram gives the same
+        #   results as a decoded one
+        histogram = np.array( histogramFunc(), dtype=np.float64 )
+        histogram.setflags( write=False )
+
+        self.put( key, histogram, histogram.nbytes )
+
+        return histogram
+
+    def getColorHistogram( self, imageFilePath : str, maxDecodeSize : Optional[int] = None, fileHash : Optional[str] = None ) -> np.ndarray:
+        ''' This function returns color histogram of given image file
+            as ImageProcessor.getColorHistogram() does, from cache if
+            an image of the same content was seen
+        '''
+
+        if fileHash is None:
+            fileHash = getFileHash( imageFilePath )
+
+        #   Unreadable file is left to raise its usual error
+        if fileHash is None:
+            return ImageProcessor.getColorHistogram( imageFilePath, maxDecodeSize )
+
+        return self.getContentColorHistogram( fileHash, maxDecodeSize, lambda: ImageProcessor.getColorHistogram( imageFilePath, maxDecodeSize ) )
+
+    def getBytesColorHistogram( self, imageBytes : bytes, maxDecodeSize : Optional[int] = None, contentHash : Optional[str] = None ) -> np.ndarray:
+        ''' This function returns color histogram of given encoded image
+            as ImageProcessor.getBytesColorHistogram() does, sharing
+            cache with image files of the same content
+        '''
+
+        if contentHash is None:
+            contentHash = hashlib.sha256( imageBytes ).hexdigest()
+
+        return self.getContentColorHistogram( contentHash, maxDecodeSize, lambda: ImageProcessor.getBytesColorHistogram( imageBytes, maxDecodeSize ) )
+
+    def getResultKey( self, imageIdToImageDataDict : Dict, contentHash : Optional[str], maxResultNum : Optional[int],
+                        probeNum : Optional[int], minScore : Optional[float] ) -> Optional[Tuple]:
+        ''' This function returns cache key of results of given search,
+            or None if they are not cached, which is the case of content
+            without hash or index without version, such as an in-memory
+            one
+        '''
+
+        indexVersion = imageIdToImageDataDict.version if isinstance( imageIdToImageDataDict, ImageIndex ) else None
+
+        if contentHash is None or indexVersion is None:
+            return None
+
+        self.setIndexVersion( indexVersion )
+
+        return ( 'result', indexVersion, contentHash, maxResultNum, probeNum, minScore )
+
+    def getResult( self, key : Tuple ) -> Optional[List[Tuple[int, float]]]:
+        ''' This function returns cached results of given key and counts
+            hit or miss
+        '''
+
+        resultTuple = self.get( key )
+        if resultTuple is None:
+            self.count( 'resultMiss' )
+            return None
+
+        self.count( 'resultHit' )
+        imageIdArray, scoreArray = resultTuple
+
+        return list( zip( imageIdArray.tolist(), scoreArray.tolist() ) )
+
+    def putResult( self, key : Tuple, resultList : List[Tuple[int, float]] ):
+        ''' This function caches given results of given key
+        '''
+
+        #   Keep results as arrays, which are much smaller than a list
+        #   of tuples and convert back exactly
+        imageIdArray = np.array( [ imageId for imageId, _ in resultList ], dtype=np.int64 )
+        scoreArray = np.array( [ score for _, score in resultList ], dtype=np.float64 )
+        self.put( key, ( imageIdArray, scoreArray ), imageIdArray.nbytes + scoreArray.nbytes )
+
+    def searchContent( self, imageIdToImageDataDict : Dict, contentHash : Optional[str], histogramFunc, maxResultNum : Optional[int] = None,
+                        probeNum : Optional[int] = None, minScore : Optional[float] = None ) -> List[Tuple[int, float]]:
+        ''' This function searches index for images most similar to
+            image content of given hash as Searcher.search() does, from
+            cache if the same search was done on the same index version,
+            otherwise query histogram is computed by given function of
+            maximum decode size
+
+            Results of content without hash or index without version,
+            such as an in-memory one, are not cached
+        '''
+
+        key = self.getResultKey( imageIdToImageDataDict, contentHash, maxResultNum, probeNum, minScore )
+
+        if key is not None:
+            resultList = self.getResult( key )
+            if resultList is not None:
+                return resultList
+
+        #   Compute histogram at the same resolution as the index was
+        #   computed
+        imageHistogram = histogramFunc( Indexer.getMaxDecodeSize( imageIdToImageDataDict ) )
+
+        resultList = Searcher.search( imageIdToImageDataDict, imageHistogram, maxResultNum, probeNum, minScore )
+
+        if key is not None:
+            self.putResult( key, resultList )
+
+        return resultList
+
+    def iterateSearchContent( self, imageIdToImageDataDict : Dict, contentHash : Optional[str], histogramFunc, maxResultNum : Optional[int] = None,
+                                probeNum : Optional[int] = None, minScore : Optional[float] = None,
+                                chunkRowNum : Optional[int] = DefaultChunkRowNum ) -> Iterator[Tuple[List[Tuple[int, float]], float]]:
+        ''' This function searches index as searchContent() does, but
+            yields results so far with fraction of candidates compared
+            as Searcher.iterateSearch() does, cached results are yielded
+            once as complete
+
+            Results are only cached once search is complete, so search
+            cancelled by not iterating further caches nothing
+        '''
+
+        key = self.getResultKey( imageIdToImageDataDict, contentHash, maxResultNum, probeNum, minScore )
+
+        if key is not None:
+            resultList = self.getResult( key )
+            if resultList is not None:
+                yield resultList, 1.0
+                return
+
+        imageHistogram = histogramFunc( Indexer.getMaxDecodeSize( imageIdToImageDataDict ) )
+
+        for resultList, comparedFraction in Searcher.iterateSearch( imageIdToImageDataDict, imageHistogram, maxResultNum, probeNum, minScore,
+                                                                        chunkRowNum=chunkRowNum ):
+
+            if key is not None and comparedFraction >= 1.0:
+                self.putResult( key, resultList )
+
+            yield resultList, comparedFraction
+
+    def search( self, imageIdToImageDataDict : Dict, imageFilePath : str, maxResultNum : Optional[int] = None,
+                probeNum : Optional[int] = None, minScore : Optional[float] = None ) -> List[Tuple[int, float]]:
+        ''' This function searches index for images most similar to
+            given image file, see searchContent()
+        '''
+
+        fileHash = getFileHash( imageFilePath )
+
+        return self.searchContent( imageIdToImageDataDict, fileHash,
+                                    lambda maxDecodeSize: self.getColorHistogram( imageFilePath, maxDecodeSize, fileHash ),
+                                    maxResultNum, probeNum, minScore )
+
+    def searchBytes( self, imageIdToImageDataDict : Dict, imageBytes : bytes, maxResultNum : Optional[int] = None,
+                        probeNum : Optional[int] = None, minScore : Optional[float] = None ) -> List[Tuple[int, float]]:
+        ''' This function searches index for images most similar to
+            given encoded image, see searchContent()
+        '''
+
+        contentHash = hashlib.sha256( imageBytes ).hexdigest()
+
+        return self.searchContent( imageIdToImageDataDict, contentHash,
+                                    lambda maxDecodeSize: self.getBytesColorHistogram( imageBytes, maxDecodeSize, contentHash ),
+                                    maxResultNum, probeNum, minScore )
+
+    def iterateSearch( self, imageIdToImageDataDict : Dict, imageFilePath : str, maxResultNum : Optional[int] = None,
+                        probeNum : Optional[int] = None, minScore : Optional[float] = None,
+                        chunkRowNum : Optional[int] = DefaultChunkRowNum ) -> Iterator[Tuple[List[Tuple[int, float]], float]]:
+        ''' This function searches index for images most similar to
+            given image file progressively, see iterateSearchContent()
+        '''
+
+        fileHash = getFileHash( imageFilePath )
+
+        return self.iterateSearchContent( imageIdToImageDataDict, fileHash,
+                                            lambda maxDecodeSize: self.getColorHistogram( imageFilePath, maxDecodeSize, fileHash ),
+                                            maxResultNum, probeNum, minScore, chunkRowNum )
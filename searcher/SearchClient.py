@@ -0,0 +1,127 @@
+##########################################################################
+#   IMPORT
+##########################################################################
+
+import os
+import json
+import http.client
+import urllib.parse
+from typing import List, Tuple, Dict, Optional
+from searcher.SearchServer import ServerFileName, JsonContentType
+
+##########################################################################
+#   GLOBAL
+##########################################################################
+
+#   Seconds to wait for server, searching a large index may take a
+#   while
+DefaultTimeout = 600
+
+#   Seconds to wait for server when checking if it is running
+ConnectTimeout = 2
+
+##########################################################################
+#   HELPER
+##########################################################################
+
+##########################################################################
+#   CLASS
+##########################################################################
+
+class SearchClient(object):
+    ''' This class sends requests to search server, see SearchServer
+    '''
+
+    def __init__( self, host : str, port : int, timeout : float = DefaultTimeout ):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    @staticmethod
+    def connect( indexDir : str, timeout : float = DefaultTimeout ) -> Optional['SearchClient']:
+        ''' This function returns client of search server serving
+            given index directory, or None if no server is running
+        '''
+
+        serverFilePath = os.path.join( indexDir, ServerFileName )
+
+        try:
+            with open( serverFilePath, 'r' ) as serverFile:
+                serverDict = json.load( serverFile )
+        except ( OSError, ValueError ):
+            return None
+
+        searchClient = SearchClient( serverDict[ 'host' ], serverDict[ 'port' ], timeout )
+
+        #   Server file is left behind if server was killed, and its
+        #   port may since be used by another service
+        try:
+            statusDict = searchClient.request( 'GET', '/status', timeout=ConnectTimeout )
+        except ( OSError, ValueError, http.client.HTTPException ):
+            return None
+
+        if not isinstance( statusDict, dict ) or 'indexVersion' not in statusDict:
+            return None
+
+        return searchClient
+
+    def request( self, method : str, path : str, body : Optional[bytes] = None, contentType : Optional[str] = None,
+                    timeout : Optional[float] = None ) -> Dict:
+        ''' This function sends request and returns JSON response,
+            error reported by server is raised as ValueError
+        '''
+
+        connection = http.client.HTTPConnection( self.host, self.port, timeout=timeout if timeout is not None else self.timeout )
+
+        try:
+            headerDict = { 'Content-Type' : contentType } if contentType is not None else dict()
+            connection.request( method, path, body, headerDict )
+            response = connection.getresponse()
+            responseDict = json.loads( response.read().decode( 'utf-8' ) )
+        finally:
+            connection.close()
+
+        if response.status != 200:
+            raise ValueError( 'request() - Search server error, {}'.format( responseDict.get( 'error' ) ) )
+
+        return responseDict
+
+    def search( self, imageFilePath : Optional[str] = None, imageBytes : Optional[bytes] = None, maxResultNum : Optional[int] = None,
+                probeNum : Optional[int] = None, minScore : Optional[float] = None ) -> List[Tuple[int, float, str]]:
+        ''' This function searches index for images most similar to
+            given image file or image bytes, and returns list of image
+            id, histogram similarity and image file path tuple
+        '''
+
+        settingDict = { 'maxResult' : maxResultNum, 'probe' : probeNum, 'minScore' : minScore }
+        settingDict = { key : value for key, value in settingDict.items() if value is not None }
+
+        if imageBytes is not None:
+            responseDict = self.request( 'POST', '/search?' + urllib.parse.urlencode( settingDict ), imageBytes, 'application/octet-stream' )
+        else:
+
+            #   Server may run in another directory
+            settingDict[ 'imageFilePath' ] = os.path.abspath( imageFilePath )
+            responseDict = self.request( 'POST', '/search', json.dumps( settingDict ).encode( 'utf-8' ), JsonContentType )
+
+        return [ ( resultDict[ 'imageId' ], resultDict[ 'histogramSimilarity' ], resultDict[ 'imageFilePath' ] ) for resultDict in responseDict[ 'results' ] ]
+
+    def reload( self ) -> str:
+        ''' This function tells server to read index file again and
+            returns new index version
+        '''
+
+        return self.request( 'POST', '/reload' )[ 'indexVersion' ]
+
+    def getStatus( self ) -> Dict:
+        ''' This function returns server index version, image number
+            and cache counters
+        '''
+
+        return self.request( 'GET', '/status' )
+
+    def stop( self ):
+        ''' This function tells server to stop
+        '''
+
+        self.request( 'POST', '/stop' )
@@ -0,0 +1,224 @@
+##########################################################################
+#   IMPORT
+##########################################################################
+
+import os
+import json
+import threading
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Optional
+from indexer.Indexer import Indexer
+from indexer.IndexFile import writeJsonFile
+from searcher.QueryCache import QueryCache, DefaultMaxByteNum
+
+##########################################################################
+#   GLOBAL
+##########################################################################
+
+#   Server only listens on loopback, it reads any image path it is
+#   given
+DefaultHost = '127.0.0.1'
+
+#   Port 0 lets system pick a free port, which is written to server
+#   file for clients
+DefaultPort = 0
+
+ServerFileName = 'search_server.json'
+
+JsonContentType = 'application/json'
+
+##########################################################################
+#   HELPER
+##########################################################################
+
+def getOptionalValue( valueDict : Dict, key : str, valueType ):
+    ''' This function converts value of given key to given type, or
+        returns None if it is missing
+    '''
+
+    value = valueDict.get( key )
+
+    return valueType( value ) if value is not None else None
+
+##########################################################################
+#   CLASS
+##########################################################################
+
+class SearchRequestHandler( BaseHTTPRequestHandler ):
+    ''' This class handles one HTTP request to search server, every
+        request runs on its own thread
+
+        GET /status returns index and cache status, POST /search
+        searches an image given as JSON object with image file path
+        or as raw image bytes with settings in query string, POST
+        /reload reads index file again and POST /stop stops server
+    '''
+
+    def do_GET( self ):
+
+        if urllib.parse.urlsplit( self.path ).path == '/status':
+            self.sendJson( 200, self.server.searchServer.getStatus() )
+        else:
+            self.sendJson( 404, { 'error' : 'Unknown path {}.'.format( self.path ) } )
+
+    def do_POST( self ):
+
+        searchServer = self.server.searchServer
+        splitPath = urllib.parse.urlsplit( self.path )
+
+        try:
+            body = self.rfile.read( int( self.headers.get( 'Content-Length', 0 ) ) )
+
+            if splitPath.path == '/search':
+
+                #   Settings come with image file path in JSON body, or
+                #   in query string next to raw image bytes
+                if self.headers.get( 'Content-Type', '' ).startswith( JsonContentType ):
+                    self.sendJson( 200, searchServer.search( json.loads( body.decode( 'utf-8' ) ) ) )
+                else:
+                    requestDict = { key : valueList[-1] for key, valueList in urllib.parse.parse_qs( splitPath.query ).items() }
+                    self.sendJson( 200, searchServer.search( requestDict, body ) )
+
+            elif splitPath.path == '/reload':
+                self.sendJson( 200, { 'indexVersion' : searchServer.reload() } )
+
+            elif splitPath.path == '/stop':
+                self.sendJson( 200, dict() )
+                searchServer.stop()
+
+            else:
+                self.sendJson( 404, { 'error' : 'Unknown path {}.'.format( self.path ) } )
+
+        #   Report bad request, such as missing image, to client
+        #   instead of dropping connection
+        except Exception as e:
+            self.sendJson( 400, { 'error' : '{}: {}'.format( type(e).__name__, e ) } )
+
+    def sendJson( self, statusCode : int, valueDict : Dict ):
+        ''' This function sends given dictionary as JSON response
+        '''
+
+        body = json.dumps( valueDict ).encode( 'utf-8' )
+
+        self.send_response( statusCode )
+        self.send_header( 'Content-Type', JsonContentType )
+        self.send_header( 'Content-Length', str( len( body ) ) )
+        self.end_headers()
+        self.wfile.write( body )
+
+    def log_message( self, format, *args ):
+
+        if self.server.searchServer.isDebug:
+            BaseHTTPRequestHandler.log_message( self, format, *args )
+
+class SearchServer(object):
+    ''' This class keeps index loaded and answers search requests
+        over HTTP on localhost, so that each query does not pay for
+        starting Python and reading index
+
+        Requests are served concurrently, each one searches the index
+        it started with, so reloading swaps index without waiting for
+        or disturbing requests in progress
+    '''
+
+    def __init__( self, indexDir : str, indexFileName : str, host : str = DefaultHost, port : int = DefaultPort,
+                    maxCacheByteNum : int = DefaultMaxByteNum, isDebug : bool = False ):
+        self.indexDir = indexDir
+        self.indexFileName = indexFileName
+        self.isDebug = isDebug
+        self.queryCache = QueryCache( maxCacheByteNum )
+        self.reloadLock = threading.Lock()
+        self.imageIndex = None
+
+        self.reload()
+
+        self.httpServer = ThreadingHTTPServer( ( host, port ), SearchRequestHandler )
+        self.httpServer.daemon_threads = True
+        self.httpServer.searchServer = self
+
+    def reload( self ) -> str:
+        ''' This function reads index file again and returns its
+            version, cached results of previous version are dropped
+            by query cache once new version is searched
+        '''
+
+        #   Concurrent reloads read one at a time, so the last one
+        #   read is the one kept
+        with self.reloadLock:
+            imageIndex = Indexer.readIndex( self.indexDir, self.indexFileName )
+            self.imageIndex = imageIndex
+
+        if self.isDebug:
+            print( 'reload() - Read index version {} with {} images.'.format( imageIndex.version, len( imageIndex ) ) )
+
+        return imageIndex.version
+
+    def search( self, requestDict : Dict, imageBytes : Optional[bytes] = None ) -> Dict:
+        ''' This function searches index for image given by image file
+            path in request, or by given image bytes, and returns JSON
+            ready results with their image file paths
+        '''
+
+        #   Hold on to current index, reload may replace it meanwhile
+        imageIndex = self.imageIndex
+
+        maxResultNum = getOptionalValue( requestDict, 'maxResult', int )
+        probeNum = getOptionalValue( requestDict, 'probe', int )
+        minScore = getOptionalValue( requestDict, 'minScore', float )
+
+        if imageBytes is not None and len( imageBytes ) > 0:
+            resultList = self.queryCache.searchBytes( imageIndex, imageBytes, maxResultNum, probeNum, minScore )
+        elif 'imageFilePath' in requestDict:
+            resultList = self.queryCache.search( imageIndex, requestDict[ 'imageFilePath' ], maxResultNum, probeNum, minScore )
+        else:
+            raise ValueError( 'search() - Request has neither image file path nor image bytes.' )
+
+        return {
+            'indexVersion' : imageIndex.version,
+            'results' : [ { 'imageId' : imageId, 'histogramSimilarity' : histogramSimilarity, 'imageFilePath' : imageIndex.getImageFilePath( imageIndex.getRow( imageId ) ) }
+                            for imageId, histogramSimilarity in resultList ],
+        }
+
+    def getStatus( self ) -> Dict:
+        ''' This function returns index version, image number and
+            cache counters
+        '''
+
+        imageIndex = self.imageIndex
+
+        return {
+            'indexVersion' : imageIndex.version,
+            'imageNum' : len( imageIndex ),
+            'cacheCounters' : self.queryCache.getCounterDict(),
+        }
+
+    def getServerFilePath( self ) -> str:
+        ''' This function returns path of server file of index
+            directory
+        '''
+
+        return os.path.join( self.indexDir, ServerFileName )
+
+    def serveForever( self ):
+        ''' This function writes server address to server file inside
+            index directory, then serves requests until stopped
+        '''
+
+        host, port = self.httpServer.server_address[:2]
+
+        writeJsonFile( self.getServerFilePath(), { 'host' : host, 'port' : port, 'pid' : os.getpid() } )
+
+        try:
+            self.httpServer.serve_forever()
+        finally:
+            self.httpServer.server_close()
+            if os.path.exists( self.getServerFilePath() ):
+                os.remove( self.getServerFilePath() )
+
+    def stop( self ):
+        ''' This function stops serving, it may be called from a
+            request thread since it does not wait for serving to end
+        '''
+
+        threading.Thread( target=self.httpServer.shutdown ).start()
@@ -0,0 +1,570 @@
+##########################################################################
+#   IMPORT
+##########################################################################
+
+import numpy as np
+from typing import List, Tuple, Dict, Optional, Iterator
+from imageprocessor.ImageProcessor import ImageProcessor
+from indexer.ImageIndex import ImageIndex, DeltaImageIndex
+from indexer.AnnIndex import AnnIndex
+from indexer.SparseHistogramMatrix import SparseHistogramMatrix
+from metrics.Metrics import Metrics
+
+##########################################################################
+#   GLOBAL
+##########################################################################
+
+#   Number of histogram bins compared at once, it keeps
+#   intermediate intersection matrix small enough to stay in cache
+DefaultBlockBinNum = 256*768
+
+#   Coarse histogram bound is kept with this much slack below score
+#   threshold, covering float32 rounding of sums in different order
+CascadeBoundTolerance = 1e-5
+
+#   Fewer candidates than this are compared directly, since bounds
+#   cost more than they save on them
+CascadeMinRowNum = 4096
+
+#   Number of queries of a batch compared with each block of rows,
+#   so a block is read into cache once for all of them
+BatchBlockQueryNum = 8
+
+#   Number of rows of a batch scored before merging them into top
+#   results of each query, it bounds memory of batch scores
+BatchSegmentRowNum = 1 << 16
+
+#   Number of candidates compared before results so far are yielded
+#   by progressive search
+DefaultChunkRowNum = 1 << 14
+
+##########################################################################
+#   HELPER
+##########################################################################
+
+def selectTopRows( scoreArray : np.ndarray, maxResultNum : Optional[int] = None ) -> np.ndarray:
+    ''' This function returns rows of highest scores in descending
+        score order, tied scores are ordered by row as a stable
+        full sort would order them
+    '''
+
+    rowNum = len( scoreArray )
+
+    if maxResultNum is None or maxResultNum > rowNum:
+        maxResultNum = rowNum
+
+    if maxResultNum <= 0:
+        return np.zeros( 0, dtype=np.int64 )
+
+    #   Partially select top rows instead of sorting all of them,
+    #   then take every row tied with the lowest selected score so
+    #   that tie order does not depend on partition
+    if maxResultNum < rowNum:
+        partitionRowArray = np.argpartition( -scoreArray, maxResultNum - 1 )[:maxResultNum]
+        candidateRowArray = np.flatnonzero( scoreArray >= scoreArray[ partitionRowArray ].min() )
+    else:
+        candidateRowArray = np.arange( rowNum )
+
+    #   Sort candidates by descending score, then by ascending row
+    order = np.lexsort( ( candidateRowArray, -scoreArray[ candidateRowArray ] ) )
+
+    return candidateRowArray[ order[:maxResultNum] ]
+
+def quantizeQueryHistogram( imageIndex : ImageIndex, imageHistogram ) -> Tuple[np.ndarray, float]:
+    ''' This function converts given histogram to bins of the same
+        kind as index histograms, and returns it with factor which
+        scales their similarity back to histogram similarity
+    '''
+
+    histogramScale = imageIndex.getHistogramScale()
+
+    if histogramScale is None:
+        return np.asarray( imageHistogram, dtype=imageIndex.histogramMatrix.dtype ), 1.0
+
+    return ImageProcessor.quantizeColorHistogram( imageHistogram, histogramScale, imageIndex.histogramMatrix.dtype ), 1.0 / histogramScale**3
+
+def mergeResultList( resultListList : List[List[Tuple[int, float]]], maxResultNum : Optional[int] ) -> List[Tuple[int, float]]:
+    ''' This function merges top results of every part of an index,
+        such as shards, into top results of whole index, tied scores
+        are ordered by image id as rows of whole index are
+    '''
+
+    resultList = sorted( ( result for resultList in resultListList for result in resultList ), key=lambda result: ( -result[1], result[0] ) )
+
+    return resultList[:maxResultNum] if maxResultNum is not None else resultList
+
+##########################################################################
+#   CLASS
+##########################################################################
+
+class Searcher(object):
+
+    @staticmethod
+    def scoreMatrix( histogramMatrix : np.ndarray, histogram, rowArray : Optional[np.ndarray] = None,
+                        isReproducible : bool = True, blockBinNum : int = DefaultBlockBinNum ) -> np.ndarray:
+        ''' This function computes color histogram similarity of given
+            histogram with every row of histogram matrix, or only with
+            given rows, block by block
+
+            Sparse histogram matrix is compared on its stored bins only,
+            with blocks of as many stored bins, and is always
+            reproducible, see SparseHistogramMatrix
+        '''
+
+        #   Convert histogram once instead of once per block
+        histogram = np.asarray( histogram, dtype=histogramMatrix.dtype )
+
+        rowNum = len( histogramMatrix ) if rowArray is None else len( rowArray )
+        isSparse = isinstance( histogramMatrix, SparseHistogramMatrix )
+
+        if isSparse:
+            blockRowNum = max( 1, int( blockBinNum*len( histogramMatrix ) // max( histogramMatrix.getStoredBinNum(), 1 ) ) )
+        else:
+            blockRowNum = max( 1, blockBinNum // histogramMatrix.shape[1] )
+
+        scoreArray = np.zeros( rowNum, dtype=np.float64 )
+
+        for startRow in range( 0, rowNum, blockRowNum ):
+            endRow = startRow + blockRowNum
+
+            if rowArray is None:
+                histogramBlock = histogramMatrix[ startRow:endRow ]
+            elif isSparse:
+                histogramBlock = histogramMatrix.selectRows( rowArray[ startRow:endRow ] )
+            else:
+                histogramBlock = histogramMatrix[ rowArray[ startRow:endRow ] ]
+
+            if isSparse:
+                scoreArray[ startRow:endRow ] = ImageProcessor.compareColorHistogramSparse( histogram, histogramBlock.offsetArray, histogramBlock.binArray, histogramBlock.valueArray )
+            else:
+                scoreArray[ startRow:endRow ] = ImageProcessor.compareColorHistogramMatrix( histogram, histogramBlock, isReproducible )
+
+        return scoreArray
+
+    @staticmethod
+    def scoreBatchMatrix( histogramMatrix : np.ndarray, queryHistogramMatrix, blockBinNum : int = DefaultBlockBinNum ) -> np.ndarray:
+        ''' This function computes color histogram similarity of every
+            row of query histogram matrix with every row of histogram
+            matrix, block of rows by block of queries, and returns
+            matrix of scores of each query and row
+        '''
+
+        #   Convert queries once instead of once per block
+        queryHistogramMatrix = np.asarray( queryHistogramMatrix, dtype=histogramMatrix.dtype )
+
+        #   Stored bins of sparse rows are few enough to be compared
+        #   query by query
+        if isinstance( histogramMatrix, SparseHistogramMatrix ):
+            return np.array( [ Searcher.scoreMatrix( histogramMatrix, queryHistogram, blockBinNum=blockBinNum ) for queryHistogram in queryHistogramMatrix ] ).reshape( len( queryHistogramMatrix ), len( histogramMatrix ) )
+
+        queryNum = len( queryHistogramMatrix )
+        rowNum = len( histogramMatrix )
+        blockQueryNum = max( 1, min( BatchBlockQueryNum, queryNum ) )
+        blockRowNum = max( 1, blockBinNum // ( blockQueryNum*histogramMatrix.shape[1] ) )
+
+        scoreMatrix = np.zeros( ( queryNum, rowNum ), dtype=np.float64 )
+
+        for startRow in range( 0, rowNum, blockRowNum ):
+            endRow = startRow + blockRowNum
+            histogramBlock = histogramMatrix[ startRow:endRow ]
+
+            for startQuery in range( 0, queryNum, blockQueryNum ):
+                endQuery = startQuery + blockQueryNum
+                scoreMatrix[ startQuery:endQuery, startRow:endRow ] = ImageProcessor.compareColorHistogramBatch( queryHistogramMatrix[ startQuery:endQuery ], histogramBlock )
+
+        return scoreMatrix
+
+    @staticmethod
+    def scoreIndex( imageIndex : ImageIndex, imageHistogram : Tuple[float], rowArray : Optional[np.ndarray] = None ) -> np.ndarray:
+        ''' This function computes color histogram similarity of given
+            histogram with every image in index, or only with images
+            at given rows
+
+            If index histograms are quantized, query histogram is
+            quantized the same way and similarity is computed on
+            integers, each bin of both is then off by at most half
+            over scale, so similarity differs from float histograms
+            by at most 3*n/(2*scale), n being the largest number of
+            non-empty query bins in a channel, unless bins saturate
+        '''
+
+        queryHistogram, scoreFactor = quantizeQueryHistogram( imageIndex, imageHistogram )
+
+        return Searcher.scoreMatrix( imageIndex.histogramMatrix, queryHistogram, rowArray )*scoreFactor
+
+    @staticmethod
+    def pruneCandidateRows( imageIndex : ImageIndex, imageHistogram : Tuple[float], candidateRowArray : Optional[np.ndarray],
+                            maxResultNum : Optional[int], minScore : Optional[float], reportDict : Dict ) -> Optional[np.ndarray]:
+        ''' This function drops candidate rows, or all rows if None,
+            which cannot be in top results or reach minimum score
+
+            Similarity on coarse histograms is an upper bound of the
+            full one, since intersection of merged bins is at least
+            the sum of intersections of its bins, so a row whose
+            bound is below a score already reached is dropped, level
+            by level of coarse histogram pyramid
+        '''
+
+        threshold = minScore if minScore is not None else -np.inf
+
+        #   Coarse histograms of quantized index are merged from
+        #   quantized bins and divided, so query is merged the same way
+        #   and bound is multiplied back. Query bins saturate above
+        #   every index bin, which leaves their intersection unchanged
+        queryHistogram, scoreFactor = quantizeQueryHistogram( imageIndex, imageHistogram )
+        coarseHistogramDivisor = imageIndex.getCoarseHistogramDivisor()
+
+        for level, ( coarseBinNum, coarseHistogramMatrix ) in enumerate( imageIndex.getCoarseHistogramMatrixList() ):
+
+            coarseHistogram = ImageProcessor.getCoarseColorHistogram( queryHistogram, coarseBinNum, coarseHistogramMatrix.dtype, coarseHistogramDivisor )
+            #   Bound only needs to be within tolerance, so it is
+            #   computed the faster way
+            boundArray = Searcher.scoreMatrix( coarseHistogramMatrix, coarseHistogram, candidateRowArray, isReproducible=False )*( scoreFactor*coarseHistogramDivisor**3 )
+
+            reportDict[ 'binNum' ] += len( boundArray )*coarseHistogramMatrix.shape[1]
+
+            #   Raise threshold to full score of rows with highest
+            #   bounds, the k-th of them is reached by top results
+            if maxResultNum is not None and 0 < maxResultNum <= len( boundArray ):
+
+                seedPositionArray = selectTopRows( boundArray, maxResultNum )
+                seedRowArray = seedPositionArray if candidateRowArray is None else candidateRowArray[ seedPositionArray ]
+                seedScoreArray = Searcher.scoreIndex( imageIndex, imageHistogram, seedRowArray )
+
+                reportDict[ 'binNum' ] += len( seedScoreArray )*imageIndex.histogramMatrix.shape[1]
+
+                if len( seedScoreArray ) == maxResultNum:
+                    threshold = max( threshold, seedScoreArray.min() )
+
+            #   Keep rows whose bound can still reach threshold
+            keptPositionArray = np.flatnonzero( boundArray >= threshold - CascadeBoundTolerance )
+            candidateRowArray = keptPositionArray if candidateRowArray is None else candidateRowArray[ keptPositionArray ]
+
+        return candidateRowArray
+
+    @staticmethod
+    def search( imageIdToImageDataDict : Dict, imageHistogram : Tuple[float], maxResultNum : Optional[int] = None,
+                probeNum : Optional[int] = None, minScore : Optional[float] = None, isCascaded : bool = True,
+                reportDict : Optional[Dict] = None ) -> List[Tuple[int, float]]:
+        ''' This function searches index for images most similar to
+            given color histogram and returns list of image id and
+            histogram similarity tuple sorted by similarity, limited
+            by maximum result number and minimum score if given
+
+            If probe number is given and index has approximate nearest
+            neighbour sections, only images in that many nearest
+            clusters are compared, otherwise the whole index is
+
+            If cascaded and index has coarse histograms, images which
+            cannot be in results are dropped using coarse histograms
+            first, results are identical to comparing every image
+
+            Numbers of compared bins and fully compared images are
+            added to report if given
+        '''
+
+        if isinstance( imageIdToImageDataDict, DeltaImageIndex ):
+            return Searcher.searchDelta( imageIdToImageDataDict, imageHistogram, maxResultNum, probeNum, minScore, isCascaded, reportDict )
+
+        if reportDict is None:
+            reportDict = dict()
+
+        reportDict.setdefault( 'binNum', 0 )
+        reportDict.setdefault( 'rowNum', 0 )
+        previousBinNum, previousRowNum = reportDict[ 'binNum' ], reportDict[ 'rowNum' ]
+
+        #   Convert dictionary of image data to columnar image index
+        if isinstance( imageIdToImageDataDict, ImageIndex ):
+            imageIndex = imageIdToImageDataDict
+        else:
+            imageIndex = ImageIndex.fromImageDataDict( imageIdToImageDataDict )
+
+        #   Find candidate rows of nearest clusters
+        candidateRowArray = None
+        if probeNum is not None and imageIndex.hasAnnIndex():
+            with Metrics.time( 'searcher.annProbe' ):
+                candidateRowArray = AnnIndex.getCandidateRows( imageIndex.sectionDict, imageHistogram, probeNum )
+
+        #   Drop candidates which cannot be in results, pruning needs
+        #   a bound on result number or score
+        candidateNum = len( imageIndex ) if candidateRowArray is None else len( candidateRowArray )
+        if isCascaded and ( maxResultNum is not None or minScore is not None ) and candidateNum >= CascadeMinRowNum:
+            with Metrics.time( 'searcher.cascade' ):
+                candidateRowArray = Searcher.pruneCandidateRows( imageIndex, imageHistogram, candidateRowArray, maxResultNum, minScore, reportDict )
+
+        #   Compare color histogram with whole index or candidates
+        with Metrics.time( 'searcher.score' ):
+            scoreArray = Searcher.scoreIndex( imageIndex, imageHistogram, candidateRowArray )
+
+        reportDict[ 'binNum' ] += len( scoreArray )*imageIndex.histogramMatrix.shape[1]
+        reportDict[ 'rowNum' ] += len( scoreArray )
+
+        #   Select top results reaching minimum score, then map
+        #   candidate positions to rows
+        with Metrics.time( 'searcher.select' ):
+            positionArray = np.arange( len( scoreArray ) ) if minScore is None else np.flatnonzero( scoreArray >= minScore )
+            topArray = positionArray[ selectTopRows( scoreArray[ positionArray ], maxResultNum ) ]
+            rowArray = topArray if candidateRowArray is None else candidateRowArray[ topArray ]
+
+        Metrics.count( 'searcher.queryNum' )
+        Metrics.count( 'searcher.comparedBinNum', reportDict[ 'binNum' ] - previousBinNum )
+        Metrics.count( 'searcher.comparedRowNum', reportDict[ 'rowNum' ] - previousRowNum )
+
+        return list( zip( imageIndex.imageIdArray[ rowArray ].tolist(), scoreArray[ topArray ].tolist() ) )
+
+    @staticmethod
+    def iterateSearch( imageIdToImageDataDict : Dict, imageHistogram : Tuple[float], maxResultNum : Optional[int] = None,
+                        probeNum : Optional[int] = None, minScore : Optional[float] = None, isCascaded : bool = True,
+                        reportDict : Optional[Dict] = None, chunkRowNum : Optional[int] = DefaultChunkRowNum ) -> Iterator[Tuple[List[Tuple[int, float]], float]]:
+        ''' This function searches index as search() does, but compares
+            candidates chunk by chunk and yields results among those
+            compared so far with fraction of candidates compared, after
+            each chunk, so results are shown long before whole index is
+            compared. Last results yielded are identical to search()
+
+            Search is cancelled by not iterating further, nothing is
+            compared between two chunks. Candidates are still selected
+            by clusters and coarse histograms before first chunk
+        '''
+
+        if chunkRowNum is not None and chunkRowNum < 1:
+            raise ValueError( 'iterateSearch() - Invalid chunk row number {}.'.format( chunkRowNum ) )
+
+        if isinstance( imageIdToImageDataDict, DeltaImageIndex ):
+            yield from Searcher.iterateSearchDelta( imageIdToImageDataDict, imageHistogram, maxResultNum, probeNum, minScore, isCascaded, reportDict, chunkRowNum )
+            return
+
+        if reportDict is None:
+            reportDict = dict()
+
+        reportDict.setdefault( 'binNum', 0 )
+        reportDict.setdefault( 'rowNum', 0 )
+
+        if isinstance( imageIdToImageDataDict, ImageIndex ):
+            imageIndex = imageIdToImageDataDict
+        else:
+            imageIndex = ImageIndex.fromImageDataDict( imageIdToImageDataDict )
+
+        candidateRowArray = None
+        if probeNum is not None and imageIndex.hasAnnIndex():
+            with Metrics.time( 'searcher.annProbe' ):
+                candidateRowArray = AnnIndex.getCandidateRows( imageIndex.sectionDict, imageHistogram, probeNum )
+
+        candidateNum = len( imageIndex ) if candidateRowArray is None else len( candidateRowArray )
+        if isCascaded and ( maxResultNum is not None or minScore is not None ) and candidateNum >= CascadeMinRowNum:
+            with Metrics.time( 'searcher.cascade' ):
+                candidateRowArray = Searcher.pruneCandidateRows( imageIndex, imageHistogram, candidateRowArray, maxResultNum, minScore, reportDict )
+
+        candidateNum = len( imageIndex ) if candidateRowArray is None else len( candidateRowArray )
+        if chunkRowNum is None:
+            chunkRowNum = max( candidateNum, 1 )
+
+        queryHistogram, scoreFactor = quantizeQueryHistogram( imageIndex, imageHistogram )
+        binNum = imageIndex.histogramMatrix.shape[1]
+
+        #   Keep scores and candidate positions of top results so far,
+        #   positions of later chunks are larger so ties stay ordered
+        #   as search() orders them
+        topScoreArray = np.zeros( 0, dtype=np.float64 )
+        topPositionArray = np.zeros( 0, dtype=np.int64 )
+
+        #   Index without candidates still yields its empty results once
+        for startPosition in range( 0, max( candidateNum, 1 ), chunkRowNum ):
+            endPosition = min( startPosition + chunkRowNum, candidateNum )
+
+            with Metrics.time( 'searcher.score' ):
+                if candidateRowArray is None:
+                    scoreArray = Searcher.scoreMatrix( imageIndex.histogramMatrix[ startPosition:endPosition ], queryHistogram )*scoreFactor
+                else:
+                    scoreArray = Searcher.scoreMatrix( imageIndex.histogramMatrix, queryHistogram, candidateRowArray[ startPosition:endPosition ] )*scoreFactor
+
+            reportDict[ 'binNum' ] += len( scoreArray )*binNum
+            reportDict[ 'rowNum' ] += len( scoreArray )
+
+            Metrics.count( 'searcher.comparedBinNum', len( scoreArray )*binNum )
+            Metrics.count( 'searcher.comparedRowNum', len( scoreArray ) )
+
+            with Metrics.time( 'searcher.select' ):
+                positionArray = np.arange( startPosition, endPosition )
+
+                if minScore is not None:
+                    keptArray = np.flatnonzero( scoreArray >= minScore )
+                    scoreArray, positionArray = scoreArray[ keptArray ], positionArray[ keptArray ]
+
+                scoreArray = np.concatenate( ( topScoreArray, scoreArray ) )
+                positionArray = np.concatenate( ( topPositionArray, positionArray ) )
+                topArray = selectTopRows( scoreArray, maxResultNum )
+                topScoreArray, topPositionArray = scoreArray[ topArray ], positionArray[ topArray ]
+
+                rowArray = topPositionArray if candidateRowArray is None else candidateRowArray[ topPositionArray ]
+
+            #   Query is counted once it is fully compared, caller may
+            #   stop right after last results
+            if endPosition >= candidateNum:
+                Metrics.count( 'searcher.queryNum' )
+
+            comparedFraction = endPosition / candidateNum if candidateNum > 0 else 1.0
+
+            yield list( zip( imageIndex.imageIdArray[ rowArray ].tolist(), topScoreArray.tolist() ) ), comparedFraction
+
+    @staticmethod
+    def searchBatch( imageIdToImageDataDict : Dict, imageHistogramList : List[Tuple[float]], maxResultNum : Optional[int] = None,
+                        probeNum : Optional[int] = None, minScore : Optional[float] = None, isCascaded : bool = True,
+                        reportDict : Optional[Dict] = None ) -> List[List[Tuple[int, float]]]:
+        ''' This function searches index for images most similar to
+            each of given color histograms, and returns one list of
+            image id and histogram similarity tuple per histogram,
+            identical to what search() returns for it
+
+            Whole index is compared with all histograms block by block,
+            which reads each block once for several queries. Searches
+            whose candidates are pruned by clusters or coarse histograms
+            compare far fewer images, so they are done one by one
+
+            Without maximum result number, scores of every row are kept
+            for every query until the end, so memory grows with index
+            size times number of histograms
+        '''
+
+        if isinstance( imageIdToImageDataDict, DeltaImageIndex ):
+            return Searcher.searchBatchDelta( imageIdToImageDataDict, imageHistogramList, maxResultNum, probeNum, minScore, isCascaded, reportDict )
+
+        if reportDict is None:
+            reportDict = dict()
+
+        reportDict.setdefault( 'binNum', 0 )
+        reportDict.setdefault( 'rowNum', 0 )
+
+        if isinstance( imageIdToImageDataDict, ImageIndex ):
+            imageIndex = imageIdToImageDataDict
+        else:
+            imageIndex = ImageIndex.fromImageDataDict( imageIdToImageDataDict )
+
+        isAnnProbed = probeNum is not None and imageIndex.hasAnnIndex()
+        isPruned = ( isCascaded and ( maxResultNum is not None or minScore is not None ) and len( imageIndex ) >= CascadeMinRowNum and
+                        len( imageIndex.getCoarseHistogramMatrixList() ) > 0 )
+
+        if len( imageHistogramList ) == 0:
+            return list()
+
+        if isAnnProbed or isPruned:
+            return [ Searcher.search( imageIndex, imageHistogram, maxResultNum, probeNum, minScore, isCascaded, reportDict ) for imageHistogram in imageHistogramList ]
+
+        queryHistogramMatrix, scoreFactor = quantizeQueryHistogram( imageIndex, imageHistogramList )
+
+        queryNum = len( queryHistogramMatrix )
+        rowNum = len( imageIndex )
+
+        #   Keep scores and rows of top results of each query so far,
+        #   segment after segment, rows of later segments are larger
+        #   so ties stay ordered by row
+        topScoreArrayList = [ [ np.zeros( 0, dtype=np.float64 ) ] for _ in range( queryNum ) ]
+        topRowArrayList = [ [ np.zeros( 0, dtype=np.int64 ) ] for _ in range( queryNum ) ]
+
+        for startRow in range( 0, rowNum, BatchSegmentRowNum ):
+            endRow = min( startRow + BatchSegmentRowNum, rowNum )
+
+            with Metrics.time( 'searcher.batchScore' ):
+                scoreMatrix = Searcher.scoreBatchMatrix( imageIndex.histogramMatrix[ startRow:endRow ], queryHistogramMatrix )*scoreFactor
+
+            for queryPosition in range( queryNum ):
+
+                scoreArray = scoreMatrix[ queryPosition ]
+                rowArray = np.arange( startRow, endRow )
+
+                if minScore is not None:
+                    positionArray = np.flatnonzero( scoreArray >= minScore )
+                    scoreArray, rowArray = scoreArray[ positionArray ], rowArray[ positionArray ]
+
+                topScoreArrayList[ queryPosition ].append( scoreArray )
+                topRowArrayList[ queryPosition ].append( rowArray )
+
+                #   Only top results can be in final results
+                if maxResultNum is not None:
+                    scoreArray = np.concatenate( topScoreArrayList[ queryPosition ] )
+                    rowArray = np.concatenate( topRowArrayList[ queryPosition ] )
+                    topArray = selectTopRows( scoreArray, maxResultNum )
+                    topScoreArrayList[ queryPosition ] = [ scoreArray[ topArray ] ]
+                    topRowArrayList[ queryPosition ] = [ rowArray[ topArray ] ]
+
+        reportDict[ 'binNum' ] += queryNum*rowNum*imageIndex.histogramMatrix.shape[1]
+        reportDict[ 'rowNum' ] += queryNum*rowNum
+
+        Metrics.count( 'searcher.queryNum', queryNum )
+        Metrics.count( 'searcher.comparedBinNum', queryNum*rowNum*imageIndex.histogramMatrix.shape[1] )
+        Metrics.count( 'searcher.comparedRowNum', queryNum*rowNum )
+
+        resultListList = list()
+
+        for queryPosition in range( queryNum ):
+
+            scoreArray = np.concatenate( topScoreArrayList[ queryPosition ] )
+            rowArray = np.concatenate( topRowArrayList[ queryPosition ] )
+            topArray = selectTopRows( scoreArray, maxResultNum )
+
+            resultListList.append( list( zip( imageIndex.imageIdArray[ rowArray[ topArray ] ].tolist(), scoreArray[ topArray ].tolist() ) ) )
+
+        return resultListList
+
+    @staticmethod
+    def getBaseMaxResultNum( deltaImageIndex : DeltaImageIndex, maxResultNum : Optional[int] ) -> Optional[int]:
+        ''' This function returns number of results to search base index
+            of given index for, so that enough of them are left once
+            results of hidden base rows are dropped
+        '''
+
+        return maxResultNum + len( deltaImageIndex.removedRowArray ) if maxResultNum is not None else None
+
+    @staticmethod
+    def searchDelta( deltaImageIndex : DeltaImageIndex, imageHistogram : Tuple[float], maxResultNum : Optional[int] = None,
+                        probeNum : Optional[int] = None, minScore : Optional[float] = None, isCascaded : bool = True,
+                        reportDict : Optional[Dict] = None ) -> List[Tuple[int, float]]:
+        ''' This function searches memory mapped base index and delta
+            index of given index separately, see DeltaImageIndex, and
+            merges their results, which are identical to searching index
+            with delta applied, see search()
+        '''
+
+        removedImageIdSet = deltaImageIndex.getRemovedImageIdSet()
+
+        baseResultList = Searcher.search( deltaImageIndex.baseImageIndex, imageHistogram, Searcher.getBaseMaxResultNum( deltaImageIndex, maxResultNum ),
+                                            probeNum, minScore, isCascaded, reportDict )
+        deltaResultList = Searcher.search( deltaImageIndex.deltaImageIndex, imageHistogram, maxResultNum, probeNum, minScore, isCascaded, reportDict )
+
+        return mergeResultList( [ [ result for result in baseResultList if result[0] not in removedImageIdSet ], deltaResultList ], maxResultNum )
+
+    @staticmethod
+    def iterateSearchDelta( deltaImageIndex : DeltaImageIndex, imageHistogram : Tuple[float], maxResultNum : Optional[int] = None,
+                            probeNum : Optional[int] = None, minScore : Optional[float] = None, isCascaded : bool = True,
+                            reportDict : Optional[Dict] = None, chunkRowNum : Optional[int] = DefaultChunkRowNum ) -> Iterator[Tuple[List[Tuple[int, float]], float]]:
+        ''' This function searches given index as searchDelta() does,
+            but yields results chunk by chunk of base index as
+            iterateSearch() does, small delta index is searched first
+        '''
+
+        removedImageIdSet = deltaImageIndex.getRemovedImageIdSet()
+
+        deltaResultList = Searcher.search( deltaImageIndex.deltaImageIndex, imageHistogram, maxResultNum, probeNum, minScore, isCascaded, reportDict )
+
+        for baseResultList, comparedFraction in Searcher.iterateSearch( deltaImageIndex.baseImageIndex, imageHistogram, Searcher.getBaseMaxResultNum( deltaImageIndex, maxResultNum ),
+                                                                        probeNum, minScore, isCascaded, reportDict, chunkRowNum ):
+
+            yield mergeResultList( [ [ result for result in baseResultList if result[0] not in removedImageIdSet ], deltaResultList ], maxResultNum ), comparedFraction
+
+    @staticmethod
+    def searchBatchDelta( deltaImageIndex : DeltaImageIndex, imageHistogramList : List[Tuple[float]], maxResultNum : Optional[int] = None,
+                            probeNum : Optional[int] = None, minScore : Optional[float] = None, isCascaded : bool = True,
+                            reportDict : Optional[Dict] = None ) -> List[List[Tuple[int, float]]]:
+        ''' This function searches given index for each of given color
+            histograms as searchDelta() does, base index and delta index
+            are each searched in one batch, see searchBatch()
+        '''
+
+        removedImageIdSet = deltaImageIndex.getRemovedImageIdSet()
+
+        baseResultListList = Searcher.searchBatch( deltaImageIndex.baseImageIndex, imageHistogramList, Searcher.getBaseMaxResultNum( deltaImageIndex, maxResultNum ),
+                                                    probeNum, minScore, isCascaded, reportDict )
+        deltaResultListList = Searcher.searchBatch( deltaImageIndex.deltaImageIndex, imageHistogramList, maxResultNum, probeNum, minScore, isCascaded, reportDict )
+
+        return [ mergeResultList( [ [ result for result in baseResultList if result[0] not in removedImageIdSet ], deltaResultList ], maxResultNum )
+                    for baseResultList, deltaResultList in zip( baseResultListList, deltaResultListList ) ]
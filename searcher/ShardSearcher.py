@@ -0,0 +1,157 @@
+##########################################################################
+#   IMPORT
+##########################################################################
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Dict, Optional
+from indexer.Indexer import Indexer
+from searcher.Searcher import Searcher, mergeResultList
+from metrics.Metrics import Metrics
+
+##########################################################################
+#   GLOBAL
+##########################################################################
+
+#   Shard index held by this worker process
+WorkerShardIndex = None
+
+##########################################################################
+#   HELPER
+##########################################################################
+
+def readWorkerShard( shardFilePath : str ):
+    ''' This function reads shard index of this worker process once,
+        it is searched by every task the worker runs
+    '''
+
+    global WorkerShardIndex
+
+    #   Worker starts with copy of parent metrics, drop them so they
+    #   are not merged twice
+    Metrics.reset()
+
+    WorkerShardIndex = Indexer.readIndex( os.path.dirname( shardFilePath ), os.path.basename( shardFilePath ) )
+
+def searchWorkerShard( imageHistogram, maxResultNum : Optional[int], probeNum : Optional[int], minScore : Optional[float] ) -> Tuple[List[Tuple[int, float]], Dict]:
+    ''' This function searches shard index of this worker process, and
+        returns results with metrics recorded since previous task
+    '''
+
+    return Searcher.search( WorkerShardIndex, imageHistogram, maxResultNum, probeNum, minScore ), Metrics.popMetricsDict()
+
+def searchBatchWorkerShard( imageHistogramList : List, maxResultNum : Optional[int], probeNum : Optional[int],
+                            minScore : Optional[float] ) -> Tuple[List[List[Tuple[int, float]]], Dict]:
+    ''' This function searches shard index of this worker process for
+        each of given histograms, and returns results with metrics
+        recorded since previous task
+    '''
+
+    return Searcher.searchBatch( WorkerShardIndex, imageHistogramList, maxResultNum, probeNum, minScore ), Metrics.popMetricsDict()
+
+def getWorkerImageFilePathDict( imageIdList : List[int] ) -> Dict[int, str]:
+    ''' This function returns image file path of each of given image ids
+        held by shard index of this worker process
+    '''
+
+    return { imageId : WorkerShardIndex.getImageFilePath( WorkerShardIndex.getRow( imageId ) ) for imageId in imageIdList if imageId in WorkerShardIndex }
+
+##########################################################################
+#   CLASS
+##########################################################################
+
+class ShardSearcher(object):
+    ''' This class searches index split into shard files, see
+        Indexer.writeShardIndex(), with one worker process holding
+        each shard
+
+        A query is sent to every shard at once, each shard returns its
+        own top results which are merged, so results are identical to
+        searching whole index and query time shrinks with number of
+        cores
+
+        Shards hold images of index file without its delta log, so
+        image file paths of results are looked up in shards as well,
+        see getImageFilePathDict()
+    '''
+
+    def __init__( self, indexDir : str, indexFileName : str ):
+
+        shardManifestDict = Indexer.readShardManifest( indexDir, indexFileName )
+
+        #   Shards are split from index file only, so changes recorded
+        #   by watch mode since are not searched
+        deltaRecordNum = Indexer.readDeltaRecordNum( indexDir, indexFileName )
+        if deltaRecordNum > 0:
+            print( 'ShardSearcher() - Shards do not include {} changes of delta log, compact index and split it again.'.format( deltaRecordNum ) )
+
+        self.metadataDict = shardManifestDict[ 'metadata' ]
+        self.executorList = list()
+
+        for shardDict in shardManifestDict[ 'shardList' ]:
+            shardFilePath = os.path.join( indexDir, shardDict[ 'fileName' ] )
+            self.executorList.append( ProcessPoolExecutor( 1, initializer=readWorkerShard, initargs=( shardFilePath, ) ) )
+
+    def getMaxDecodeSize( self ) -> Optional[int]:
+        ''' This function returns maximum decode size index was computed
+            with, see ImageIndex.getMaxDecodeSize()
+        '''
+
+        return self.metadataDict.get( 'maxDecodeSize' )
+
+    def search( self, imageHistogram : Tuple[float], maxResultNum : Optional[int] = None, probeNum : Optional[int] = None,
+                minScore : Optional[float] = None ) -> List[Tuple[int, float]]:
+        ''' This function searches every shard for images most similar
+            to given color histogram, see Searcher.search()
+        '''
+
+        futureList = [ executor.submit( searchWorkerShard, imageHistogram, maxResultNum, probeNum, minScore ) for executor in self.executorList ]
+
+        return mergeResultList( self.getShardResultList( futureList ), maxResultNum )
+
+    def searchBatch( self, imageHistogramList : List[Tuple[float]], maxResultNum : Optional[int] = None, probeNum : Optional[int] = None,
+                        minScore : Optional[float] = None ) -> List[List[Tuple[int, float]]]:
+        ''' This function searches every shard for each of given color
+            histograms, see Searcher.searchBatch()
+        '''
+
+        futureList = [ executor.submit( searchBatchWorkerShard, imageHistogramList, maxResultNum, probeNum, minScore ) for executor in self.executorList ]
+        shardResultListList = self.getShardResultList( futureList )
+
+        return [ mergeResultList( [ shardResultList[ query ] for shardResultList in shardResultListList ], maxResultNum )
+                    for query in range( len( imageHistogramList ) ) ]
+
+    def getImageFilePathDict( self, imageIdList : List[int] ) -> Dict[int, str]:
+        ''' This function returns image file path of each of given image
+            ids, looked up by shards holding them, so that whole index
+            need not be read to show results
+        '''
+
+        futureList = [ executor.submit( getWorkerImageFilePathDict, imageIdList ) for executor in self.executorList ]
+
+        imageFilePathDict = dict()
+        for future in futureList:
+            imageFilePathDict.update( future.result() )
+
+        return imageFilePathDict
+
+    def getShardResultList( self, futureList : List ) -> List:
+        ''' This function waits for result of each shard, merging metrics
+            recorded by its worker
+        '''
+
+        shardResultList = list()
+
+        for future in futureList:
+            result, metricsDict = future.result()
+            Metrics.merge( metricsDict )
+            shardResultList.append( result )
+
+        return shardResultList
+
+    def close( self ):
+        ''' This function stops worker processes
+        '''
+
+        for executor in self.executorList:
+            executor.shutdown()
@@ -7,6 +7,7 @@
 import sys
 import os
 from optparse import OptionParser
+from metrics.Metrics import Metrics, addMetricsOption
 from PyQt5 import QtWidgets
 from gui.SimpleImageSearchEngineWindow import SimpleImageSearchEngineWindow
 
@@ -16,7 +17,7 @@ from gui.SimpleImageSearchEngineWindow import SimpleImageSearchEngineWindow
 
 NumRequiredArgs = 0
 IndexDir = 'index'
-ImageIndexFileName = 'index.pickle'
+ImageIndexFileName = 'index.bin'
 
 ##########################################################################
 #   HELPER
@@ -39,20 +40,32 @@ def main():
                         action='store_true',
                         default=False,
                         help='enable debug mode' )
+    parser.add_option( '--probe',
+                        action='store',
+                        type='int',
+                        dest='probeNum',
+                        default=None,
+                        help='only compare images in this many nearest clusters of approximate nearest neighbour index (default = compare all)' )
+    addMetricsOption( parser )
+
     (options, args) = parser.parse_args()
 
     if len(args) != NumRequiredArgs:
         parser.error('Incorrect number of arguments')
         sys.exit(-1)
 
+    #   Record metrics and profile of this run if asked
+    Metrics.startRun( options.metricsFilePath, options.profileFilePath )
+
     #   Parse options
     isDebug = options.isDebug
+    probeNum = options.probeNum
 
     #   Construct pyqt application
     app = QtWidgets.QApplication([])
 
     #   Construct simple image search engine window
-    simpleImageSearchEngineWindow = SimpleImageSearchEngineWindow( IndexDir, ImageIndexFileName, isDebug )
+    simpleImageSearchEngineWindow = SimpleImageSearchEngineWindow( IndexDir, ImageIndexFileName, isDebug, probeNum )
 
     #   Show window
     simpleImageSearchEngineWindow.show()